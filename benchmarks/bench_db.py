@@ -0,0 +1,80 @@
+"""Micro-benchmark biaya DB per handler: connect-per-query (lama) vs koneksi bersama.
+
+Mensimulasikan urutan query /search dari pengguna baru: auto_update_profile
+(INSERT OR IGNORE + UPDATE), get_user_profile, lalu penyimpanan state antrian
+(blob JSON pada versi lama, satu baris waiting_entries pada versi sekarang).
+
+Jalankan dari root repo:
+    python benchmarks/bench_db.py [--users 2000]
+"""
+import argparse
+import json
+import sqlite3
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import bot  # noqa: E402
+
+
+def legacy_db_query(db_file, query, params=()):
+    """Salinan db_query lama: satu koneksi dan satu commit per query."""
+    with sqlite3.connect(db_file) as conn:
+        cursor = conn.cursor()
+        cursor.execute(query, params)
+        conn.commit()
+        return cursor.fetchall()
+
+
+def legacy_search(db_file, user_id):
+    legacy_db_query(db_file, "INSERT OR IGNORE INTO user_profiles (user_id, username) VALUES (?, ?)", (user_id, f"user{user_id}"))
+    legacy_db_query(db_file, "UPDATE user_profiles SET username = ? WHERE user_id = ?", (f"user{user_id}", user_id))
+    legacy_db_query(db_file, "SELECT user_id, username, gender, age, bio, language, is_pro FROM user_profiles WHERE user_id = ?", (user_id,))
+    legacy_db_query(db_file, "UPDATE chat_data SET value = ? WHERE key = 'chat_partners'", (json.dumps({}),))
+    legacy_db_query(db_file, "UPDATE chat_data SET value = ? WHERE key = 'waiting_queue'", (json.dumps([]),))
+
+
+def pooled_search(user_id):
+    bot.touch_user_profile(user_id, f"user{user_id}")
+    bot.get_user_profile(user_id)
+    bot.persist_enqueue({"user_id": user_id, "gender": "Misteri", "preference": "any", "enqueued_at": time.time()})
+
+
+def run(label, func, users):
+    start = time.perf_counter()
+    for user_id in range(users):
+        func(user_id)
+    elapsed = time.perf_counter() - start
+    print(f"{label:<28} {elapsed / users * 1e6:>10.1f} us/handler  ({users} handler)")
+    return elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--users", type=int, default=2_000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        legacy_file = Path(tmp) / "legacy.db"
+        bot.DB_FILE = legacy_file
+        bot.setup_database()
+        bot.close_db_connection()
+        legacy_db_query(legacy_file, "PRAGMA journal_mode=DELETE")
+        legacy_db_query(legacy_file, "CREATE TABLE chat_data (key TEXT PRIMARY KEY, value TEXT NOT NULL)")
+        legacy_db_query(legacy_file, "INSERT INTO chat_data VALUES ('chat_partners', '{}'), ('waiting_queue', '[]')")
+        before = run("connect-per-query (lama)", lambda uid: legacy_search(legacy_file, uid), args.users)
+
+        bot.DB_FILE = Path(tmp) / "pooled.db"
+        bot.setup_database()
+        bot.profile_cache.clear()
+        after = run("koneksi bersama + WAL", pooled_search, args.users)
+        bot.close_db_connection()
+
+    print(f"Percepatan: {before / after:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+"""Beban sintetis: latensi update saat query DB diblokir di event loop vs lewat DatabaseWorker.
+
+Setiap update tiba dengan laju tetap. Sebagian update menulis ke DB (seperti
+auto_update_profile + get_user_profile), sisanya hanya relay di memori. Latensi diukur
+dari waktu tiba sampai update selesai diproses.
+
+Jalankan dari root repo:
+    python benchmarks/bench_db_async.py [--updates 5000] [--rate 5000]
+"""
+import argparse
+import asyncio
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import bot  # noqa: E402
+
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+
+async def handle_update(user_id, writes, blocking):
+    if writes:
+        if blocking:
+            bot.touch_user_profile(user_id, f"user{user_id}")
+            bot.get_user_profile(user_id)
+        else:
+            await bot.run_db(bot.touch_user_profile, user_id, f"user{user_id}")
+            await bot.run_db(bot.get_user_profile, user_id)
+    await asyncio.sleep(0)  # Relay: satu kali kembali ke event loop
+
+
+async def load(updates, rate, write_ratio, blocking):
+    latencies = []
+    interval = 1 / rate
+    every = max(1, round(1 / write_ratio))
+
+    async def one(index, arrival):
+        await handle_update(index, index % every == 0, blocking)
+        latencies.append(time.perf_counter() - arrival)
+
+    tasks = []
+    start = time.perf_counter()
+    for index in range(updates):
+        arrival = start + index * interval
+        delay = arrival - time.perf_counter()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        tasks.append(asyncio.create_task(one(index, arrival)))
+    await asyncio.gather(*tasks)
+    elapsed = time.perf_counter() - start
+    return latencies, elapsed
+
+
+def report(label, latencies, elapsed):
+    ms = [v * 1000 for v in latencies]
+    print(
+        f"{label:<24} p50={percentile(ms, 50):7.2f}ms  p99={percentile(ms, 99):7.2f}ms  "
+        f"mean={statistics.fmean(ms):7.2f}ms  throughput={len(ms) / elapsed:8.0f} upd/s"
+    )
+    return percentile(ms, 99)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--updates", type=int, default=5_000)
+    parser.add_argument("--rate", type=float, default=5_000, help="Update per detik")
+    parser.add_argument("--write-ratio", type=float, default=0.25)
+    parser.add_argument("--dir", default=None, help="Direktori file DB (pakai disk asli agar fsync terasa)")
+    parser.add_argument("--synchronous", default="FULL", help="PRAGMA synchronous untuk simulasi disk lambat")
+    args = parser.parse_args()
+
+    bot.DB_PRAGMAS = bot.DB_PRAGMAS + (f"PRAGMA synchronous={args.synchronous}",)
+    with tempfile.TemporaryDirectory(dir=args.dir) as tmp:
+        bot.DB_FILE = Path(tmp) / "bench.db"
+        bot.setup_database()
+        blocking = report("blocking di event loop", *asyncio.run(load(args.updates, args.rate, args.write_ratio, True)))
+        offloaded = report("DatabaseWorker (async)", *asyncio.run(load(args.updates, args.rate, args.write_ratio, False)))
+        bot.db_worker.stop()
+        bot.close_db_connection()
+    print(f"p99 turun {blocking / offloaded:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
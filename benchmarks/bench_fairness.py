@@ -0,0 +1,165 @@
+"""Simulasi keadilan pencocokan: waktu tunggu per kelas pengguna, FIFO murni vs prioritas Pro + aging.
+
+Pengguna datang acak (Poisson, --rate per detik) dengan campuran gender seperti bot chat
+anonim pada umumnya (jauh lebih banyak pria), sebagian kecil Pro, dan sebagian Pro memakai
+/find_by_gender. Setiap pengguna menyerah (/stop) setelah kesabarannya habis (eksponensial,
+rata-rata --patience detik). Jam disimulasikan, dan setiap MATCH_TICK_INTERVAL detik
+MatchQueue.pop_match() dipanggil seperti Matchmaker.tick() (maksimal MATCH_BATCH_SIZE pasangan).
+
+Kebijakan yang dibandingkan:
+- fifo: pro_boost=0 dan tanpa batas tunggu (urutan pencocokan sebelum perubahan ini);
+- prioritas: MATCH_PRO_BOOST dan MATCH_MAX_WAIT dari bot.py.
+
+Dilaporkan p50/p99/maks waktu tunggu yang berakhir dengan pasangan dan bagian yang menyerah,
+per kelas. Setiap pasangan diverifikasi cocok, tidak ada pengguna yang dipasangkan dua kali,
+dan struktur antrian tetap konsisten. Biaya per panggilan pop_match ikut diukur.
+
+Jalankan dari root repo:
+    python benchmarks/bench_fairness.py [--rate 0.3] [--hours 24] [--patience 600]
+"""
+import argparse
+import heapq
+import random
+import sys
+import time
+from collections import defaultdict
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import bot  # noqa: E402
+
+GENDER_MIX = (("Pria", 0.7), ("Wanita", 0.2), ("Rahasia", 0.07), ("Misteri", 0.03))
+PRO_SHARE = 0.2  # Bagian pengguna Pro
+GENDER_SEARCH_SHARE = 0.7  # Bagian pengguna Pro yang memakai /find_by_gender
+# Preferensi pengguna Pro yang mencari berdasarkan gender, per gender sendiri
+PREFERENCE_MIX = {
+    "Pria": (("Wanita", 0.95), ("Pria", 0.05)),
+    "Wanita": (("Pria", 0.8), ("Wanita", 0.2)),
+    "Rahasia": (("Wanita", 0.5), ("Pria", 0.5)),
+    "Misteri": (("Wanita", 0.5), ("Pria", 0.5)),
+}
+CLASSES = ("biasa/acak", "Pro/acak", "Pro/lawan jenis", "Pro/langka")
+
+
+def pick(rng, mix):
+    value = rng.random()
+    for item, share in mix:
+        value -= share
+        if value < 0:
+            return item
+    return mix[-1][0]
+
+
+def user_class(gender, preference, pro):
+    if not pro:
+        return "biasa/acak"
+    if preference == "any":
+        return "Pro/acak"
+    if {gender, preference} == {"Pria", "Wanita"}:
+        return "Pro/lawan jenis"
+    return "Pro/langka"
+
+
+def arrivals(rate, duration, patience, seed):
+    """Daftar (waktu datang, batas sabar, gender, preferensi, Pro) yang sama untuk setiap kebijakan."""
+    rng = random.Random(seed)
+    now, users = 0.0, []
+    while True:
+        now += rng.expovariate(rate)
+        if now >= duration:
+            return users
+        gender = pick(rng, GENDER_MIX)
+        pro = rng.random() < PRO_SHARE
+        preference = pick(rng, PREFERENCE_MIX[gender]) if pro and rng.random() < GENDER_SEARCH_SHARE else "any"
+        users.append((now, now + rng.expovariate(1 / patience), gender, preference, pro))
+
+
+def simulate(users, duration, queue):
+    """Menjalankan putaran pencocokan atas jam simulasi.
+
+    Kembali (tunggu per kelas, menyerah per kelas, masalah, detik per panggilan pop_match, antrian terpanjang).
+    """
+    waits = defaultdict(list)
+    gave_up = defaultdict(int)
+    problems = []
+    matched = set()
+    deadlines = []  # (batas sabar, user_id)
+    pop_seconds, calls, longest = 0.0, 0, 0
+    next_user = 0
+    ticks = int(duration / bot.MATCH_TICK_INTERVAL) + 1
+    for tick in range(1, ticks + 1):
+        now = tick * bot.MATCH_TICK_INTERVAL
+        while next_user < len(users) and users[next_user][0] <= now:
+            arrived, deadline, gender, preference, pro = users[next_user]
+            queue.append({"user_id": next_user, "gender": gender, "preference": preference, "enqueued_at": arrived, "pro": pro})
+            heapq.heappush(deadlines, (deadline, next_user))
+            next_user += 1
+        while deadlines and deadlines[0][0] <= now:
+            _, user_id = heapq.heappop(deadlines)
+            entry = queue.cancel(user_id)
+            if entry is not None:
+                gave_up[user_class(entry.gender, entry.preference, entry.pro)] += 1
+        longest = max(longest, len(queue))
+        batch = 0
+        start = time.perf_counter()
+        while batch < bot.MATCH_BATCH_SIZE and (pair := queue.pop_match(now)):
+            batch += 1
+            user_a, user_b = pair
+            if not bot.is_compatible(user_a.gender, user_a.preference, user_b.gender, user_b.preference):
+                problems.append(f"pasangan tidak cocok: {user_a!r} + {user_b!r}")
+            for entry in pair:
+                if entry.user_id in matched:
+                    problems.append(f"user {entry.user_id} dipasangkan dua kali")
+                matched.add(entry.user_id)
+                waits[user_class(entry.gender, entry.preference, entry.pro)].append(now - entry.enqueued_at)
+        pop_seconds += time.perf_counter() - start
+        calls += batch + (batch < bot.MATCH_BATCH_SIZE)
+    problems += queue.check()
+    for entry in queue:
+        gave_up[user_class(entry.gender, entry.preference, entry.pro)] += 1
+    return waits, gave_up, problems, pop_seconds / max(calls, 1), longest
+
+
+def percentile(values, fraction):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(fraction * len(values)))] if values else float("nan")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rate", type=float, default=0.3, help="Pengguna baru per detik")
+    parser.add_argument("--hours", type=float, default=24.0, help="Lama simulasi (jam)")
+    parser.add_argument("--patience", type=float, default=600.0, help="Rata-rata kesabaran sebelum menyerah (detik)")
+    parser.add_argument("--seed", type=int, default=24)
+    args = parser.parse_args()
+
+    duration = args.hours * 3600
+    users = arrivals(args.rate, duration, args.patience, args.seed)
+    print(
+        f"{len(users)} pengguna dalam {args.hours:g} jam ({args.rate:g}/detik), kesabaran rata-rata {args.patience:.0f}s; "
+        f"boost Pro {bot.MATCH_PRO_BOOST:.0f}s, batas tunggu {bot.MATCH_MAX_WAIT:.0f}s"
+    )
+    print(f"{'kebijakan':<10} {'kelas':<16} {'dapat':>7} {'p50':>8} {'p99':>8} {'maks':>8} {'menyerah':>9}")
+    failed = False
+    policies = (
+        ("fifo", bot.MatchQueue(pro_boost=0.0, max_wait=float("inf"))),
+        ("prioritas", bot.MatchQueue()),
+    )
+    for name, queue in policies:
+        waits, gave_up, problems, pop_cost, longest = simulate(users, duration, queue)
+        for cls in CLASSES:
+            total = len(waits[cls]) + gave_up[cls]
+            print(
+                f"{name:<10} {cls:<16} {len(waits[cls]):>7} {percentile(waits[cls], 0.5):>7.1f}s {percentile(waits[cls], 0.99):>7.1f}s "
+                f"{max(waits[cls], default=float('nan')):>7.1f}s {gave_up[cls] / max(total, 1):>8.1%}"
+            )
+        print(f"{'':<10} pop_match: {pop_cost * 1e6:.1f}µs per panggilan, antrian terpanjang {longest}")
+        for problem in problems[:10]:
+            print(f"    MASALAH ({name}): {problem}")
+        failed = failed or bool(problems)
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,111 @@
+"""Waktu lookup username dan agregasi laporan sebelum dan sesudah migrasi skema.
+
+Tabel diisi sampai --profiles profil dan --reports laporan untuk mengukur waktu tiap query
+yang dijalankan bot, dibandingkan dengan database yang belum dimigrasi (user_version 0,
+tanpa indeks), lalu rencana query pada data sebanyak itu dicetak. Pemeriksaan bahwa rencana
+memakai indeks ada di tests/test_query_plans.py (database kosong, cepat).
+
+Jalankan dari root repo:
+    python benchmarks/bench_indexes.py [--profiles 1000000] [--reports 2000000]
+"""
+import argparse
+import random
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import bot  # noqa: E402
+
+NOW = datetime(2024, 6, 1)
+SINCE = NOW - bot.REPORT_STATS_WINDOW
+
+# (nama, query yang dijalankan bot, parameter); rencananya diperiksa oleh tests/test_query_plans.py
+QUERIES = (
+    ("username", bot.USERNAME_LOOKUP_QUERY, ("USER_TIDAK_ADA", "USER_TIDAK_ADA")),
+    ("laporan per user", bot.REPORTS_AGAINST_QUERY, (777, SINCE.strftime(bot.REPORT_TIME_FORMAT))),
+    ("top dilaporkan", bot.TOP_REPORTED_QUERY, (SINCE.strftime(bot.REPORT_TIME_FORMAT), 10)),
+)
+
+
+def query_plan(query, params):
+    return [row[3] for row in bot.db_query(f"EXPLAIN QUERY PLAN {query}", params)]
+
+
+def fill(profiles, reports, rng):
+    conn = bot.get_db_connection()
+    with bot.db_transaction():
+        conn.executemany(
+            "INSERT INTO user_profiles (user_id, username, is_pro) VALUES (?, ?, 0)",
+            ((user_id, f"user{user_id}") for user_id in range(1, profiles + 1)),
+        )
+        # Laporan tersebar merata selama 90 hari terakhir, sebagian kecil user sering dilaporkan
+        span = int(timedelta(days=90).total_seconds())
+        conn.executemany(
+            "INSERT INTO reports (reporter_id, reported_id, timestamp) VALUES (?, ?, ?)",
+            (
+                (
+                    rng.randint(1, profiles),
+                    rng.randint(1, 1000) if rng.random() < 0.2 else rng.randint(1, profiles),
+                    (NOW - timedelta(seconds=rng.randint(0, span))).strftime(bot.REPORT_TIME_FORMAT),
+                )
+                for _ in range(reports)
+            ),
+        )
+
+
+def timed(query, params, repeats):
+    start = time.perf_counter()
+    for _ in range(repeats):
+        bot.db_query(query, params)
+    return (time.perf_counter() - start) / repeats
+
+
+def measure(args, migrated):
+    with tempfile.TemporaryDirectory() as tmp:
+        bot.DB_FILE = Path(tmp) / "bench.db"
+        if migrated:
+            bot.setup_database()
+        else:
+            # Database versi lama: tabel yang sama tetapi belum ada migrasi yang diterapkan
+            migrations, bot.SCHEMA_MIGRATIONS = bot.SCHEMA_MIGRATIONS, ()
+            bot.setup_database()
+            bot.SCHEMA_MIGRATIONS = migrations
+        fill(args.profiles, args.reports, random.Random(16))
+        bot.db_query("ANALYZE")
+        timings = {name: timed(query, params, args.repeats) for name, query, params in QUERIES}
+        if not migrated:
+            # Migrasi pada database yang sudah berisi: waktu pembuatan indeks
+            start = time.perf_counter()
+            with bot.db_transaction():
+                bot.migrate_schema()
+            timings["migrasi"] = time.perf_counter() - start
+        version = bot.db_query("PRAGMA user_version")[0][0]
+        plans = {name: query_plan(query, params) for name, query, params in QUERIES}
+        bot.close_db_connection()
+    return timings, version, plans
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--profiles", type=int, default=1_000_000)
+    parser.add_argument("--reports", type=int, default=2_000_000)
+    parser.add_argument("--repeats", type=int, default=20)
+    args = parser.parse_args()
+
+    legacy, legacy_version, _ = measure(args, migrated=False)
+    migrated, version, plans = measure(args, migrated=True)
+    print(f"{args.profiles} profil, {args.reports} laporan (jendela {bot.REPORT_STATS_WINDOW})")
+    print(f"{'query':<18} {'tanpa indeks':>14} {'dengan indeks':>14}")
+    for name, _, _ in QUERIES:
+        print(f"{name:<18} {legacy[name] * 1e3:>12.2f}ms {migrated[name] * 1e3:>12.3f}ms")
+    print(f"migrasi ke v{legacy_version} pada database berisi: {legacy['migrasi']:.2f}s; database baru: v{version}")
+    for name, plan in plans.items():
+        print(f"  {name}: {' | '.join(plan)}")
+
+
+if __name__ == "__main__":
+    main()
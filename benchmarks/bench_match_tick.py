@@ -0,0 +1,96 @@
+"""Perbandingan pencocokan inline (satu pasangan per /search) vs putaran Matchmaker.
+
+Sejumlah pengguna mengirim /search bersamaan (burst) lewat fake Bot API. Mode "inline"
+meniru perilaku lama: satu percobaan (paling banyak satu pasangan, satu tulis DB) setelah
+setiap /search, tanpa putaran berkala. Mode "tick" memakai konfigurasi Matchmaker bawaan.
+Dilaporkan waktu sampai semua pengguna mendapat pasangan, jumlah putaran (= transaksi DB
+pencocokan), dan histogram waktu tunggu antrian.
+
+Jalankan dari root repo:
+    python benchmarks/bench_match_tick.py [--users 500] [--latency 0.02]
+"""
+import argparse
+import asyncio
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from telegram import Update  # noqa: E402
+
+import bot  # noqa: E402
+from bench_concurrency import reset_state  # noqa: E402
+from fake_telegram import FakeTelegramRequest, UpdateFactory, build_fake_application  # noqa: E402
+
+
+class InlineMatchmaker(bot.Matchmaker):
+    """Perilaku lama: satu percobaan pencocokan (maksimal satu pasangan) setiap ada /search."""
+
+    def __init__(self):
+        super().__init__(batch_size=1)
+        self._inline = set()
+
+    def notify(self, telegram_bot):
+        self._bot = telegram_bot
+        task = asyncio.get_running_loop().create_task(self.tick())
+        self._inline.add(task)
+        task.add_done_callback(self._inline.discard)
+
+    async def stop(self):
+        await asyncio.gather(*self._inline, return_exceptions=True)
+        await super().stop()
+
+
+async def run(users, latency, matchmaker):
+    reset_state(0)
+    bot.matchmaker = matchmaker
+    bot.match_wait_histogram = bot.Histogram()
+    fake = FakeTelegramRequest(latency=latency)
+    application = build_fake_application(fake, bot.PairOrderedUpdateProcessor())
+    factory = UpdateFactory()
+    updates = [Update.de_json(factory.command(user_id, "search"), application.bot) for user_id in range(1, users + 1)]
+
+    async with application:
+        await application.start()
+        start = time.perf_counter()
+        for update in updates:
+            await application.update_queue.put(update)
+        while len(bot.chat_partners) < users and time.perf_counter() - start < 120:
+            await asyncio.sleep(0.002)
+        elapsed = time.perf_counter() - start
+        await application.stop()
+        await bot.matchmaker.stop()
+        await bot.outbox.drain()
+    return elapsed, bot.matchmaker.stats(), bot.match_wait_histogram
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--users", type=int, default=500)
+    parser.add_argument("--latency", type=float, default=0.02, help="Latensi tiap panggilan API (detik)")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        bot.DB_FILE = Path(tmp) / "bench.db"
+        bot.setup_database()
+        # Semua pengguna ber-profil lengkap dengan gender bergantian agar bucket bervariasi
+        for user_id in range(1, args.users + 1):
+            bot.update_user_profile(user_id, f"user{user_id}", {"gender": ("Pria", "Wanita", "Rahasia")[user_id % 3], "age": 20, "bio": "bench"})
+        modes = {
+            "inline": InlineMatchmaker,
+            "tick": bot.Matchmaker,
+        }
+        for name, factory in modes.items():
+            elapsed, stats, histogram = asyncio.run(run(args.users, args.latency, factory()))
+            print(
+                f"{name:<7} semua berpasangan dalam {elapsed * 1000:8.1f}ms  "
+                f"putaran={stats['ticks']:>4} terbesar={stats['largest_batch']:>4}  tunggu: {histogram.summary()}"
+            )
+        bot.db_worker.stop()
+        bot.close_db_connection()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,73 @@
+"""Benchmark latensi pencocokan: MatchQueue (bucket) vs pemindaian i/j lama.
+
+Kesetaraan hasil pencocokan dengan algoritma lama diperiksa oleh tests/test_matching.py.
+
+Jalankan dari root repo:
+    python benchmarks/bench_matchmaking.py [--sizes 10 100 1000 10000 100000]
+"""
+import argparse
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from bot import MatchQueue  # noqa: E402
+
+
+def legacy_match(queue):
+    """Salinan algoritma lama try_to_match_users (O(n^2)) sebagai pembanding."""
+    temp_queue = list(queue)
+    for i in range(len(temp_queue)):
+        for j in range(i + 1, len(temp_queue)):
+            user_a, user_b = temp_queue[i], temp_queue[j]
+            a_likes_b = user_a["preference"] == "any" or user_a["preference"] == user_b["gender"]
+            b_likes_a = user_b["preference"] == "any" or user_b["preference"] == user_a["gender"]
+            if a_likes_b and b_likes_a:
+                queue.remove(user_a)
+                queue.remove(user_b)
+                return user_a, user_b
+    return None
+
+
+def fill(queue, size):
+    """Mengisi antrian dengan pengguna yang tidak saling cocok (kasus terburuk pemindaian)."""
+    for user_id in range(size):
+        queue.append({"user_id": user_id, "gender": "Pria", "preference": "Wanita"})
+
+
+def measure(queue, match, size, repeats):
+    """Rata-rata waktu satu enqueue + satu pencocokan, ukuran antrian dijaga tetap."""
+    next_id = size
+    start = time.perf_counter()
+    for _ in range(repeats):
+        queue.append({"user_id": next_id, "gender": "Wanita", "preference": "any"})
+        pair = match(queue)
+        assert pair is not None
+        queue.append({"user_id": next_id + 1, "gender": "Pria", "preference": "Wanita"})
+        next_id += 2
+    return (time.perf_counter() - start) / repeats
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10, 100, 1_000, 10_000, 100_000])
+    parser.add_argument("--repeats", type=int, default=2_000)
+    parser.add_argument("--skip-legacy", action="store_true", help="Lewati pengukuran algoritma lama")
+    args = parser.parse_args()
+
+    print(f"{'antrian':>10} {'MatchQueue (us)':>16} {'lama (us)':>12}")
+    for size in args.sizes:
+        engine = MatchQueue()
+        fill(engine, size)
+        engine_us = measure(engine, MatchQueue.pop_match, size, args.repeats) * 1e6
+        legacy_us = float("nan")
+        if not args.skip_legacy:
+            legacy = []
+            fill(legacy, size)
+            legacy_us = measure(legacy, legacy_match, size, max(3, min(args.repeats, 200_000 // size))) * 1e6
+        print(f"{size:>10} {engine_us:>16.2f} {legacy_us:>12.1f}")
+
+
+if __name__ == "__main__":
+    main()
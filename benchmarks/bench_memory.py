@@ -0,0 +1,155 @@
+"""Memori state sesi per pengguna: layout dict lama vs QueueEntry + SessionStateView.
+
+Untuk setiap jumlah pengguna, sebagian besar sedang chat dan sisanya menunggu di antrian.
+Baris dimuat dari SQLite seperti load_chat_data() (setiap baris membawa objek string
+sendiri), lalu dibangun:
+
+- lama: entri antrian berupa dict, MatchQueue dengan OrderedDict indeks + bucket berisi
+  tuple (seq, entri), dan dict user_states terpisah berisi 'chatting'/'waiting';
+- ringkas: MatchQueue sekarang (QueueEntry __slots__, dict indeks + deque per bucket) dan
+  user_states yang diturunkan dari chat_partners/waiting_queue.
+
+Setiap layout diukur di proses baru: byte per pengguna dengan tracemalloc, lalu kenaikan RSS
+di proses lain tanpa tracemalloc (jejak tracemalloc sendiri ikut menambah RSS). Lookup yang
+dipakai handle_message/end_chat_session diverifikasi sama untuk kedua layout.
+
+Jalankan dari root repo:
+    python benchmarks/bench_memory.py [--users 100000 1000000] [--chatting 0.8]
+"""
+import argparse
+import itertools
+import json
+import random
+import sqlite3
+import subprocess
+import sys
+import time
+import tracemalloc
+from collections import OrderedDict
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import bot  # noqa: E402
+
+GENDERS = ["Pria", "Wanita", "Rahasia", "Misteri"]
+PREFERENCES = ["any", "Pria", "Wanita"]
+
+
+class LegacyMatchQueue:
+    """Struktur penyimpanan MatchQueue versi sebelumnya (hanya append, untuk diukur)."""
+
+    def __init__(self, entries=()):
+        self._seq = itertools.count()
+        self._entries = OrderedDict()
+        self._buckets = {}
+        for entry in entries:
+            item = (next(self._seq), entry)
+            self._entries[entry["user_id"]] = item
+            self._buckets.setdefault((entry["gender"], entry["preference"]), OrderedDict())[entry["user_id"]] = item
+
+    def __contains__(self, user_id):
+        return user_id in self._entries
+
+    def get(self, user_id):
+        item = self._entries.get(user_id)
+        return item[1] if item else None
+
+
+def database(users, chatting, seed):
+    conn = sqlite3.connect(":memory:")
+    conn.execute("CREATE TABLE chat_sessions (user_a INTEGER PRIMARY KEY, user_b INTEGER NOT NULL)")
+    conn.execute("CREATE TABLE waiting_entries (user_id INTEGER PRIMARY KEY, gender TEXT NOT NULL, preference TEXT NOT NULL, enqueued_at REAL NOT NULL)")
+    # Status Pro entri antrian dibaca dari profil; semua pengguna di sini pengguna biasa
+    conn.execute("CREATE TABLE user_profiles (user_id INTEGER PRIMARY KEY, is_pro INTEGER DEFAULT 0)")
+    rng = random.Random(seed)
+    pairs = int(users * chatting) // 2
+    first_waiting = 2 * pairs + 1
+    conn.executemany("INSERT INTO chat_sessions VALUES (?, ?)", ((2 * i + 1, 2 * i + 2) for i in range(pairs)))
+    conn.executemany(
+        "INSERT INTO waiting_entries VALUES (?, ?, ?, ?)",
+        ((user_id, rng.choice(GENDERS), rng.choice(PREFERENCES), 1_700_000_000 + user_id) for user_id in range(first_waiting, users + 1)),
+    )
+    return conn
+
+
+def rss_bytes():
+    with open("/proc/self/statm") as statm:
+        return int(statm.read().split()[1]) * 4096
+
+
+def build(layout, conn):
+    """Membangun state sesi dari baris database; kembali (chat_partners, antrian, user_states)."""
+    partners, saved_queue = bot.load_chat_data(conn)
+    if layout == "lama":
+        queue = LegacyMatchQueue(saved_queue)
+        states = {user_id: "chatting" for user_id in partners}
+        states.update({entry["user_id"]: "waiting" for entry in saved_queue})
+    else:
+        queue = bot.MatchQueue(saved_queue)
+        states = bot.user_states
+    del saved_queue
+    return partners, queue, states
+
+
+def child(layout, users, chatting, trace):
+    conn = database(users, chatting, seed=21)
+    rss_before = rss_bytes()
+    if trace:
+        tracemalloc.start()
+    start = time.perf_counter()
+    partners, queue, states = build(layout, conn)
+    elapsed = time.perf_counter() - start
+    traced = tracemalloc.get_traced_memory()[0] if trace else None
+    tracemalloc.stop()
+    rss_after = rss_bytes()
+    bot.chat_partners, bot.waiting_queue = partners, queue
+
+    # Lookup yang dipakai handle_message / end_chat_session / add_to_queue
+    rng = random.Random(users)
+    sample = [rng.randint(1, users + 10) for _ in range(10_000)]
+    lookups = [
+        (states.get(user_id), partners.get(user_id), (entry := queue.get(user_id)) and (entry["gender"], entry["preference"], entry["enqueued_at"]))
+        for user_id in sample
+    ]
+    print(json.dumps({"traced": traced, "rss": rss_after - rss_before, "seconds": elapsed, "lookups": lookups}))
+
+
+def run_child(layout, users, chatting, trace):
+    command = [sys.executable, __file__, "--child", layout, "--users", str(users), "--chatting", str(chatting)]
+    output = subprocess.run(command + (["--trace"] if trace else []), check=True, capture_output=True, text=True).stdout
+    return json.loads(output.splitlines()[-1])
+
+
+def measure(layout, users, chatting):
+    traced = run_child(layout, users, chatting, trace=True)
+    plain = run_child(layout, users, chatting, trace=False)
+    return {**plain, "traced": traced["traced"]}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--users", type=int, nargs="+", default=[100_000, 1_000_000])
+    parser.add_argument("--chatting", type=float, default=0.8, help="Bagian pengguna yang sedang chat (sisanya antri)")
+    parser.add_argument("--child", choices=("lama", "ringkas"), help=argparse.SUPPRESS)
+    parser.add_argument("--trace", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.child:
+        child(args.child, args.users[0], args.chatting, args.trace)
+        return
+
+    failed = False
+    print(f"{'pengguna':>10} {'layout':<8} {'byte/pengguna':>14} {'RSS':>10} {'bangun':>9}")
+    for users in args.users:
+        results = {layout: measure(layout, users, args.chatting) for layout in ("lama", "ringkas")}
+        for layout, result in results.items():
+            print(f"{users:>10} {layout:<8} {result['traced'] / users:>14.1f} {result['rss'] / 2**20:>8.1f}MB {result['seconds'] * 1000:>7.0f}ms")
+        saved = 1 - results["ringkas"]["traced"] / results["lama"]["traced"]
+        same = results["lama"]["lookups"] == results["ringkas"]["lookups"]
+        print(f"{'':>10} hemat {saved:.0%}; lookup sama: {'ya' if same else 'TIDAK'}")
+        failed = failed or not same
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
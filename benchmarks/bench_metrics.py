@@ -0,0 +1,73 @@
+"""Biaya instrumentasi metrik di jalur panas.
+
+Mengukur biaya per panggilan untuk: handler kosong dengan dan tanpa instrument_handler,
+metrics.observe/inc, db_query dengan histogram dibanding query mentah, serta waktu render
+/metrics untuk registry yang terisi.
+
+Jalankan dari root repo:
+    python benchmarks/bench_metrics.py [--calls 200000]
+"""
+import argparse
+import asyncio
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import bot  # noqa: E402
+
+
+async def noop_handler(update, context):
+    return None
+
+
+async def time_handler(handler, calls):
+    start = time.perf_counter()
+    for _ in range(calls):
+        await handler(None, None)
+    return (time.perf_counter() - start) / calls
+
+
+def time_call(func, calls):
+    start = time.perf_counter()
+    for _ in range(calls):
+        func()
+    return (time.perf_counter() - start) / calls
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--calls", type=int, default=200_000)
+    args = parser.parse_args()
+
+    raw = asyncio.run(time_handler(noop_handler, args.calls))
+    wrapped = asyncio.run(time_handler(bot.instrument_handler(noop_handler, "noop"), args.calls))
+    print(f"handler kosong          {raw * 1e6:7.2f}us  ->  terinstrumentasi {wrapped * 1e6:7.2f}us  (+{(wrapped - raw) * 1e6:.2f}us)")
+    observe = time_call(lambda: bot.metrics.observe("bench_seconds", 0.003, handler="noop"), args.calls)
+    inc = time_call(lambda: bot.metrics.inc("bench_total", handler="noop"), args.calls)
+    print(f"metrics.observe         {observe * 1e6:7.2f}us   metrics.inc {inc * 1e6:7.2f}us")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        bot.DB_FILE = Path(tmp) / "bench.db"
+        bot.setup_database()
+        bot.update_user_profile(1, "user1", {"gender": "Pria", "age": 20, "bio": "bench"})
+        query, params = "SELECT user_id, username FROM user_profiles WHERE user_id = ?", (1,)
+        conn = bot.get_db_connection()
+        plain = time_call(lambda: conn.execute(query, params).fetchall(), args.calls // 4)
+        measured = time_call(lambda: bot.db_query(query, params), args.calls // 4)
+        print(f"query PK mentah         {plain * 1e6:7.2f}us  ->  db_query terukur {measured * 1e6:7.2f}us  (+{(measured - plain) * 1e6:.2f}us)")
+        bot.close_db_connection()
+
+    # Registry realistis: ~25 handler x (histogram + 2 status) ditambah metrik lain
+    for index in range(25):
+        bot.metrics.observe("handler_duration_seconds", 0.01, handler=f"h{index}")
+        bot.metrics.inc("handler_calls_total", handler=f"h{index}", status="ok")
+        bot.metrics.inc("handler_calls_total", handler=f"h{index}", status="error")
+    render = time_call(bot.metrics.render, 200)
+    print(f"render /metrics         {render * 1e3:7.2f}ms  ({len(bot.metrics.render().splitlines())} baris)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,127 @@
+"""Uji penjadwal pesan keluar terhadap fake Bot API yang menegakkan batas kirim.
+
+Fake API menolak pengiriman yang melewati batas global/per chat dengan RetryAfter,
+seperti Telegram. Dibandingkan: kirim langsung (pola lama, error hanya di-log) vs
+OutboundScheduler. Laju dikalikan --scale agar benchmark selesai cepat.
+
+Jalankan dari root repo:
+    python benchmarks/bench_outbound.py [--chats 200] [--messages 10] [--scale 10]
+"""
+import argparse
+import asyncio
+import sys
+import time
+from collections import defaultdict, deque
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from telegram.error import RetryAfter  # noqa: E402
+
+import bot  # noqa: E402
+
+TELEGRAM_GLOBAL_LIMIT = 30  # pesan per detik
+TELEGRAM_CHAT_LIMIT = 3  # pesan per detik per chat (termasuk burst pendek)
+
+
+class FakeRateLimitedBot:
+    """Fake Bot API lokal: jendela geser 1 detik untuk batas global dan per chat."""
+
+    def __init__(self, global_limit, chat_limit, latency=0.005):
+        self.global_limit = global_limit
+        self.chat_limit = chat_limit
+        self.latency = latency
+        self._global = deque()
+        self._per_chat = defaultdict(deque)
+        self.delivered = defaultdict(list)
+        self.flood_errors = 0
+
+    @staticmethod
+    def _trim(window, now):
+        while window and now - window[0] >= 1.0:
+            window.popleft()
+
+    async def send_message(self, chat_id, text, **kwargs):
+        await asyncio.sleep(self.latency)
+        now = time.monotonic()
+        chat_window = self._per_chat[chat_id]
+        self._trim(self._global, now)
+        self._trim(chat_window, now)
+        if len(self._global) >= self.global_limit or len(chat_window) >= self.chat_limit:
+            self.flood_errors += 1
+            raise RetryAfter(1)
+        self._global.append(now)
+        chat_window.append(now)
+        self.delivered[chat_id].append(text)
+        return text
+
+
+def workload(chats, messages):
+    """Urutan (chat_id, teks, prioritas) yang berselang-seling antar chat."""
+    for index in range(messages):
+        for chat_id in range(chats):
+            priority = bot.PRIORITY_RELAY if index % 3 else bot.PRIORITY_NOTIFY
+            yield chat_id, f"{chat_id}:{index}", priority
+
+
+async def direct(fake, jobs):
+    """Pola lama: kirim langsung, exception hanya di-log sehingga pesan hilang."""
+    async def one(chat_id, text):
+        try:
+            await fake.send_message(chat_id=chat_id, text=text)
+        except Exception:
+            pass
+    await asyncio.gather(*(one(chat_id, text) for chat_id, text, _ in jobs))
+
+
+async def scheduled(fake, jobs, scheduler):
+    futures = [scheduler.submit(fake.send_message, chat_id, priority, text=text) for chat_id, text, priority in jobs]
+    await asyncio.gather(*futures, return_exceptions=True)
+    await scheduler.drain()
+
+
+def summarize(label, fake, jobs, elapsed):
+    expected = defaultdict(list)
+    for chat_id, text, _ in jobs:
+        expected[chat_id].append(text)
+    delivered = sum(len(v) for v in fake.delivered.values())
+    in_order = all(fake.delivered[c] == [t for t in expected[c] if t in set(fake.delivered[c])] for c in expected)
+    print(
+        f"{label:<20} terkirim={delivered:>6}/{len(jobs)}  hilang={len(jobs) - delivered:>6}  "
+        f"RetryAfter={fake.flood_errors:>6}  urutan_per_chat={'OK' if in_order else 'RUSAK'}  "
+        f"waktu={elapsed:6.2f}s  laju={delivered / elapsed:7.1f} msg/s"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--chats", type=int, default=200)
+    parser.add_argument("--messages", type=int, default=10)
+    parser.add_argument("--scale", type=float, default=10.0, help="Pengali laju batas Telegram")
+    args = parser.parse_args()
+
+    global_limit = int(TELEGRAM_GLOBAL_LIMIT * args.scale)
+    chat_limit = int(TELEGRAM_CHAT_LIMIT * args.scale)
+    jobs = list(workload(args.chats, args.messages))
+
+    fake = FakeRateLimitedBot(global_limit, chat_limit)
+    start = time.perf_counter()
+    asyncio.run(direct(fake, jobs))
+    summarize("kirim langsung", fake, jobs, time.perf_counter() - start)
+
+    fake = FakeRateLimitedBot(global_limit, chat_limit)
+    scheduler = bot.OutboundScheduler(
+        global_rate=bot.SEND_GLOBAL_RATE * args.scale,
+        global_burst=int(bot.SEND_GLOBAL_BURST * args.scale),
+        chat_rate=bot.SEND_CHAT_RATE * args.scale,
+        chat_burst=bot.SEND_CHAT_BURST,
+    )
+    start = time.perf_counter()
+    asyncio.run(scheduled(fake, jobs, scheduler))
+    summarize("OutboundScheduler", fake, jobs, time.perf_counter() - start)
+    stats = scheduler.stats()
+    print("Metrik backpressure:", ", ".join(f"{k}={v:.3f}" if isinstance(v, float) else f"{k}={v}" for k, v in stats.items()))
+
+
+if __name__ == "__main__":
+    main()
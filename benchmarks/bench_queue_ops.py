@@ -0,0 +1,63 @@
+"""Throughput enqueue/cancel dan cek membership pada antrian besar: list lama vs MatchQueue.
+
+Jalankan dari root repo:
+    python benchmarks/bench_queue_ops.py [--sizes 1000 10000 100000]
+"""
+import argparse
+import random
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import bot  # noqa: E402
+
+
+def legacy_cycle(queue, user_id, victim):
+    """Pola lama: is_user_busy (any) + append, lalu stop_command (next + list.remove)."""
+    if not any(user["user_id"] == user_id for user in queue):
+        queue.append({"user_id": user_id, "gender": "Pria", "preference": "Wanita"})
+    entry = next((user for user in queue if user["user_id"] == victim), None)
+    if entry:
+        queue.remove(entry)
+
+
+def indexed_cycle(queue, user_id, victim):
+    if user_id not in queue:
+        queue.append({"user_id": user_id, "gender": "Pria", "preference": "Wanita"})
+    queue.cancel(victim)
+
+
+def run(queue, cycle, size, operations, seed=7):
+    """Menjalankan pasangan enqueue+cancel; ukuran antrian tetap di sekitar `size`."""
+    rng = random.Random(seed)
+    live = list(range(size))
+    next_id = size
+    start = time.perf_counter()
+    for _ in range(operations):
+        index = rng.randrange(len(live))
+        victim, live[index] = live[index], next_id
+        cycle(queue, next_id, victim)
+        next_id += 1
+    return operations / (time.perf_counter() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1_000, 10_000, 100_000])
+    parser.add_argument("--operations", type=int, default=20_000)
+    args = parser.parse_args()
+
+    print(f"{'antrian':>10} {'MatchQueue (op/s)':>18} {'list lama (op/s)':>18}")
+    for size in args.sizes:
+        entries = [{"user_id": uid, "gender": "Pria", "preference": "Wanita"} for uid in range(size)]
+        indexed = bot.MatchQueue(dict(e) for e in entries)
+        indexed_ops = run(indexed, indexed_cycle, size, args.operations)
+        assert not indexed.check(), indexed.check()
+        legacy_ops = run(list(entries), legacy_cycle, size, max(50, min(args.operations, 20_000_000 // size // 10)))
+        print(f"{size:>10} {indexed_ops:>18,.0f} {legacy_ops:>18,.0f}")
+
+
+if __name__ == "__main__":
+    main()
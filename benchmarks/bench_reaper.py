@@ -0,0 +1,150 @@
+"""Pembersihan sesi menganggur: tenggat di heap (IdleReaper) vs memindai seluruh state tiap putaran.
+
+Database berisi --sessions pasangan dan --waiting entri antrian yang dipulihkan seperti di
+main(). Lalu waktu disimulasikan: di sebagian besar pasangan satu pihak masih mengirim pesan
+dan sebagian besar antrian masih aktif, sisanya (--idle) diam. Diukur biaya touch() per
+pesan, biaya satu putaran pemeriksaan saat belum ada yang lewat tenggat (heap vs pindai
+penuh), dan putaran yang benar-benar membersihkan. Lalu diverifikasi bahwa hanya sesi yang
+menganggur yang diakhiri, kedua pihak dikabari lewat antrian kirim, baris DB ikut terhapus,
+state tetap konsisten, dan metrik reaper_reclaimed_total sesuai.
+
+Jalankan dari root repo:
+    python benchmarks/bench_reaper.py [--sessions 100000] [--waiting 10000] [--idle 0.05]
+"""
+import argparse
+import asyncio
+import random
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import bot  # noqa: E402
+from fake_telegram import FakeTelegramRequest, build_fake_application  # noqa: E402
+
+
+def fill(sessions, waiting):
+    conn = bot.get_db_connection()
+    first_waiting = 2 * sessions + 1
+    with bot.db_transaction():
+        conn.executemany("INSERT INTO chat_sessions (user_a, user_b) VALUES (?, ?)", ((2 * i + 1, 2 * i + 2) for i in range(sessions)))
+        conn.executemany(
+            "INSERT INTO waiting_entries (user_id, gender, preference, enqueued_at) VALUES (?, 'Pria', 'Wanita', ?)",
+            ((user_id, time.time()) for user_id in range(first_waiting, first_waiting + waiting)),
+        )
+
+
+def full_scan(reaper, now):
+    """Pemeriksaan tanpa heap: tenggat setiap pengguna yang chat atau antri dihitung ulang."""
+    last = reaper.last_active
+    due = []
+    for user_id, partner_id in bot.chat_partners.items():
+        if max(last.get(user_id, 0.0), last.get(partner_id, 0.0)) + reaper.chat_timeout <= now:
+            due.append(("chat", user_id))
+    for entry in bot.waiting_queue:
+        if last.get(entry["user_id"], 0.0) + reaper.queue_timeout <= now:
+            due.append(("queue", entry["user_id"]))
+    return due
+
+
+def timed(func, repeats):
+    start = time.perf_counter()
+    for _ in range(repeats):
+        func()
+    return (time.perf_counter() - start) / repeats
+
+
+async def reap(application, reaper, now):
+    """Menjalankan putaran sampai tidak ada batch penuh lagi; kembali (detik, putaran)."""
+    start = time.perf_counter()
+    rounds = 1
+    while await reaper.tick(application.bot, now) >= reaper.batch_size:
+        rounds += 1
+    await bot.outbox.drain(timeout=600)
+    return time.perf_counter() - start, rounds
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sessions", type=int, default=100_000)
+    parser.add_argument("--waiting", type=int, default=10_000)
+    parser.add_argument("--idle", type=float, default=0.05, help="Bagian pasangan/antrian yang diam")
+    parser.add_argument("--repeats", type=int, default=20)
+    args = parser.parse_args()
+
+    failed = False
+    rng = random.Random(20)
+    with tempfile.TemporaryDirectory() as tmp:
+        bot.DB_FILE = Path(tmp) / "reaper.db"
+        bot.setup_database()
+        fill(args.sessions, args.waiting)
+        reaper = bot.idle_reaper = bot.IdleReaper()
+        bot.restore_sessions()
+        bot.session_lock = asyncio.Lock()
+        bot.outbox = bot.OutboundScheduler(global_rate=1e9, global_burst=10**9, chat_rate=1e9, chat_burst=10**9)
+        start = min(reaper.last_active.values())
+
+        # Satu pihak dari tiap pasangan aktif masih mengirim pesan; antrian aktif mencari ulang
+        idle_pairs = {(2 * i + 1, 2 * i + 2) for i in range(args.sessions) if rng.random() < args.idle}
+        waiting_users = [entry["user_id"] for entry in bot.waiting_queue]
+        idle_waiting = {user_id for user_id in waiting_users if rng.random() < args.idle}
+        active = [2 * i + 1 + rng.randint(0, 1) for i in range(args.sessions) if (2 * i + 1, 2 * i + 2) not in idle_pairs]
+        active += [user_id for user_id in waiting_users if user_id not in idle_waiting]
+        touch_start = time.perf_counter()
+        for user_id in active:
+            reaper.touch(user_id, start + reaper.chat_timeout - reaper.queue_timeout / 2)
+        touch_cost = (time.perf_counter() - touch_start) / len(active)
+        print(f"{args.sessions} pasangan + {args.waiting} antrian; touch(): {touch_cost * 1e6:.2f}µs per pesan")
+
+        quiet = start + reaper.queue_timeout / 2
+        heap_check = timed(lambda: reaper.expired(quiet), args.repeats)
+        scan_check = timed(lambda: full_scan(reaper, quiet), args.repeats)
+        print(f"putaran tanpa tenggat lewat: heap {heap_check * 1e6:.1f}µs, pindai penuh {scan_check * 1e3:.1f}ms")
+
+        # Lewat tenggat antrian aktif dan tenggat chat pasangan yang diam, sebelum tenggat pasangan aktif
+        now = start + reaper.chat_timeout + 1
+        expected = full_scan(reaper, now)
+        fake = FakeTelegramRequest()
+        application = build_fake_application(fake)
+        pairs_before, waiting_before = len(bot.chat_partners) // 2, len(bot.waiting_queue)
+
+        async def run():
+            async with application:
+                return await reap(application, reaper, now)
+
+        elapsed, rounds = asyncio.run(run())
+        reclaimed_pairs = pairs_before - len(bot.chat_partners) // 2
+        reclaimed_waiting = waiting_before - len(bot.waiting_queue)
+        print(
+            f"pembersihan: {reclaimed_pairs} pasangan + {reclaimed_waiting} antrian dalam {elapsed:.2f}s, {rounds} putaran "
+            f"(pindai penuh menemukan {len(expected)} entri lewat tenggat); {reaper.rescheduled} tenggat dijadwalkan ulang"
+        )
+
+        notified = {chat_id for chat_id, texts in fake.sent_to.items() if any(str(text).startswith("⌛") for text in texts)}
+        expected_users = {user_id for pair in idle_pairs for user_id in pair} | idle_waiting
+        wrongly_ended = [pair for pair in ((2 * i + 1, 2 * i + 2) for i in range(args.sessions)) if pair not in idle_pairs and pair[0] not in bot.chat_partners]
+        still_idle = [pair for pair in idle_pairs if pair[0] in bot.chat_partners] + [user_id for user_id in idle_waiting if user_id in bot.waiting_queue]
+        rows = bot.db_query("SELECT (SELECT COUNT(*) FROM chat_sessions), (SELECT COUNT(*) FROM waiting_entries)")[0]
+        stats = reaper.stats()
+        problems = bot.check_state_consistency()
+        if wrongly_ended or still_idle:
+            problems.append(f"{len(wrongly_ended)} pasangan aktif diakhiri, {len(still_idle)} sesi/antrian diam tersisa")
+        if notified != expected_users:
+            problems.append(f"notifikasi: {len(expected_users - notified)} tidak dikabari, {len(notified - expected_users)} dikabari padahal aktif")
+        if tuple(rows) != (len(bot.chat_partners) // 2, len(bot.waiting_queue)):
+            problems.append(f"baris DB {tuple(rows)} tidak sesuai state di memori")
+        if (stats["chat"], stats["queue"]) != (len(idle_pairs), len(idle_waiting)):
+            problems.append(f"metrik reaper_reclaimed_total chat={stats['chat']} queue={stats['queue']}")
+        print(f"dipantau setelahnya: {stats['tracked']} pengguna, {stats['heap']} entri heap; {len(notified)} pengguna dikabari")
+        for problem in problems:
+            print(f"MASALAH {problem}")
+        failed = bool(problems)
+        bot.db_worker.stop()
+        bot.close_db_connection()
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,163 @@
+"""Waktu restart dengan banyak sesi aktif, perbaikan state, shutdown bertahap, dan notifikasi pemulihan.
+
+1. Restart: database berisi --sessions pasangan dan antrian, ditambah baris yang saling
+   bertentangan (user di dua sesi, user yang chat sekaligus antri). Diukur waktu
+   setup_database() + restore_sessions() seperti di main(), lalu diverifikasi bahwa state
+   konsisten dan restart berikutnya tidak perlu memperbaiki apa pun.
+2. Shutdown: update relay dan /search masih di antrian saat bot dihentikan (seperti SIGTERM);
+   semuanya harus selesai diproses dan setiap pasangan baru menerima notifikasinya.
+3. Setelah crash: semua pengguna yang dipulihkan dikabari per batch; pengguna yang memblokir
+   bot (Forbidden) dianggap pergi dan pasangannya dikabari.
+
+Jalankan dari root repo:
+    python benchmarks/bench_recovery.py [--sessions 100000] [--conflicts 100]
+"""
+import argparse
+import asyncio
+import random
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from telegram import Update  # noqa: E402
+from telegram.error import Forbidden  # noqa: E402
+
+import bot  # noqa: E402
+from bench_concurrency import reset_state  # noqa: E402
+from bench_sharding import CountingProcessor  # noqa: E402
+from fake_telegram import FakeTelegramRequest, UpdateFactory, build_fake_application  # noqa: E402
+
+
+def fill(sessions, conflicts):
+    """Menulis `sessions` pasangan, antrian sepersepuluhnya, dan `conflicts` pasang baris yang bertentangan."""
+    conn = bot.get_db_connection()
+    waiting = sessions // 10
+    first_waiting = 2 * sessions + 1
+    with bot.db_transaction():
+        conn.executemany("INSERT INTO chat_sessions (user_a, user_b) VALUES (?, ?)", ((2 * i + 1, 2 * i + 2) for i in range(sessions)))
+        conn.executemany(
+            "INSERT INTO waiting_entries (user_id, gender, preference, enqueued_at) VALUES (?, 'Pria', 'any', ?)",
+            ((user_id, 1_700_000_000 + user_id) for user_id in range(first_waiting, first_waiting + waiting)),
+        )
+        # User yang muncul di dua sesi (sisa crash di tengah perubahan) dan user chat yang juga antri
+        conn.executemany(
+            "INSERT INTO chat_sessions (user_a, user_b) VALUES (?, ?)",
+            ((first_waiting + waiting + i, 4 * i + 1) for i in range(conflicts)),
+        )
+        conn.executemany(
+            "INSERT INTO waiting_entries (user_id, gender, preference, enqueued_at) VALUES (?, 'Wanita', 'any', 1)",
+            ((4 * i + 3,) for i in range(conflicts)),
+        )
+
+
+def restart():
+    """Langkah start di main() untuk mode satu proses; kembali (detik, user yang sesinya diputus)."""
+    bot.close_db_connection()
+    start = time.perf_counter()
+    bot.setup_database()
+    bot.restore_sessions()
+    elapsed = time.perf_counter() - start
+    return elapsed, bot.recovery[0]
+
+
+async def graceful_stop(pairs, messages, searchers, latency):
+    """Menghentikan bot saat update masih antri; kembali (update terproses, relay, pasangan tanpa notifikasi)."""
+    reset_state(pairs)
+    bot.matchmaker = bot.Matchmaker()
+    fake = FakeTelegramRequest(latency=latency)
+    processor = CountingProcessor()
+    application = build_fake_application(fake, processor)
+    factory = UpdateFactory()
+    first_searcher = 2 * pairs + 1
+    for user_id in range(first_searcher, first_searcher + searchers):
+        bot.update_user_profile(user_id, f"user{user_id}", {"gender": "Pria", "age": 20, "bio": "bench"})
+    updates = [factory.command(user_id, "search") for user_id in range(first_searcher, first_searcher + searchers)]
+    updates += [factory.message(user_id, f"{user_id}:{index}") for index in range(messages) for user_id in range(1, 2 * pairs + 1)]
+
+    async with application:
+        await application.start()
+        for data in updates:
+            await application.update_queue.put(Update.de_json(data, application.bot))
+        await asyncio.sleep(0)
+        # Yang dilakukan run_polling/run_webhook setelah SIGTERM
+        await application.stop()
+        await bot.post_stop(application)
+    announced = {chat_id for chat_id, texts in fake.sent_to.items() if any(str(text).startswith("✅") for text in texts)}
+    matched = {user_id for user_id in bot.chat_partners if user_id >= first_searcher}
+    return processor.done, len(updates), fake.counts["copyMessage"], len(matched - announced)
+
+
+async def notify_after_crash(departed_ratio):
+    """Mengirim notifikasi pemulihan; kembali (notifikasi, pergi, user keluar dari sesi, pasangan dikabari, pergi tapi masih chat, detik)."""
+    bot.outbox = bot.OutboundScheduler(global_rate=1e9, global_burst=10**9, chat_rate=1e9, chat_burst=10**9)
+    bot.session_lock = asyncio.Lock()
+    fake = FakeTelegramRequest()
+    rng = random.Random(19)
+    departed = {user_id for user_id in bot.chat_partners if rng.random() < departed_ratio}
+
+    def on_call(method, params):
+        if method == "sendMessage" and int(params["chat_id"]) in departed:
+            raise Forbidden("Forbidden: bot was blocked by the user")
+
+    fake.on_call = on_call
+    application = build_fake_application(fake)
+    sessions_before = len(bot.chat_partners)
+    async with application:
+        start = time.perf_counter()
+        await bot.notify_recovered_users(application.bot, *bot.recovery)
+        await bot.outbox.drain(timeout=600)
+        elapsed = time.perf_counter() - start
+    told_partner_left = sum(
+        1 for texts in fake.sent_to.values() if any(str(text).startswith("❌ Pasanganmu telah meninggalkan") for text in texts)
+    )
+    still_chatting = sum(user_id in bot.chat_partners for user_id in departed)
+    return fake.counts["sendMessage"], len(departed), sessions_before - len(bot.chat_partners), told_partner_left, still_chatting, elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sessions", type=int, default=100_000)
+    parser.add_argument("--conflicts", type=int, default=100)
+    parser.add_argument("--messages", type=int, default=5, help="Pesan per user yang masih antri saat berhenti")
+    parser.add_argument("--latency", type=float, default=0.01, help="Latensi tiap panggilan API (detik)")
+    parser.add_argument("--departed", type=float, default=0.01, help="Bagian pengguna yang memblokir bot selama mati")
+    args = parser.parse_args()
+
+    failed = False
+    with tempfile.TemporaryDirectory() as tmp:
+        bot.DB_FILE = Path(tmp) / "recovery.db"
+        bot.setup_database()
+        fill(args.sessions, args.conflicts)
+
+        elapsed, broken = restart()
+        problems = bot.check_state_consistency()
+        print(
+            f"restart setelah crash: {elapsed:.2f}s untuk {len(bot.chat_partners) // 2} sesi + {len(bot.waiting_queue)} antrian; "
+            f"{len(broken)} user sesinya diputus, masalah konsistensi {len(problems)}"
+        )
+        _, broken_again = restart()
+        print(f"restart kedua: {len(broken_again)} perbaikan")
+        failed = bool(problems or broken_again)
+
+        sent, departed, ended, told, still_chatting, elapsed = asyncio.run(notify_after_crash(args.departed))
+        print(
+            f"notifikasi pemulihan: {sent} pesan dalam {elapsed:.2f}s; {departed} pengguna pergi -> "
+            f"{ended} user keluar dari sesi, {told} pasangan dikabari, {still_chatting} masih tercatat chat"
+        )
+        failed = failed or bool(still_chatting)
+
+        bot.db_query("DELETE FROM chat_sessions")
+        bot.db_query("DELETE FROM waiting_entries")
+        done, total, relayed, unannounced = asyncio.run(graceful_stop(200, args.messages, 100, args.latency))
+        print(f"shutdown saat {total} update antri: {done} diproses, {relayed} pesan diteruskan, {unannounced} pasangan tanpa notifikasi")
+        failed = failed or done != total or unannounced
+        bot.db_worker.stop()
+        bot.close_db_connection()
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,184 @@
+"""Relay semua jenis pesan: rantai if/elif send_* lama vs copy_message + album lewat copy_messages.
+
+Pasangan yang sudah terhubung saling mengirim campuran pesan (teks, foto, stiker, voice,
+video, dokumen, audio, GIF, video note, lokasi, kontak, dadu, polling) dan album foto lewat
+fake Bot API. Untuk tiap mode dilaporkan jumlah pesan yang sampai per jenis, panggilan API
+per pesan relay, dan waktu total; untuk mode sekarang juga diverifikasi bahwa semua jenis
+sampai dan urutan per pengirim (termasuk album) tetap.
+
+Jalankan dari root repo:
+    python benchmarks/bench_relay.py [--pairs 50] [--rounds 5] [--latency 0.01]
+"""
+import argparse
+import asyncio
+import sys
+import tempfile
+import time
+from collections import Counter
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from telegram import Update  # noqa: E402
+from telegram.ext import MessageHandler  # noqa: E402
+
+import bot  # noqa: E402
+from bench_concurrency import reset_state  # noqa: E402
+from bench_sharding import CountingProcessor  # noqa: E402
+from fake_telegram import FakeTelegramRequest, UpdateFactory, build_fake_application  # noqa: E402
+
+
+def media(kind, **fields):
+    return {"file_id": f"{kind}-file", "file_unique_id": f"{kind}-unique", **fields}
+
+
+CONTENT = {
+    "teks": {"text": "halo"},
+    "foto": {"photo": [media("photo", width=90, height=90), media("photo-big", width=800, height=800)], "caption": "foto"},
+    "stiker": {"sticker": media("sticker", type="regular", width=512, height=512, is_animated=False, is_video=False)},
+    "voice": {"voice": media("voice", duration=3)},
+    "video": {"video": media("video", width=640, height=360, duration=5)},
+    "dokumen": {"document": media("document", file_name="a.pdf")},
+    "audio": {"audio": media("audio", duration=120)},
+    "gif": {"animation": media("animation", width=320, height=240, duration=2)},
+    "video note": {"video_note": media("video_note", length=240, duration=4)},
+    "lokasi": {"location": {"latitude": -6.2, "longitude": 106.8}},
+    "kontak": {"contact": {"phone_number": "+620000", "first_name": "Budi"}},
+    "dadu": {"dice": {"emoji": "🎲", "value": 4}},
+    "polling": {"poll": {
+        "id": "1", "question": "Kopi?", "options": [{"text": "Ya", "voter_count": 0, "persistent_id": "1"}, {"text": "Tidak", "voter_count": 0, "persistent_id": "2"}],
+        "total_voter_count": 0, "is_closed": False, "is_anonymous": True, "type": "regular", "allows_multiple_answers": False,
+        "allows_revoting": False, "members_only": False,
+    }},
+}
+ALBUM_SIZE = 4
+legacy_delivered = set()  # message_id yang diteruskan oleh handler lama
+
+
+async def legacy_handle_message(update, context):
+    """Handler relay versi lama: satu metode send_* per jenis, jenis lain terbuang."""
+    user_id = update.message.from_user.id
+    partner_id = bot.chat_partners.get(user_id)
+    message = update.message
+    relay = bot.PRIORITY_RELAY
+    if message.text:
+        await bot.outbox.send(context.bot.send_message, partner_id, relay, text=message.text)
+    elif message.photo:
+        await bot.outbox.send(context.bot.send_photo, partner_id, relay, photo=message.photo[-1].file_id, caption=message.caption)
+    elif message.sticker:
+        await bot.outbox.send(context.bot.send_sticker, partner_id, relay, sticker=message.sticker.file_id)
+    elif message.voice:
+        await bot.outbox.send(context.bot.send_voice, partner_id, relay, voice=message.voice.file_id, caption=message.caption)
+    elif message.video:
+        await bot.outbox.send(context.bot.send_video, partner_id, relay, video=message.video.file_id, caption=message.caption)
+    else:
+        return
+    legacy_delivered.add(message.message_id)
+
+
+def script(pairs, rounds):
+    """Daftar (update, jenis): setiap ronde tiap pengirim mengirim semua jenis pesan lalu satu album."""
+    factory = UpdateFactory()
+    updates = []
+    for round_index in range(rounds):
+        for user_id in range(1, 2 * pairs + 1):
+            for kind, content in CONTENT.items():
+                updates.append((factory.message(user_id, **content), kind))
+            group = f"album-{user_id}-{round_index}"
+            for index in range(ALBUM_SIZE):
+                photo = {"photo": [media(f"album{index}", width=800, height=800)], "media_group_id": group}
+                updates.append((factory.message(user_id, **photo), "album"))
+    return updates
+
+
+def check_order(fake, updates):
+    """Pesan dari tiap pengirim harus sampai ke pasangannya, lengkap dan sesuai urutan kirim."""
+    expected = {}
+    senders = {}
+    for data, _ in updates:
+        message = data["message"]
+        expected.setdefault(bot.chat_partners[message["from"]["id"]], []).append(message["message_id"])
+        senders[message["message_id"]] = message["from"]["id"]
+    problems = 0
+    for chat_id, message_ids in expected.items():
+        received = []
+        for _, method, params in (call for call in fake.calls if str(call[2].get("chat_id")) == str(chat_id)):
+            if method == "copyMessage":
+                received.append(int(params["message_id"]))
+            elif method == "copyMessages":
+                received += [int(message_id) for message_id in params["message_ids"]]
+        by_sender = {}
+        for message_id in received:
+            by_sender.setdefault(senders[message_id], []).append(message_id)
+        problems += sum(ids != sorted(ids) for ids in by_sender.values())
+        problems += len(message_ids) - len(received)
+    return problems
+
+
+async def run(mode, pairs, rounds, latency):
+    reset_state(pairs)
+    bot.album_relay = bot.AlbumRelay(delay=0.05)
+    fake = FakeTelegramRequest(latency=latency)
+    processor = CountingProcessor()
+    application = build_fake_application(fake, processor)
+    if mode == "lama":
+        for handler in application.handlers[0]:
+            if isinstance(handler, MessageHandler) and handler.callback.__name__ == "handle_message":
+                handler.callback = legacy_handle_message
+    updates = script(pairs, rounds)
+    kinds = Counter(kind for _, kind in updates)
+
+    async with application:
+        await application.start()
+        start = time.perf_counter()
+        for data, _ in updates:
+            await application.update_queue.put(Update.de_json(data, application.bot))
+        while processor.done < len(updates):
+            await asyncio.sleep(0.005)
+        await bot.album_relay.flush_all(application.bot)
+        await bot.outbox.drain()
+        elapsed = time.perf_counter() - start
+        await application.stop()
+
+    relay_calls = [call for call in fake.calls if call[1] not in ("getMe", "deleteWebhook")]
+    delivered_ids = set(legacy_delivered) if mode == "lama" else set()
+    for _, method, params in relay_calls:
+        if method == "copyMessage":
+            delivered_ids.add(int(params["message_id"]))
+        elif method == "copyMessages":
+            delivered_ids.update(int(message_id) for message_id in params["message_ids"])
+    delivered = Counter(kind for data, kind in updates if data["message"]["message_id"] in delivered_ids)
+    problems = check_order(fake, updates) if mode == "copy" else None
+    return elapsed, len(relay_calls), kinds, delivered, problems
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--pairs", type=int, default=50)
+    parser.add_argument("--rounds", type=int, default=5)
+    parser.add_argument("--latency", type=float, default=0.01, help="Latensi tiap panggilan API (detik)")
+    args = parser.parse_args()
+
+    failed = False
+    with tempfile.TemporaryDirectory() as tmp:
+        bot.DB_FILE = Path(tmp) / "bench.db"
+        bot.setup_database()
+        for mode in ("lama", "copy"):
+            elapsed, calls, kinds, delivered, problems = asyncio.run(run(mode, args.pairs, args.rounds, args.latency))
+            total = sum(delivered.values())
+            print(
+                f"{mode:<5} {total}/{sum(kinds.values())} pesan sampai dalam {elapsed * 1000:.0f}ms, "
+                f"{calls} panggilan API ({calls / total:.2f} per pesan yang sampai)"
+            )
+            print("      sampai: " + ", ".join(f"{kind} {delivered[kind]}/{total}" for kind, total in kinds.items()))
+            if problems is not None:
+                missing = [kind for kind, total in kinds.items() if delivered[kind] != total]
+                print(f"      jenis tidak lengkap: {missing or '-'}, masalah urutan/hilang: {problems}")
+                failed = bool(missing or problems)
+        bot.db_worker.stop()
+        bot.close_db_connection()
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
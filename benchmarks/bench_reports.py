@@ -0,0 +1,144 @@
+"""Badai laporan: satu pesan Owner per laporan (lama) vs ReportPipeline dengan ringkasan dan blokir otomatis.
+
+Sejumlah pelapor menekan tombol laporan bersamaan lewat fake Bot API; sebagian kecil
+pengguna menjadi sasaran banyak pelapor. Mode "lama" memakai handler versi sebelumnya
+(INSERT + dua baca profil + satu pesan Markdown ke Owner per laporan). Mode "pipeline"
+memakai handler sekarang, lalu flush dan ringkasan dijalankan sekali. Dilaporkan waktu
+pemrosesan, pesan ke Owner, transaksi DB untuk laporan, dan pengguna yang diblokir, serta
+diverifikasi bahwa pengguna yang diblokir ditolak saat /search dan laporan palsu (--forged,
+pelapor yang tidak pernah dipasangkan dengan sasaran) tidak tersimpan di mode pipeline.
+
+Jalankan dari root repo:
+    python benchmarks/bench_reports.py [--reports 5000] [--targets 20] [--latency 0.02]
+"""
+import argparse
+import asyncio
+import random
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from telegram import Update  # noqa: E402
+from telegram.ext import CallbackQueryHandler  # noqa: E402
+
+import bot  # noqa: E402
+from bench_concurrency import reset_state  # noqa: E402
+from fake_telegram import FakeTelegramRequest, UpdateFactory, build_fake_application  # noqa: E402
+
+
+async def legacy_report_button(update, context):
+    """Handler laporan versi lama: tulis langsung dan satu notifikasi Owner per laporan."""
+    query = update.callback_query
+    await query.answer()
+    reporter_id = query.from_user.id
+    reported_id = int(query.data.split('_')[1])
+    timestamp = bot.datetime.now().strftime(bot.REPORT_TIME_FORMAT)
+    await bot.adb_query("INSERT INTO reports (reporter_id, reported_id, timestamp) VALUES (?, ?, ?)", (reporter_id, reported_id, timestamp))
+    await query.edit_message_text("Laporan telah dikirim. Terima kasih.")
+    reporter_profile = await bot.aget_user_profile(reporter_id)
+    reported_profile = await bot.aget_user_profile(reported_id)
+    reporter_info = f"@{reporter_profile['username']} (ID: {reporter_id})" if reporter_profile and reporter_profile.get('username') else f"ID: {reporter_id}"
+    reported_info = f"@{reported_profile['username']} (ID: {reported_id})" if reported_profile and reported_profile.get('username') else f"ID: {reported_id}"
+    await bot.outbox.send(
+        context.bot.send_message, bot.OWNER_ID,
+        text=f"⚠️ **Laporan Baru Diterima** ⚠️\n\n**Pelapor:** {reporter_info}\n**Melaporkan:** {reported_info}",
+        parse_mode='Markdown',
+    )
+
+
+def storm(reports, targets, rng):
+    """(pelapor, dilaporkan): 80% laporan mengarah ke `targets` pengguna sasaran."""
+    return [
+        (1000 + index, rng.randint(1, targets) if rng.random() < 0.8 else rng.randint(targets + 1, 900))
+        for index in range(reports)
+    ]
+
+
+def forged(count, targets):
+    """Laporan dengan callback_data palsu: pelapor yang tidak pernah dipasangkan dengan sasaran."""
+    return [(9000 + index, 1 + index % targets) for index in range(count)]
+
+
+async def run(mode, pairs, latency, fakes=()):
+    reset_state(0)
+    bot.report_pipeline = bot.ReportPipeline()
+    fake = FakeTelegramRequest(latency=latency)
+    application = build_fake_application(fake, bot.PairOrderedUpdateProcessor())
+    if mode == "lama":
+        for handler in application.handlers[0]:
+            if isinstance(handler, CallbackQueryHandler) and handler.pattern.pattern == '^report_':
+                handler.callback = legacy_report_button
+    factory = UpdateFactory()
+    updates = [
+        Update.de_json(factory.callback(reporter, f"report_{reported}"), application.bot)
+        for reporter, reported in list(pairs) + list(fakes)
+    ]
+    commits = bot.metrics.histogram("db_group_commit_seconds").count
+
+    async with application:
+        await application.start()
+        start = time.perf_counter()
+        for update in updates:
+            await application.update_queue.put(update)
+        while fake.counts["editMessageText"] < len(updates) and time.perf_counter() - start < 300:
+            await asyncio.sleep(0.005)
+        await bot.flush_reports()
+        await bot.send_report_digest(application.bot)
+        await bot.outbox.drain()
+        elapsed = time.perf_counter() - start
+
+        # Pengguna yang diblokir tidak boleh bisa masuk antrian
+        blocked = [user_id for user_id in bot.report_pipeline.blocked if bot.report_pipeline.is_blocked(user_id)]
+        for user_id in blocked:
+            await application.process_update(Update.de_json(factory.command(user_id, "search"), application.bot))
+        leaked = [user_id for user_id in blocked if user_id in bot.waiting_queue]
+        await application.stop()
+        await bot.outbox.drain()
+    owner_messages = len(fake.sent_to.get(bot.OWNER_ID, []))
+    commits = bot.metrics.histogram("db_group_commit_seconds").count - commits
+    stored = bot.db_query("SELECT COUNT(*) FROM reports")[0][0]
+    bot.db_query("DELETE FROM reports")
+    return elapsed, owner_messages, commits, stored, blocked, leaked
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--reports", type=int, default=5_000)
+    parser.add_argument("--targets", type=int, default=20, help="Jumlah pengguna sasaran badai laporan")
+    parser.add_argument("--forged", type=int, default=500, help="Laporan palsu terhadap pengguna yang bukan pasangan")
+    parser.add_argument("--latency", type=float, default=0.02, help="Latensi tiap panggilan API (detik)")
+    args = parser.parse_args()
+
+    pairs = storm(args.reports, args.targets, random.Random(17))
+    failed = False
+    with tempfile.TemporaryDirectory() as tmp:
+        bot.DB_FILE = Path(tmp) / "bench.db"
+        bot.setup_database()
+        # Setiap pelapor benar-benar pernah dipasangkan dengan yang dilaporkannya
+        with bot.db_transaction() as conn:
+            conn.executemany(
+                "INSERT OR REPLACE INTO partner_history (user_a, user_b, matched_at) VALUES (?, ?, ?)",
+                [(min(pair), max(pair), time.time()) for pair in pairs],
+            )
+        print(f"{'mode':<9} {'waktu':>9} {'pesan Owner':>12} {'commit DB':>10} {'tersimpan':>10} {'diblokir':>9}")
+        for mode in ("lama", "pipeline"):
+            # Handler lama tidak memvalidasi pasangan, jadi laporan palsu hanya dikirim ke pipeline
+            fakes = forged(args.forged, args.targets) if mode == "pipeline" else ()
+            elapsed, owner_messages, commits, stored, blocked, leaked = asyncio.run(run(mode, pairs, args.latency, fakes))
+            print(f"{mode:<9} {elapsed * 1000:>7.0f}ms {owner_messages:>12} {commits:>10} {stored:>10} {len(blocked):>9}")
+            if stored != len(pairs) or leaked:
+                print(
+                    f"    MASALAH: {stored} laporan tersimpan dari {len(pairs)} yang sah, "
+                    f"{len(leaked)} pengguna diblokir tetap masuk antrian"
+                )
+                failed = True
+        bot.db_worker.stop()
+        bot.close_db_connection()
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
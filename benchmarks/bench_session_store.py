@@ -0,0 +1,89 @@
+"""Benchmark penyimpanan state sesi: blob JSON lama vs baris per pasangan/antrian.
+
+Mengukur biaya tulis per event (match) dan waktu restore saat startup untuk
+sejumlah sesi aktif.
+
+Jalankan dari root repo:
+    python benchmarks/bench_session_store.py [--sessions 100000]
+"""
+import argparse
+import json
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import bot  # noqa: E402
+
+
+def populate(sessions):
+    """Mengisi DB dengan sesi aktif: 80% dalam pasangan, 20% di antrian."""
+    chatting = (sessions * 4 // 5) // 2 * 2
+    conn = bot.get_db_connection()
+    with bot.db_transaction():
+        conn.executemany(
+            "INSERT INTO chat_sessions (user_a, user_b) VALUES (?, ?)",
+            ((uid, uid + 1) for uid in range(0, chatting, 2)),
+        )
+        conn.executemany(
+            "INSERT INTO waiting_entries (user_id, gender, preference, enqueued_at) VALUES (?, ?, ?, ?)",
+            ((uid, "Pria", "Wanita", float(uid)) for uid in range(chatting, sessions)),
+        )
+    partners, queue = bot.load_chat_data()
+    return partners, queue
+
+
+def legacy_save(conn, partners, queue):
+    """Salinan save_chat_data lama: serialisasi ulang seluruh state setiap event."""
+    partners_to_save = {str(k): v for k, v in partners.items()}
+    with conn:
+        conn.execute("UPDATE chat_data SET value = ? WHERE key = 'chat_partners'", (json.dumps(partners_to_save),))
+        conn.execute("UPDATE chat_data SET value = ? WHERE key = 'waiting_queue'", (json.dumps(queue),))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sessions", type=int, default=100_000)
+    parser.add_argument("--events", type=int, default=200)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        bot.DB_FILE = Path(tmp) / "bench.db"
+        bot.setup_database()
+        partners, queue = populate(args.sessions)
+        conn = bot.get_db_connection()
+        conn.execute("CREATE TABLE chat_data (key TEXT PRIMARY KEY, value TEXT NOT NULL)")
+        conn.execute("INSERT INTO chat_data VALUES ('chat_partners', '{}'), ('waiting_queue', '[]')")
+
+        start = time.perf_counter()
+        for _ in range(args.events):
+            legacy_save(conn, partners, queue)
+        legacy_ms = (time.perf_counter() - start) / args.events * 1000
+
+        base = args.sessions * 10
+        start = time.perf_counter()
+        for i in range(args.events):
+            entry = {"user_id": base + i, "gender": "Wanita", "preference": "any", "enqueued_at": time.time()}
+            bot.persist_enqueue(entry)
+            bot.persist_match(base + i, queue[i]["user_id"])
+        delta_ms = (time.perf_counter() - start) / args.events * 1000
+        conn.execute("DROP TABLE chat_data")
+
+        start = time.perf_counter()
+        partners, saved_queue = bot.load_chat_data()
+        waiting = bot.MatchQueue(saved_queue)
+        states = {uid: "chatting" for uid in partners}
+        states.update({entry["user_id"]: "waiting" for entry in waiting})
+        restore_ms = (time.perf_counter() - start) * 1000
+        bot.close_db_connection()
+
+    print(f"Sesi aktif                 : {args.sessions}")
+    print(f"Tulis per event, blob JSON : {legacy_ms:8.2f} ms")
+    print(f"Tulis per event, delta     : {delta_ms:8.3f} ms")
+    print(f"Restore state dari baris   : {restore_ms:8.1f} ms ({len(partners)} chat, {len(waiting)} antrian)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,218 @@
+"""Uji multi-proses untuk sharding: beberapa worker berbagi state sesi lewat SQLite WAL.
+
+Setiap worker adalah proses terpisah yang memproses update milik shard-nya (user_id %
+jumlah worker) lewat fake Bot API: /search, beberapa pesan, lalu /stop, berulang beberapa
+ronde. Setelah selesai, log session_events diputar ulang secara serial untuk membuktikan
+pemasangan yang linearizable:
+
+- setiap event valid terhadap state hasil event sebelumnya (tidak ada user yang dipasangkan
+  dua kali, dipasangkan tanpa antri, atau dengan preferensi yang tidak cocok);
+- hasil pemutaran sama persis dengan tabel chat_sessions/waiting_entries;
+- replika lokal setiap worker konvergen ke state yang sama;
+- setidaknya satu pasangan terbentuk, dan jumlah pesan terkirim sama dengan yang diharapkan
+  dari jumlah update, match, dan sesi yang diakhiri di log.
+
+Jalankan dari root repo:
+    python benchmarks/bench_sharding.py [--users 400] [--rounds 3] [--messages 5] [--workers 1 2 4]
+"""
+import argparse
+import asyncio
+import multiprocessing
+import sqlite3
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from telegram import Update  # noqa: E402
+
+import bot  # noqa: E402
+from fake_telegram import FakeTelegramRequest, UpdateFactory, build_fake_application  # noqa: E402
+
+
+class CountingProcessor(bot.PairOrderedUpdateProcessor):
+    """PairOrderedUpdateProcessor yang menghitung update yang sudah selesai diproses."""
+
+    def __init__(self, *args):
+        super().__init__(*args)
+        self.done = 0
+
+    async def do_process_update(self, update, coroutine):
+        try:
+            await super().do_process_update(update, coroutine)
+        finally:
+            self.done += 1
+
+
+def script_for(user_ids, rounds, messages):
+    """Urutan update untuk satu shard: tiap ronde semua user /search, kirim pesan, lalu /stop."""
+    factory = UpdateFactory()
+    updates = []
+    for round_index in range(rounds):
+        updates += [factory.command(user_id, "search") for user_id in user_ids]
+        for index in range(messages):
+            updates += [factory.message(user_id, f"{user_id}:{round_index}:{index}") for user_id in user_ids]
+        updates += [factory.command(user_id, "stop") for user_id in user_ids]
+    return updates
+
+
+async def run_worker(index, count, shared, args, barrier):
+    bot.SHARD_COUNT, bot.SHARD_INDEX = count, index
+    bot.session_lock = asyncio.Lock()
+    bot.outbox = bot.OutboundScheduler(global_rate=1e9, global_burst=10**9, chat_rate=1e9, chat_burst=10**9)
+    if shared:
+        bot.shared_sessions = bot.SharedSessionState()
+        bot.shared_sessions.reload()
+    else:
+        bot.chat_partners, bot.waiting_queue = {}, bot.MatchQueue()
+
+    fake = FakeTelegramRequest(latency=args.latency)
+    processor = CountingProcessor(args.concurrency)
+    application = build_fake_application(fake, processor)
+    user_ids = [user_id for user_id in range(1, args.users + 1) if user_id % count == index]
+    updates = [Update.de_json(data, application.bot) for data in script_for(user_ids, args.rounds, args.messages)]
+
+    async with application:
+        await application.start()
+        await asyncio.get_running_loop().run_in_executor(None, barrier.wait)
+        start = time.perf_counter()
+        for update in updates:
+            await application.update_queue.put(update)
+        while processor.done < len(updates):
+            await asyncio.sleep(0.005)
+        elapsed = time.perf_counter() - start
+        await application.stop()
+        await bot.outbox.drain()
+
+    # Tunggu semua worker selesai menulis, lalu ambil replika lokal untuk diperiksa konvergensinya
+    await asyncio.get_running_loop().run_in_executor(None, barrier.wait)
+    replica = None
+    if shared:
+        await bot.shared_sessions.refresh()
+        replica = (dict(bot.chat_partners), sorted(entry["user_id"] for entry in bot.waiting_queue))
+        bot.shared_sessions.close()
+    bot.db_worker.stop()
+    bot.close_db_connection()
+    return len(updates), elapsed, fake.counts["sendMessage"] + fake.counts["copyMessage"], replica
+
+
+def worker_main(index, count, shared, args, db_file, barrier, results):
+    bot.DB_FILE = Path(db_file)
+    results.put((index, asyncio.run(run_worker(index, count, shared, args, barrier))))
+
+
+def replay_events(db_file):
+    """Memutar ulang session_events secara serial; mengembalikan (masalah, jumlah match, jumlah sesi berakhir, state akhir)."""
+    conn = sqlite3.connect(db_file)
+    problems = []
+    waiting, partners = {}, {}
+    matches = ends = 0
+    previous_id = 0
+    events = conn.execute(
+        "SELECT event_id, kind, user_a, user_b, gender, preference FROM session_events ORDER BY event_id"
+    ).fetchall()
+    for event_id, kind, user_a, user_b, gender, preference in events:
+        if event_id != previous_id + 1:
+            problems.append(f"Event {previous_id + 1}..{event_id - 1} hilang")
+        previous_id = event_id
+        if kind == "enqueue":
+            if user_a in waiting or user_a in partners:
+                problems.append(f"Event {event_id}: user {user_a} antri padahal sudah sibuk")
+            waiting[user_a] = (gender, preference)
+        elif kind == "cancel":
+            if waiting.pop(user_a, None) is None:
+                problems.append(f"Event {event_id}: user {user_a} batal padahal tidak antri")
+        elif kind == "match":
+            if user_a not in waiting or user_b not in waiting or user_a == user_b:
+                problems.append(f"Event {event_id}: pasangan {user_a}-{user_b} tidak sedang antri (double match)")
+            elif not bot.is_compatible(*waiting[user_a], *waiting[user_b]):
+                problems.append(f"Event {event_id}: pasangan {user_a}-{user_b} tidak cocok")
+            waiting.pop(user_a, None)
+            waiting.pop(user_b, None)
+            partners.update({user_a: user_b, user_b: user_a})
+            matches += 1
+        elif kind == "end":
+            if partners.get(user_a) != user_b:
+                problems.append(f"Event {event_id}: sesi {user_a}-{user_b} diakhiri padahal tidak ada")
+            partners.pop(user_a, None)
+            partners.pop(user_b, None)
+            ends += 1
+
+    table_partners, table_queue = bot.load_chat_data(conn)
+    if table_partners != partners:
+        problems.append("Tabel chat_sessions berbeda dari hasil pemutaran log")
+    if sorted(entry["user_id"] for entry in table_queue) != sorted(waiting):
+        problems.append("Tabel waiting_entries berbeda dari hasil pemutaran log")
+    conn.close()
+    return problems, matches, ends, (partners, sorted(waiting))
+
+
+def run(count, shared, args):
+    with tempfile.TemporaryDirectory() as tmp:
+        db_file = Path(tmp) / "shared.db"
+        bot.DB_FILE = db_file
+        bot.setup_database()
+        for user_id in range(1, args.users + 1):
+            gender = "Pria" if user_id % 3 else "Wanita"
+            bot.update_user_profile(user_id, f"user{user_id}", {"gender": gender, "age": 20, "bio": "bench"})
+        bot.close_db_connection()
+
+        context = multiprocessing.get_context("spawn")
+        barrier = context.Barrier(count)
+        results = context.Queue()
+        processes = [
+            context.Process(target=worker_main, args=(index, count, shared, args, str(db_file), barrier, results))
+            for index in range(count)
+        ]
+        for process in processes:
+            process.start()
+        outcomes = dict(results.get() for _ in processes)
+        for process in processes:
+            process.join()
+
+        total = sum(outcome[0] for outcome in outcomes.values())
+        elapsed = max(outcome[1] for outcome in outcomes.values())
+        sends = sum(outcome[2] for outcome in outcomes.values())
+        problems, matches = [], None
+        if shared:
+            problems, matches, ends, final_state = replay_events(db_file)
+            for index, outcome in sorted(outcomes.items()):
+                if outcome[3] != final_state:
+                    problems.append(f"Replika worker {index} tidak konvergen ke state bersama")
+            if not matches:
+                problems.append("Tidak ada pasangan terbentuk; pemeriksaan double match tidak menguji apa pun")
+            # Setiap update dijawab tepat satu pesan (balasan atau relay), ditambah dua pesan
+            # "pasangan ditemukan" per match dan satu notifikasi partner per sesi yang diakhiri
+            expected = total + 2 * matches + ends
+            if sends != expected:
+                problems.append(f"{sends} pesan terkirim, seharusnya {expected}")
+    return total / elapsed, sends, matches, problems
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--users", type=int, default=400)
+    parser.add_argument("--rounds", type=int, default=3)
+    parser.add_argument("--messages", type=int, default=5)
+    parser.add_argument("--latency", type=float, default=0.005, help="Latensi tiap panggilan API (detik)")
+    parser.add_argument("--concurrency", type=int, default=bot.UPDATE_CONCURRENCY)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+    args = parser.parse_args()
+
+    print(f"{'mode':<16} {'update/s':>10} {'kirim':>8} {'match':>7} {'masalah':>8}")
+    throughput, sends, _, _ = run(1, False, args)
+    print(f"{'lokal (1 proses)':<16} {throughput:>10.0f} {sends:>8} {'-':>7} {'-':>8}")
+    failed = False
+    for count in args.workers:
+        throughput, sends, matches, problems = run(count, True, args)
+        print(f"{f'{count} worker':<16} {throughput:>10.0f} {sends:>8} {matches:>7} {len(problems):>8}")
+        for problem in problems[:10]:
+            print(f"    {problem}")
+        failed = failed or bool(problems)
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
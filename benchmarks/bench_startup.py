@@ -0,0 +1,186 @@
+"""Waktu start sampai update pertama diproses: setup + restore sinkron (lama) vs jalur start cepat.
+
+Database berisi --profiles profil, --reports laporan, --sessions pasangan, dan --waiting
+antrian, seperti bot yang di-deploy ulang setelah shutdown bersih. Setiap mode dijalankan di
+proses baru (--repeats kali, diambil median):
+
+- lama: setup_database() menjalankan seluruh DDL dan menghitung ulang counter (user_version
+  direset ke 0, seperti sebelum ada jalur cepat), lalu restore_sessions() selesai sebelum
+  Application dibangun;
+- cepat: setup_database() hanya membaca user_version, lalu SessionRestore memulihkan sesi di
+  thread selagi bot memanggil getMe, deleteWebhook, dan getUpdates pertama.
+
+Fake Bot API memberi latensi --rtt per panggilan (getUpdates: setengah RTT tiap arah). Satu
+pesan dari pengguna yang sedang chat sudah menunggu di getUpdates; waktu sampai update pertama
+adalah saat pesan itu diteruskan (copyMessage) ke pasangannya, yang sekaligus membuktikan state
+sesi sudah terpasang sebelum handler berjalan. Biaya `import bot` ikut dilaporkan.
+
+Jalankan dari root repo:
+    python benchmarks/bench_startup.py [--sessions 100000] [--profiles 1000000] [--rtt 0.1]
+"""
+import time
+
+IMPORT_STARTED = time.perf_counter()  # sebelum import bot, untuk melaporkan biaya import
+
+import argparse  # noqa: E402
+import asyncio  # noqa: E402
+import json  # noqa: E402
+import random  # noqa: E402
+import shutil  # noqa: E402
+import statistics  # noqa: E402
+import subprocess  # noqa: E402
+import sys  # noqa: E402
+import tempfile  # noqa: E402
+from datetime import datetime, timedelta  # noqa: E402
+from pathlib import Path  # noqa: E402
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import bot  # noqa: E402
+from fake_telegram import FakeTelegramRequest, UpdateFactory, build_fake_application  # noqa: E402
+
+IMPORT_SECONDS = time.perf_counter() - IMPORT_STARTED
+
+
+def fill(path, sessions, waiting, profiles, reports):
+    """Membuat database contoh lalu menutupnya dengan penanda shutdown bersih."""
+    bot.DB_FILE = path
+    bot.setup_database()
+    conn = bot.get_db_connection()
+    rng = random.Random(23)
+    now = datetime.now()
+    with bot.db_transaction():
+        conn.executemany(
+            "INSERT INTO user_profiles (user_id, username, gender, age, bio) VALUES (?, ?, ?, ?, 'bench')",
+            ((user_id, f"user{user_id}", rng.choice(("Pria", "Wanita")), rng.randint(18, 60)) for user_id in range(1, profiles + 1)),
+        )
+        conn.executemany(
+            "INSERT INTO reports (reporter_id, reported_id, timestamp) VALUES (?, ?, ?)",
+            ((rng.randint(1, profiles), rng.randint(1, profiles), (now - timedelta(seconds=rng.randint(0, 30 * 86400))).strftime(bot.REPORT_TIME_FORMAT)) for _ in range(reports)),
+        )
+        conn.executemany("INSERT INTO chat_sessions (user_a, user_b) VALUES (?, ?)", ((2 * i + 1, 2 * i + 2) for i in range(sessions)))
+        conn.executemany(
+            "INSERT INTO waiting_entries (user_id, gender, preference, enqueued_at) VALUES (?, 'Pria', 'Wanita', ?)",
+            ((user_id, time.time()) for user_id in range(2 * sessions + 1, 2 * sessions + 1 + waiting)),
+        )
+    bot.write_shutdown_marker()
+    bot.close_db_connection()
+
+
+def main_like_start(mode):
+    """Langkah sinkron main() sebelum Application dibangun."""
+    bot.setup_database()
+    bot.report_pipeline.load(bot.recent_reports(datetime.now() - bot.REPORT_BLOCK_WINDOW - bot.REPORT_BLOCK_DURATION))
+    if mode == "lama":
+        bot.restore_sessions()
+    else:
+        bot.session_restore.start()
+
+
+async def serve_first_update(fake, started):
+    """Polling seperti Application.run_polling() sampai pesan pertama diteruskan; kembali detik sejak start."""
+    delivered = asyncio.Event()
+    delivered_at = []
+
+    def on_call(method, params):
+        if method == "copyMessage" and not delivered_at:
+            delivered_at.append(time.perf_counter())
+            delivered.set()
+
+    fake.on_call = on_call
+    application = build_fake_application(
+        fake, bot.PairOrderedUpdateProcessor(), updater=True,
+        post_init=bot.post_init, post_stop=bot.post_stop, post_shutdown=bot.post_shutdown,
+    )
+    await application.initialize()
+    await application.post_init(application)
+    await application.updater.start_polling(timeout=1)
+    await application.start()
+    try:
+        await asyncio.wait_for(delivered.wait(), 120)
+    finally:
+        await application.updater.stop()
+        await application.stop()
+        await application.post_stop(application)
+        await application.shutdown()
+        await application.post_shutdown(application)
+    return delivered_at[0] - started
+
+
+def child(mode, path, rtt):
+    bot.DB_FILE = path
+    if mode == "lama":
+        bot.db_query("PRAGMA user_version = 0")
+        bot.close_db_connection()
+    fake = FakeTelegramRequest(latency=rtt, network_delay=rtt / 2)
+    # Pesan dari pengguna 1 (sedang chat dengan pengguna 2) sudah menunggu di server
+    fake.updates.put_nowait(UpdateFactory().message(1, "halo"))
+
+    started = time.perf_counter()
+    main_like_start(mode)
+    setup_done = time.perf_counter() - started
+    first_update = asyncio.run(serve_first_update(fake, started))
+
+    copies = [params for _, method, params in fake.calls if method == "copyMessage"]
+    result = {
+        "import": IMPORT_SECONDS,
+        "blocking": setup_done,
+        "first_update": first_update,
+        "pairs": len(bot.chat_partners) // 2,
+        "waiting": len(bot.waiting_queue),
+        "relayed_to": [int(params["chat_id"]) for params in copies],
+        "problems": bot.check_state_consistency(),
+    }
+    bot.session_restore.join()
+    bot.db_worker.stop()
+    bot.close_db_connection()
+    print(json.dumps(result))
+
+
+def run_child(mode, template, tmp, rtt, run):
+    path = Path(tmp) / f"{mode}-{run}.db"
+    shutil.copyfile(template, path)
+    command = [sys.executable, __file__, "--child", mode, "--db", str(path), "--rtt", str(rtt)]
+    output = subprocess.run(command, check=True, capture_output=True, text=True).stdout
+    return json.loads(output.splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sessions", type=int, default=100_000)
+    parser.add_argument("--waiting", type=int, default=10_000)
+    parser.add_argument("--profiles", type=int, default=1_000_000)
+    parser.add_argument("--reports", type=int, default=200_000)
+    parser.add_argument("--rtt", type=float, default=0.1, help="Latensi tiap panggilan Bot API (detik)")
+    parser.add_argument("--repeats", type=int, default=3)
+    parser.add_argument("--child", choices=("lama", "cepat"), help=argparse.SUPPRESS)
+    parser.add_argument("--db", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.child:
+        child(args.child, Path(args.db), args.rtt)
+        return
+
+    failed = False
+    with tempfile.TemporaryDirectory() as tmp:
+        template = Path(tmp) / "template.db"
+        fill(template, args.sessions, args.waiting, max(args.profiles, 2 * args.sessions + args.waiting), args.reports)
+        print(f"{args.sessions} pasangan + {args.waiting} antrian, {args.profiles} profil, {args.reports} laporan; RTT {args.rtt * 1000:.0f}ms")
+        print(f"{'mode':<6} {'import bot':>11} {'blokir main()':>14} {'update pertama':>15}")
+        for mode in ("lama", "cepat"):
+            results = [run_child(mode, template, tmp, args.rtt, run) for run in range(args.repeats)]
+            median = {key: statistics.median(result[key] for result in results) for key in ("import", "blocking", "first_update")}
+            print(f"{mode:<6} {median['import'] * 1000:>9.0f}ms {median['blocking'] * 1000:>12.0f}ms {median['first_update'] * 1000:>13.0f}ms")
+            for result in results:
+                problems = list(result["problems"])
+                if (result["pairs"], result["waiting"]) != (args.sessions, args.waiting):
+                    problems.append(f"state dipulihkan {result['pairs']} pasangan + {result['waiting']} antrian")
+                if result["relayed_to"] != [2]:
+                    problems.append(f"pesan pertama diteruskan ke {result['relayed_to']}, seharusnya [2]")
+                for problem in problems:
+                    print(f"    MASALAH ({mode}): {problem}")
+                failed = failed or bool(problems)
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,97 @@
+"""Counter statistik yang dijaga trigger vs COUNT(*) untuk /stats dan /adminstats.
+
+Untuk beberapa ukuran tabel, mengukur waktu tiga COUNT(*) lama dibanding membaca
+stats_counters, biaya tambahan trigger pada INSERT profil, lalu memverifikasi setelah
+campuran insert/upgrade Pro/hapus/laporan bahwa counter sama dengan COUNT(*).
+
+Jalankan dari root repo:
+    python benchmarks/bench_stats.py [--sizes 10000 100000 1000000]
+"""
+import argparse
+import random
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import bot  # noqa: E402
+
+LEGACY_QUERIES = (
+    "SELECT COUNT(*) FROM user_profiles",
+    "SELECT COUNT(*) FROM user_profiles WHERE is_pro = 1",
+    "SELECT COUNT(*) FROM reports",
+)
+
+
+def timed(func, repeats):
+    start = time.perf_counter()
+    for _ in range(repeats):
+        func()
+    return (time.perf_counter() - start) / repeats
+
+
+def legacy_counts():
+    return {name: bot.db_query(query)[0][0] for name, query in zip(("total_users", "pro_users", "total_reports"), LEGACY_QUERIES)}
+
+
+def fill(size, rng):
+    conn = bot.get_db_connection()
+    rows = [(user_id, f"user{user_id}", int(rng.random() < 0.05)) for user_id in range(1, size + 1)]
+    with bot.db_transaction():
+        start = time.perf_counter()
+        conn.executemany("INSERT INTO user_profiles (user_id, username, is_pro) VALUES (?, ?, ?)", rows)
+        elapsed = time.perf_counter() - start
+        conn.executemany(
+            "INSERT INTO reports (reporter_id, reported_id, timestamp) VALUES (?, ?, '2024-01-01 00:00:00')",
+            [(rng.randint(1, size), rng.randint(1, size)) for _ in range(size // 20)],
+        )
+    return elapsed / size
+
+
+def churn(size, rng, operations):
+    """Campuran perubahan acak lewat jalur kode bot (upsert, touch, hapus, laporan)."""
+    next_user = size + 1
+    for _ in range(operations):
+        choice = rng.random()
+        with bot.db_transaction():
+            if choice < 0.3:
+                bot.touch_user_profile(next_user, f"user{next_user}")
+                next_user += 1
+            elif choice < 0.5:
+                user_id = rng.randint(1, size)
+                bot.update_user_profile(user_id, None, {"is_pro": rng.random() < 0.5})
+            elif choice < 0.6:
+                bot.db_query("DELETE FROM user_profiles WHERE user_id = ?", (rng.randint(1, next_user),))
+                bot.profile_cache.clear()
+            elif choice < 0.9:
+                bot.db_query("INSERT INTO reports (reporter_id, reported_id, timestamp) VALUES (?, ?, '2024-01-01 00:00:00')", (1, 2))
+            else:
+                bot.db_query("DELETE FROM reports WHERE report_id = (SELECT MIN(report_id) FROM reports)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10_000, 100_000, 1_000_000])
+    parser.add_argument("--operations", type=int, default=5_000)
+    args = parser.parse_args()
+
+    rng = random.Random(14)
+    print(f"{'baris':>10} {'COUNT(*) x3':>12} {'counter':>10} {'insert+trigger':>15} {'cocok':>6}")
+    for size in args.sizes:
+        with tempfile.TemporaryDirectory() as tmp:
+            bot.DB_FILE = Path(tmp) / "bench.db"
+            bot.profile_cache.clear()
+            bot.setup_database()
+            insert_cost = fill(size, rng)
+            churn(size, rng, args.operations)
+            legacy = timed(legacy_counts, 5)
+            counters = timed(bot.read_stats_counters, 200)
+            match = bot.read_stats_counters() == legacy_counts()
+            print(f"{size:>10} {legacy * 1e3:>10.2f}ms {counters * 1e6:>8.1f}us {insert_cost * 1e6:>13.2f}us {'ya' if match else 'TIDAK':>6}")
+            bot.close_db_connection()
+
+
+if __name__ == "__main__":
+    main()
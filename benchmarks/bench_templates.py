@@ -0,0 +1,154 @@
+"""Alokasi dan waktu per notifikasi: f-string + keyboard baru setiap kali (lama) vs MessageTemplates.
+
+Notifikasi yang diukur:
+- pasangan ditemukan: dua teks perkenalan untuk pasangan yang profilnya tidak berubah;
+- chat berakhir: teks + keyboard "Cari Partner Baru / Stop / Laporkan" untuk partner;
+- /start dan /find_by_gender: teks + keyboard statis.
+
+Untuk tiap notifikasi hasilnya disimpan sampai akhir putaran (seperti antri di outbox), lalu
+dihitung blok memori dan byte baru per notifikasi dengan tracemalloc, serta waktu per
+notifikasi tanpa tracemalloc. Hasil versi template dibandingkan dengan versi lama (bahasa
+"id") agar teks dan keyboard yang dikirim tetap sama.
+
+Jalankan dari root repo:
+    python benchmarks/bench_templates.py [--notifications 20000] [--users 1000]
+"""
+import argparse
+import sys
+import time
+import tracemalloc
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from telegram import InlineKeyboardButton, InlineKeyboardMarkup  # noqa: E402
+
+import bot  # noqa: E402
+
+
+def legacy_match(profile1, profile2):
+    """Salinan announce_match versi lama (tanpa pengiriman)."""
+    profile1 = profile1 or {"gender": "Misteri", "age": "??", "bio": "-"}
+    profile2 = profile2 or {"gender": "Misteri", "age": "??", "bio": "-"}
+    profile1_msg = f"Gender: {profile1['gender']}\nUmur: {profile1['age']}\nBio: {profile1['bio']}"
+    profile2_msg = f"Gender: {profile2['gender']}\nUmur: {profile2['age']}\nBio: {profile2['bio']}"
+    return (
+        f"✅ Pasangan ditemukan!\n\nProfil pasanganmu:\n{profile2_msg}\n\nKetik /stop untuk mengakhiri, /next untuk cari lagi.",
+        f"✅ Pasangan ditemukan!\n\nProfil pasanganmu:\n{profile1_msg}\n\nKetik /stop untuk mengakhiri, /next untuk cari lagi.",
+    )
+
+
+def legacy_post_chat(reported_id):
+    keyboard = [
+        [InlineKeyboardButton("Cari Partner Baru 🔎", callback_data="post_chat_new_search"), InlineKeyboardButton("Stop ⏹️", callback_data="post_chat_stop")],
+        [InlineKeyboardButton("🚩 Laporkan Partner Terakhir", callback_data=f"report_{reported_id}")]
+    ]
+    return "❌ Pasanganmu telah menghentikan percakapan.", InlineKeyboardMarkup(keyboard)
+
+
+def legacy_start():
+    keyboard = [
+        [InlineKeyboardButton("Lengkapi Profil 📝", callback_data="start_setup_profile")],
+        [InlineKeyboardButton("Lanjutkan & Cari Acak ➡️", callback_data="start_random_search")]
+    ]
+    return (
+        "👋 Selamat datang! Agar pengalaman chat lebih baik, kamu bisa melengkapi profil singkat. "
+        "Atau, kamu bisa langsung mencari pasangan secara acak.",
+        InlineKeyboardMarkup(keyboard),
+    )
+
+
+def legacy_find_by_gender():
+    keyboard = [
+        [InlineKeyboardButton("Pria", callback_data="Pria"), InlineKeyboardButton("Wanita", callback_data="Wanita")],
+        [InlineKeyboardButton("Apapun", callback_data="any")]
+    ]
+    return "Pilih gender pasangan yang ingin kamu cari:", InlineKeyboardMarkup(keyboard)
+
+
+def template_match(templates, user1_id, profile1, user2_id, profile2):
+    return (
+        templates.match_found(user2_id, profile2, templates.language(profile1)),
+        templates.match_found(user1_id, profile1, templates.language(profile2)),
+    )
+
+
+def template_post_chat(templates, reported_id, language):
+    return templates.text("partner_stopped", language), templates.post_chat_keyboard(reported_id, language)
+
+
+def scenarios(users):
+    """(nama, fungsi lama, fungsi template) dengan argumen per notifikasi ke-i."""
+    profiles = {
+        user_id: {"user_id": user_id, "gender": ("Pria", "Wanita", "Rahasia")[user_id % 3], "age": 18 + user_id % 40, "bio": f"bio {user_id}", "language": "id"}
+        for user_id in range(1, users + 1)
+    }
+    templates = bot.MessageTemplates()
+
+    def pair(i):
+        user1_id = i % users + 1
+        user2_id = (i * 7 + 3) % users + 1
+        return user1_id, profiles[user1_id], user2_id, profiles[user2_id]
+
+    return templates, [
+        ("pasangan ditemukan", lambda i: legacy_match(pair(i)[1], pair(i)[3]), lambda i: template_match(templates, *pair(i))),
+        ("chat berakhir", lambda i: legacy_post_chat(i % users + 1), lambda i: template_post_chat(templates, i % users + 1, "id")),
+        ("/start", lambda i: legacy_start(), lambda i: (templates.text("welcome_new", "id"), templates.keyboard("start", "id"))),
+        ("/find_by_gender", lambda i: legacy_find_by_gender(), lambda i: (templates.text("choose_partner_gender", "id"), templates.keyboard("partner_gender", "id"))),
+    ]
+
+
+def same_output(old, new):
+    """Teks sama persis; keyboard dibandingkan lewat bentuk JSON yang dikirim ke Bot API."""
+    if len(old) != len(new):
+        return False
+    return all(a.to_dict() == b.to_dict() if isinstance(a, InlineKeyboardMarkup) else a == b for a, b in zip(old, new))
+
+
+def allocations(render, count):
+    """(blok, byte) baru per notifikasi; hasil disimpan agar objek yang dibuat tidak langsung dibebaskan."""
+    kept = []
+    tracemalloc.start()
+    before = tracemalloc.take_snapshot()
+    for i in range(count):
+        kept.append(render(i))
+    after = tracemalloc.take_snapshot()
+    tracemalloc.stop()
+    stats = after.compare_to(before, "filename")
+    blocks = sum(stat.count_diff for stat in stats)
+    size = sum(stat.size_diff for stat in stats)
+    # Daftar `kept` sendiri bukan bagian dari notifikasi
+    return (blocks - 1) / count, (size - sys.getsizeof(kept)) / count
+
+
+def timed(render, count):
+    start = time.perf_counter()
+    for i in range(count):
+        render(i)
+    return (time.perf_counter() - start) / count
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--notifications", type=int, default=20_000)
+    parser.add_argument("--users", type=int, default=1_000, help="Pengguna berbeda yang profilnya dipakai ulang")
+    args = parser.parse_args()
+
+    templates, cases = scenarios(args.users)
+    failed = False
+    print(f"{'notifikasi':<20} {'versi':<9} {'blok':>7} {'byte':>9} {'waktu':>9}")
+    for name, legacy, template in cases:
+        mismatches = sum(not same_output(legacy(i), template(i)) for i in range(min(args.notifications, 2 * args.users)))
+        for label, render in (("lama", legacy), ("template", template)):
+            blocks, size = allocations(render, args.notifications)
+            print(f"{name:<20} {label:<9} {blocks:>7.1f} {size:>9.0f} {timed(render, args.notifications) * 1e6:>7.2f}µs")
+        if mismatches:
+            print(f"    MASALAH: {mismatches} notifikasi berbeda dari versi lama")
+            failed = True
+    stats = templates.stats()
+    print(f"cache perkenalan: {stats['intros']} profil, {stats['hits']} hit / {stats['misses']} miss")
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
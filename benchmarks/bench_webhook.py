@@ -0,0 +1,164 @@
+"""Perbandingan polling vs webhook: latensi relay end-to-end dan update/detik.
+
+Update rekaman (atau sintetis) diputar ulang ke bot:
+- polling: lewat getUpdates fake Bot API dengan jeda jaringan satu arah --delay;
+- webhook: di-POST lewat HTTP keep-alive ke WebhookServer lokal, dengan jeda yang sama.
+Latensi relay diukur dari saat update "dikirim Telegram" sampai bot memanggil copyMessage
+ke pasangan.
+
+Jalankan dari root repo:
+    python benchmarks/bench_webhook.py [--updates-file rekaman.jsonl] [--pairs 50] [--messages 10]
+"""
+import argparse
+import asyncio
+import json
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import bot  # noqa: E402
+from bench_concurrency import reset_state  # noqa: E402
+from fake_telegram import FakeTelegramRequest, UpdateFactory, build_fake_application  # noqa: E402
+
+
+def load_updates(path, pairs, messages):
+    """Update dari file JSONL rekaman, atau pesan relay sintetis antar `pairs` pasangan."""
+    if path:
+        with open(path) as handle:
+            return [json.loads(line) for line in handle if line.strip()]
+    factory = UpdateFactory()
+    return [factory.message(uid, f"{uid}:{i}") for i in range(messages) for uid in range(1, 2 * pairs + 1)]
+
+
+class WebhookClient:
+    """Klien HTTP keep-alive sederhana yang meniru Telegram (beberapa koneksi paralel)."""
+
+    def __init__(self, port, path, connections):
+        self.port = port
+        self.path = path
+        self.connections = connections
+        self._pool = asyncio.Queue()
+
+    async def open(self):
+        for _ in range(self.connections):
+            self._pool.put_nowait(await asyncio.open_connection("127.0.0.1", self.port))
+
+    async def close(self):
+        while not self._pool.empty():
+            _, writer = self._pool.get_nowait()
+            writer.close()
+
+    async def post(self, payload):
+        body = json.dumps(payload).encode()
+        reader, writer = await self._pool.get()
+        try:
+            writer.write(
+                f"POST {self.path} HTTP/1.1\r\nHost: localhost\r\nContent-Type: application/json\r\n"
+                f"Content-Length: {len(body)}\r\n\r\n".encode() + body
+            )
+            await writer.drain()
+            status = int((await reader.readline()).split()[1])
+            while (await reader.readline()) not in (b"\r\n", b""):
+                pass
+            return status
+        finally:
+            self._pool.put_nowait((reader, writer))
+
+
+async def run(mode, updates, pairs, delay, rate, concurrency):
+    reset_state(pairs)
+    fake = FakeTelegramRequest(network_delay=delay)
+    sent_at = {}
+    latencies = []
+
+    def on_call(method, params):
+        source = (int(params.get("from_chat_id", 0)), int(params.get("message_id", 0)))
+        if method == "copyMessage" and source in sent_at:
+            latencies.append(time.perf_counter() - sent_at.pop(source))
+
+    fake.on_call = on_call
+    application = build_fake_application(
+        fake, bot.PairOrderedUpdateProcessor(concurrency), updater=(mode == "polling"),
+    )
+    server = client = None
+    async with application:
+        await application.start()
+        if mode == "polling":
+            await application.updater.start_polling(poll_interval=0, timeout=10)
+        else:
+            server = bot.WebhookServer(application, listen="127.0.0.1", port=0, path="/hook", secret_token="")
+            await server.start()
+            client = WebhookClient(server.port, "/hook", connections=bot.WEBHOOK_MAX_CONNECTIONS // 4)
+            await client.open()
+
+        async def deliver(payload):
+            message = payload["message"]
+            sent_at[(message["chat"]["id"], message["message_id"])] = time.perf_counter()
+            if mode == "polling":
+                fake.updates.put_nowait(payload)
+            else:
+                await asyncio.sleep(delay)  # perjalanan request dari Telegram ke server
+                await client.post(payload)
+
+        start = time.perf_counter()
+        tasks = []
+        for index, payload in enumerate(updates):
+            if rate:
+                target = start + index / rate
+                if target > time.perf_counter():
+                    await asyncio.sleep(target - time.perf_counter())
+            tasks.append(asyncio.create_task(deliver(payload)))
+        await asyncio.gather(*tasks)
+        while len(latencies) < len(updates) and time.perf_counter() - start < 120:
+            await asyncio.sleep(0.005)
+        elapsed = time.perf_counter() - start
+
+        if client:
+            await client.close()
+        if server:
+            await server.stop()
+        if application.updater and application.updater.running:
+            await application.updater.stop()
+        await application.stop()
+        await bot.outbox.drain()
+    return latencies, elapsed
+
+
+def report(label, latencies, elapsed, total):
+    ms = sorted(v * 1000 for v in latencies)
+    pick = lambda pct: ms[min(len(ms) - 1, int(len(ms) * pct / 100))] if ms else float("nan")  # noqa: E731
+    print(
+        f"{label:<26} relay={len(ms):>5}/{total:<5} p50={pick(50):7.1f}ms p99={pick(99):7.1f}ms "
+        f"mean={statistics.fmean(ms) if ms else float('nan'):7.1f}ms  {len(ms) / elapsed:8.0f} upd/s"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--updates-file", help="File JSONL berisi update Telegram rekaman")
+    parser.add_argument("--pairs", type=int, default=50)
+    parser.add_argument("--messages", type=int, default=10)
+    parser.add_argument("--delay", type=float, default=0.02, help="Jeda jaringan satu arah (detik)")
+    parser.add_argument("--rate", type=float, default=500, help="Laju update untuk pengukuran latensi")
+    parser.add_argument("--concurrency", type=int, default=bot.UPDATE_CONCURRENCY)
+    args = parser.parse_args()
+
+    updates = load_updates(args.updates_file, args.pairs, args.messages)
+    with tempfile.TemporaryDirectory() as tmp:
+        bot.DB_FILE = Path(tmp) / "bench.db"
+        bot.setup_database()
+        for mode in ("polling", "webhook"):
+            latencies, elapsed = asyncio.run(run(mode, updates, args.pairs, args.delay, args.rate, args.concurrency))
+            report(f"{mode} @ {args.rate:.0f} upd/s", latencies, elapsed, len(updates))
+            latencies, elapsed = asyncio.run(run(mode, updates, args.pairs, args.delay, 0, args.concurrency))
+            report(f"{mode} burst", latencies, elapsed, len(updates))
+        bot.db_worker.stop()
+        bot.close_db_connection()
+
+
+if __name__ == "__main__":
+    main()
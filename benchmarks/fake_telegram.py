@@ -0,0 +1,192 @@
+"""Fake Bot API in-process untuk benchmark dan uji beban.
+
+FakeTelegramRequest menggantikan lapisan HTTP PTB (BaseRequest), jadi Application dan Bot
+berjalan apa adanya tanpa menghubungi Telegram. Setiap pemanggilan API dicatat beserta
+waktunya, dan latensi jaringan bisa disimulasikan.
+"""
+import asyncio
+import itertools
+import json
+import time
+import warnings
+from collections import Counter, defaultdict
+
+from telegram.request import BaseRequest
+from telegram.warnings import PTBUserWarning
+
+BOT_USER = {"id": 1000000, "is_bot": True, "first_name": "FakeBot", "username": "fake_bot"}
+
+
+def private_chat(user_id):
+    return {"id": user_id, "type": "private", "first_name": f"user{user_id}"}
+
+
+def make_user(user_id, username=None):
+    return {"id": user_id, "is_bot": False, "first_name": f"user{user_id}", "username": username or f"user{user_id}"}
+
+
+# Teks pesan yang dibuat UpdateFactory, agar copyMessage tercatat dengan teks aslinya
+SOURCE_TEXTS = {}  # (chat_id, message_id) -> teks
+
+
+def copied_text(params):
+    """Teks asli pesan yang disalin oleh copyMessage, atau None jika bukan pesan teks."""
+    return SOURCE_TEXTS.get((int(params.get("from_chat_id", 0)), int(params.get("message_id", 0))))
+
+
+class UpdateFactory:
+    """Membuat dict update Telegram (format JSON Bot API) dengan update_id berurutan."""
+
+    def __init__(self):
+        self._update_ids = itertools.count(1)
+        self._message_ids = itertools.count(1)
+
+    def message(self, user_id, text=None, **content):
+        message = {
+            "message_id": next(self._message_ids),
+            "date": int(time.time()),
+            "chat": private_chat(user_id),
+            "from": make_user(user_id),
+            **content,
+        }
+        if text is not None:
+            message["text"] = text
+            SOURCE_TEXTS[(user_id, message["message_id"])] = text
+            if text.startswith("/"):
+                command = text.split()[0]
+                message["entities"] = [{"type": "bot_command", "offset": 0, "length": len(command)}]
+        return {"update_id": next(self._update_ids), "message": message}
+
+    def command(self, user_id, command, *args):
+        return self.message(user_id, " ".join((f"/{command}",) + args))
+
+    def callback(self, user_id, data, message_text="menu"):
+        return {
+            "update_id": next(self._update_ids),
+            "callback_query": {
+                "id": str(next(self._message_ids)),
+                "from": make_user(user_id),
+                "chat_instance": str(user_id),
+                "data": data,
+                "message": {
+                    "message_id": next(self._message_ids),
+                    "date": int(time.time()),
+                    "chat": private_chat(user_id),
+                    "from": BOT_USER,
+                    "text": message_text,
+                },
+            },
+        }
+
+
+class FakeTelegramRequest(BaseRequest):
+    """BaseRequest palsu yang menjawab metode Bot API yang dipakai bot.py."""
+
+    def __init__(self, latency=0.0, network_delay=0.0):
+        self.latency = latency
+        self.network_delay = network_delay  # jeda satu arah untuk getUpdates (simulasi RTT polling)
+        self.calls = []  # (waktu, metode, parameter)
+        self.counts = Counter()
+        self.sent_to = defaultdict(list)  # chat_id -> daftar teks/penanda yang dikirim
+        self.on_call = None  # callback(method, params) opsional untuk pengukuran
+        self.updates = asyncio.Queue()  # antrian update untuk getUpdates
+        self._message_ids = itertools.count(1)
+
+    @property
+    def read_timeout(self):
+        return None
+
+    async def initialize(self):
+        pass
+
+    async def shutdown(self):
+        pass
+
+    def _message(self, params, **content):
+        return {
+            "message_id": next(self._message_ids),
+            "date": int(time.time()),
+            "chat": private_chat(int(params.get("chat_id", 0))),
+            "from": BOT_USER,
+            **content,
+        }
+
+    async def _get_updates(self, params):
+        timeout = float(params.get("timeout") or 0)
+        limit = int(params.get("limit") or 100)
+        batch = []
+        if self.network_delay:
+            await asyncio.sleep(self.network_delay)  # request menuju server
+        try:
+            batch.append(await asyncio.wait_for(self.updates.get(), timeout) if timeout else self.updates.get_nowait())
+        except (asyncio.TimeoutError, asyncio.QueueEmpty):
+            return []
+        while len(batch) < limit and not self.updates.empty():
+            batch.append(self.updates.get_nowait())
+        if self.network_delay:
+            await asyncio.sleep(self.network_delay)  # response kembali ke bot
+        return batch
+
+    async def do_request(self, url, method, request_data=None, read_timeout=None, write_timeout=None,
+                         connect_timeout=None, pool_timeout=None):
+        api_method = url.rsplit("/", 1)[-1]
+        params = request_data.parameters if request_data else {}
+        self.counts[api_method] += 1
+        if api_method != "getUpdates":
+            self.calls.append((time.perf_counter(), api_method, params))
+            if self.latency:
+                await asyncio.sleep(self.latency)
+        if self.on_call is not None:
+            self.on_call(api_method, params)
+
+        if api_method == "getMe":
+            result = BOT_USER
+        elif api_method == "getUpdates":
+            result = await self._get_updates(params)
+        elif api_method in ("sendMessage", "editMessageText"):
+            self.sent_to[int(params.get("chat_id", 0))].append(params.get("text"))
+            result = self._message(params, text=params.get("text", ""))
+        elif api_method.startswith("send"):
+            self.sent_to[int(params["chat_id"])].append(api_method)
+            result = self._message(params)
+        elif api_method == "copyMessage":
+            self.sent_to[int(params["chat_id"])].append(copied_text(params) or ("copy", params.get("message_id")))
+            result = {"message_id": next(self._message_ids)}
+        elif api_method == "copyMessages":
+            ids = params.get("message_ids", [])
+            self.sent_to[int(params["chat_id"])].append(("copy_many", tuple(ids)))
+            result = [{"message_id": next(self._message_ids)} for _ in ids]
+        elif api_method == "getChat":
+            result = private_chat(int(params["chat_id"]))
+        else:
+            # answerCallbackQuery, deleteMessage, setWebhook, deleteWebhook, dll.
+            result = True
+        return 200, json.dumps({"ok": True, "result": result}).encode()
+
+
+def build_fake_application(fake_request, processor=None, updater=False, **builder_options):
+    """Membuat Application bot.py yang terhubung ke fake Bot API.
+
+    Tanpa `updater`, update dimasukkan langsung ke application.update_queue (atau lewat webhook).
+    """
+    import bot
+    from telegram.ext import Application
+
+    builder = (
+        Application.builder()
+        .token("123456:FAKE")
+        .request(fake_request)
+        .get_updates_request(fake_request)
+    )
+    if not updater:
+        builder = builder.updater(None)
+    if processor is not None:
+        builder = builder.concurrent_updates(processor)
+    for option, value in builder_options.items():
+        builder = getattr(builder, option)(value)
+    application = builder.build()
+    with warnings.catch_warnings():
+        # Peringatan per_message ConversationHandler tidak relevan untuk benchmark
+        warnings.simplefilter("ignore", PTBUserWarning)
+        bot.register_handlers(application)
+    return application
@@ -0,0 +1,461 @@
+"""Uji beban siklus hidup lengkap dengan fake Bot API dan hasil JSON yang bisa dibandingkan.
+
+N pengguna virtual menjalankan alur nyata lewat Application bot.py yang asli:
+/start, /profile (gender -> umur -> bio) atau tombol "cari acak", /search atau
+/find_by_gender (pengguna Pro, di-upgrade Owner lewat /grant_pro), relay pesan, /next,
+/stop, dan tombol laporan. Skenario ditentukan oleh --seed sehingga bisa diulang: semua
+nilai acak tiap pengguna (jawaban profil, jeda berpikir, /next atau /stop, laporan) diambil
+di awal, jadi urutan acaknya tidak bergeser mengikuti siapa mendapat pasangan lebih dulu.
+Waktu diukur sampai semua pekerjaan selesai, termasuk notifikasi yang dijadwalkan tanpa
+ditunggu (pasangan ditemukan, outbox).
+
+Yang dicatat: throughput update, persentil latensi (keseluruhan dan per jenis update),
+statement SQL dan commit per update, panggilan Bot API per update, error handler, serta
+memori (RSS). Skenario dijalankan --runs kali, masing-masing di proses baru, dan yang
+dilaporkan adalah median tiap metrik. Hasil ditulis sebagai JSON (--output) dan bisa
+dibandingkan dengan hasil sebelumnya (--compare); metrik dianggap regresi jika median
+memburuk melebihi --tolerance ditambah sebaran antar-run pada hasil pembanding.
+
+Jalankan dari root repo:
+    python benchmarks/loadtest.py --users 200 --output hasil.json
+    python benchmarks/loadtest.py --users 200 --compare hasil.json
+"""
+import argparse
+import asyncio
+import json
+import platform
+import random
+import resource
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from collections import Counter, defaultdict
+from datetime import datetime
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from telegram import Update  # noqa: E402
+
+import bot  # noqa: E402
+from bench_concurrency import reset_state  # noqa: E402
+from fake_telegram import FakeTelegramRequest, UpdateFactory, build_fake_application  # noqa: E402
+
+# Metrik yang dibandingkan dengan --compare: (kunci, True jika lebih besar lebih baik)
+COMPARED = (
+    ("throughput_updates_per_s", True),
+    ("latency_ms.p50", False),
+    ("latency_ms.p95", False),
+    ("latency_ms.p99", False),
+    ("db_statements_per_update", False),
+    ("db_commits_per_update", False),
+    ("api_calls_per_update", False),
+    ("memory.peak_rss_mb", False),
+)
+
+
+def percentiles(values):
+    ordered = sorted(values)
+    if not ordered:
+        return {"count": 0}
+    pick = lambda pct: ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]  # noqa: E731
+    return {
+        "count": len(ordered),
+        "mean": round(sum(ordered) / len(ordered), 3),
+        "p50": round(pick(50), 3),
+        "p95": round(pick(95), 3),
+        "p99": round(pick(99), 3),
+        "max": round(ordered[-1], 3),
+    }
+
+
+def current_rss_mb():
+    try:
+        with open("/proc/self/statm") as handle:
+            return int(handle.read().split()[1]) * resource.getpagesize() / 2**20
+    except OSError:
+        return None
+
+
+class SqlCounter:
+    """Menghitung statement SQL lewat trace callback koneksi bersama (kontrol transaksi terpisah)."""
+
+    CONTROL = ("BEGIN", "COMMIT", "ROLLBACK", "SAVEPOINT", "RELEASE")
+
+    def __init__(self):
+        self.statements = 0
+        self.commits = 0
+        self.trigger_statements = 0
+
+    def __call__(self, statement):
+        head = statement.lstrip()[:9].upper()
+        if head.startswith("--"):
+            self.trigger_statements += 1
+        elif head.startswith("COMMIT"):
+            self.commits += 1
+        elif not head.startswith(self.CONTROL):
+            self.statements += 1
+
+
+class LoadProcessor(bot.PairOrderedUpdateProcessor):
+    """Mencatat kapan setiap update selesai diproses dan membangunkan pengirimnya."""
+
+    def __init__(self, driver, *args):
+        super().__init__(*args)
+        self.driver = driver
+
+    async def do_process_update(self, update, coroutine):
+        try:
+            await super().do_process_update(update, coroutine)
+        finally:
+            self.driver.completed(update.update_id)
+
+
+class Driver:
+    """Menyuntikkan update ke aplikasi dan mengukur latensinya sampai selesai diproses."""
+
+    def __init__(self, application):
+        self.application = application
+        self.factory = UpdateFactory()
+        self._pending = {}  # update_id -> (jenis, mulai, future)
+        self.latencies = defaultdict(list)  # jenis -> [ms]
+        self.processed = 0
+
+    def completed(self, update_id):
+        kind, started, future = self._pending.pop(update_id)
+        self.latencies[kind].append((time.perf_counter() - started) * 1000)
+        self.processed += 1
+        if not future.done():
+            future.set_result(None)
+
+    async def send(self, kind, data):
+        future = asyncio.get_running_loop().create_future()
+        self._pending[data["update_id"]] = (kind, time.perf_counter(), future)
+        await self.application.update_queue.put(Update.de_json(data, self.application.bot))
+        await future
+
+    async def command(self, user_id, command, *args):
+        await self.send(f"/{command}", self.factory.command(user_id, command, *args))
+
+    async def text(self, user_id, text, kind="teks"):
+        await self.send(kind, self.factory.message(user_id, text))
+
+    async def callback(self, user_id, data, kind):
+        await self.send(kind, self.factory.callback(user_id, data))
+
+
+async def wait_until(predicate, timeout):
+    deadline = time.perf_counter() + timeout
+    while not predicate():
+        if time.perf_counter() >= deadline:
+            return False
+        await asyncio.sleep(0.01)
+    return True
+
+
+def draw_script(rng, args):
+    """Semua nilai acak satu pengguna, diambil sekaligus dalam urutan tetap."""
+    def think():
+        return rng.expovariate(1 / args.think) if args.think else 0.0
+
+    return {
+        "gender": rng.choice(("Pria", "Wanita", "Rahasia")),
+        "age": rng.randint(18, 60),
+        "think": think(),
+        "sessions": [
+            {
+                "preference": rng.choice(("Pria", "Wanita", "any")),
+                "think": [think() for _ in range(args.messages + 1)],
+                "report": rng.random() < args.report_ratio,
+                "next": rng.random() < 0.5,
+            }
+            for _ in range(args.sessions)
+        ],
+    }
+
+
+async def user_agent(driver, user_id, script, args, plan, outcomes):
+    """Satu pengguna virtual: profil, beberapa sesi chat, lalu berhenti."""
+    async def think(delay):
+        if delay:
+            await asyncio.sleep(delay)
+
+    await driver.command(user_id, "start")
+    await think(script["think"])
+    if plan["profile"]:
+        await driver.command(user_id, "profile")
+        await driver.callback(user_id, script["gender"], "callback:gender")
+        await driver.text(user_id, str(script["age"]), "profil:umur")
+        await driver.text(user_id, f"Halo, aku user {user_id}", "profil:bio")
+    else:
+        await driver.callback(user_id, "start_random_search", "callback:cari_acak")
+    if plan["pro"]:
+        await plan["granted"].wait()
+
+    searching = not plan["profile"]  # tombol "cari acak" sudah memasukkan ke antrian
+    for session in script["sessions"]:
+        if not searching:
+            if plan["pro"]:
+                await driver.command(user_id, "find_by_gender")
+                await driver.callback(user_id, session["preference"], "callback:pilih_gender")
+            else:
+                await driver.command(user_id, "search")
+        searching = False
+        await think(session["think"][0])
+        if not await wait_until(lambda: bot.user_states.get(user_id) == "chatting", args.match_timeout):
+            outcomes["tidak_dapat_pasangan"] += 1
+            await driver.command(user_id, "stop")
+            continue
+        outcomes["sesi"] += 1
+        partner_id = bot.chat_partners.get(user_id)
+        for index in range(args.messages):
+            if bot.user_states.get(user_id) != "chatting":
+                break
+            await driver.text(user_id, f"{user_id}:{index}")
+            await think(session["think"][index + 1])
+        if bot.user_states.get(user_id) != "chatting":
+            # Pasangan pergi lebih dulu; sebagian pengguna melaporkannya lewat tombol
+            if partner_id and session["report"]:
+                await driver.callback(user_id, f"report_{partner_id}", "callback:lapor")
+                outcomes["laporan"] += 1
+            continue
+        if session["next"]:
+            await driver.command(user_id, "next")
+            searching = True
+        else:
+            await driver.command(user_id, "stop")
+    await driver.command(user_id, "stop")
+
+
+async def run(args):
+    reset_state(0)
+    bot.matchmaker = bot.Matchmaker()
+    fake = FakeTelegramRequest(latency=args.latency)
+    processor = LoadProcessor(None, args.concurrency)
+    application = build_fake_application(fake, processor)
+    driver = processor.driver = Driver(application)
+    rng = random.Random(args.seed)
+    outcomes = Counter()
+    granted = asyncio.Event()
+    plans = {}
+    for user_id in range(1, args.users + 1):
+        profile = rng.random() < args.profile_ratio
+        plans[user_id] = {"profile": profile, "pro": profile and rng.random() < args.pro_ratio, "granted": granted}
+
+    sql = SqlCounter()
+    bot.get_db_connection().set_trace_callback(sql)
+    errors_before = bot.metrics.total("handler_calls_total", status="error")
+    rss_start = current_rss_mb()
+
+    async with application:
+        await application.start()
+        start = time.perf_counter()
+        agents = []
+        for user_id in range(1, args.users + 1):
+            script = draw_script(random.Random(args.seed * 100_003 + user_id), args)
+            agents.append(asyncio.create_task(user_agent(driver, user_id, script, args, plans[user_id], outcomes)))
+            if args.ramp:
+                await asyncio.sleep(args.ramp / args.users)
+        # Owner meng-upgrade pengguna Pro setelah profil mereka ada
+        await driver.command(bot.OWNER_ID, "start")
+        pro_users = [user_id for user_id, plan in plans.items() if plan["pro"]]
+        for user_id in pro_users:
+            await wait_until(lambda: bot.profile_cache.peek(user_id) not in (None, bot.ProfileCache.MISSING), args.match_timeout)
+            await driver.command(bot.OWNER_ID, "grant_pro", str(user_id))
+        granted.set()
+        await asyncio.gather(*agents)
+        # Notifikasi yang dijadwalkan tanpa ditunggu ikut dihitung, agar akhir jendela waktu tidak
+        # bergantung pada berapa banyak yang kebetulan masih tertunda
+        await wait_until(lambda: not bot.matchmaker._announcing and not bot.outbox.pending, args.match_timeout)
+        elapsed = time.perf_counter() - start
+        await application.stop()
+        await bot.matchmaker.stop()
+        await bot.outbox.drain()
+    bot.get_db_connection().set_trace_callback(None)
+
+    all_latencies = [value for values in driver.latencies.values() for value in values]
+    processed = driver.processed
+    return {
+        "updates": processed,
+        "duration_s": round(elapsed, 3),
+        "throughput_updates_per_s": round(processed / elapsed, 1),
+        "latency_ms": percentiles(all_latencies),
+        "latency_ms_by_kind": {kind: percentiles(values) for kind, values in sorted(driver.latencies.items())},
+        "db_statements_per_update": round(sql.statements / processed, 3),
+        "db_trigger_statements_per_update": round(sql.trigger_statements / processed, 3),
+        "db_commits_per_update": round(sql.commits / processed, 3),
+        "api_calls_per_update": round(sum(count for method, count in fake.counts.items() if method != "getMe") / processed, 3),
+        "api_calls": dict(sorted(fake.counts.items())),
+        "handler_errors": bot.metrics.total("handler_calls_total", status="error") - errors_before,
+        "outcomes": dict(outcomes),
+        "consistency_problems": len(state_problems()),
+        "memory": {
+            "rss_start_mb": rss_start and round(rss_start, 1),
+            "rss_end_mb": current_rss_mb() and round(current_rss_mb(), 1),
+            "peak_rss_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+        },
+    }
+
+
+def state_problems():
+    """Pelanggaran invarian state sesi di memori, ditambah selisih dengan state di DB."""
+    problems = bot.check_state_consistency()
+    persisted_partners, persisted_queue = bot.load_chat_data()
+    if persisted_partners != bot.chat_partners or len(persisted_queue) != len(bot.waiting_queue):
+        problems.append("state di DB berbeda dari memori")
+    return problems
+
+
+def lookup(results, dotted):
+    value = results
+    for part in dotted.split("."):
+        value = value.get(part) if isinstance(value, dict) else None
+    return value
+
+
+def spread(values):
+    """Sebaran relatif antar-run: (maks - min) / median; 0 untuk satu run."""
+    middle = statistics.median(values)
+    return (max(values) - min(values)) / middle if middle else 0.0
+
+
+def compare(current, baseline, tolerance):
+    """Mencetak perbandingan median dengan hasil sebelumnya; mengembalikan daftar regresi.
+
+    Batas tiap metrik adalah `tolerance` ditambah sebaran antar-run hasil pembanding, jadi
+    metrik yang memang berisik di mesin ini tidak langsung dianggap regresi.
+    """
+    regressions = []
+    print(f"\n{'metrik':<28} {'sebelumnya':>12} {'sekarang':>12} {'perubahan':>10} {'batas':>8}")
+    for key, higher_is_better in COMPARED:
+        old, new = lookup(baseline["results"], key), lookup(current["results"], key)
+        if not old or new is None:
+            continue
+        limit = tolerance + spread(baseline.get("runs", {}).get(key) or [old])
+        change = (new - old) / old
+        worse = -change if higher_is_better else change
+        flag = "  REGRESI" if worse > limit else ""
+        if flag:
+            regressions.append(key)
+        print(f"{key:<28} {old:>12} {new:>12} {change:>+9.1%} {limit:>7.1%}{flag}")
+    return regressions
+
+
+def run_once(args):
+    """Satu run di proses ini, dengan database sementara yang baru."""
+    with tempfile.TemporaryDirectory() as tmp:
+        bot.DB_FILE = Path(tmp) / "loadtest.db"
+        bot.setup_database()
+        results = asyncio.run(run(args))
+        bot.db_worker.stop()
+        bot.close_db_connection()
+    return results
+
+
+def run_many(args):
+    """Menjalankan --runs run, masing-masing di proses baru (state modul dan RSS puncak bersih).
+
+    Mengembalikan (hasil, nilai tiap metrik COMPARED per run). Hasil adalah run dengan
+    throughput median, dengan metrik COMPARED diganti mediannya.
+    """
+    runs = []
+    with tempfile.TemporaryDirectory() as tmp:
+        for index in range(args.runs):
+            output = Path(tmp) / f"run{index}.json"
+            command = [sys.executable, __file__, *child_arguments(args), "--runs", "1", "--output", str(output)]
+            subprocess.run(command, check=True, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+            runs.append(json.loads(output.read_text())["results"])
+            print(f"run {index + 1}/{args.runs}: {runs[-1]['throughput_updates_per_s']} update/s, "
+                  f"p95 {runs[-1]['latency_ms']['p95']}ms")
+    values = {key: [lookup(results, key) for results in runs] for key, _ in COMPARED}
+    ordered = sorted(runs, key=lambda results: results["throughput_updates_per_s"])
+    results = json.loads(json.dumps(ordered[len(ordered) // 2]))
+    for key, per_run in values.items():
+        *path, last = key.split(".")
+        target = results
+        for part in path:
+            target = target[part]
+        target[last] = round(statistics.median(per_run), 3)
+    return results, values
+
+
+def child_arguments(args):
+    """Argumen baris perintah yang mengulang parameter skenario `args` untuk satu run."""
+    arguments = []
+    for key, value in vars(args).items():
+        if key in ("output", "compare", "tolerance", "runs"):
+            continue
+        arguments += [f"--{key.replace('_', '-')}", str(value)]
+    return arguments
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True,
+                              cwd=Path(__file__).resolve().parent).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--users", type=int, default=200)
+    parser.add_argument("--sessions", type=int, default=2, help="Sesi chat per pengguna")
+    parser.add_argument("--messages", type=int, default=5, help="Pesan relay per sesi")
+    parser.add_argument("--profile-ratio", type=float, default=0.7)
+    parser.add_argument("--pro-ratio", type=float, default=0.2, help="Bagian pengguna ber-profil yang di-upgrade ke Pro")
+    parser.add_argument("--report-ratio", type=float, default=0.1)
+    parser.add_argument("--think", type=float, default=0.01, help="Rata-rata jeda antar aksi pengguna (detik)")
+    parser.add_argument("--ramp", type=float, default=1.0, help="Detik untuk memulai semua pengguna")
+    parser.add_argument("--match-timeout", type=float, default=3.0)
+    parser.add_argument("--latency", type=float, default=0.005, help="Latensi tiap panggilan Bot API (detik)")
+    parser.add_argument("--concurrency", type=int, default=bot.UPDATE_CONCURRENCY)
+    parser.add_argument("--seed", type=int, default=15)
+    parser.add_argument("--output", help="Tulis hasil JSON ke file ini")
+    parser.add_argument("--compare", help="Bandingkan dengan file JSON hasil sebelumnya")
+    parser.add_argument("--tolerance", type=float, default=0.15,
+                        help="Batas perubahan median (di atas sebaran antar-run pembanding) sebelum dianggap regresi")
+    parser.add_argument("--runs", type=int, default=5, help="Jumlah run; setiap metrik dilaporkan sebagai median")
+    args = parser.parse_args()
+
+    if args.runs > 1:
+        results, runs = run_many(args)
+    else:
+        results, runs = run_once(args), None
+
+    report = {
+        "meta": {
+            "timestamp": datetime.now().isoformat(timespec="seconds"),
+            "git_commit": git_commit(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "params": {key: value for key, value in vars(args).items() if key not in ("output", "compare")},
+        },
+        "results": results,
+    }
+    if runs:
+        report["runs"] = runs
+    overall = results["latency_ms"]
+    print(
+        f"{results['updates']} update dalam {results['duration_s']}s = {results['throughput_updates_per_s']} update/s; "
+        f"latensi p50 {overall['p50']}ms p95 {overall['p95']}ms p99 {overall['p99']}ms; "
+        f"{results['db_statements_per_update']} SQL/update, {results['db_commits_per_update']} commit/update, "
+        f"{results['api_calls_per_update']} API/update; RSS puncak {results['memory']['peak_rss_mb']}MB; "
+        f"error handler {results['handler_errors']}, masalah state {results['consistency_problems']}"
+    )
+    print(f"hasil: {results['outcomes']}")
+    for kind, stats in results["latency_ms_by_kind"].items():
+        print(f"  {kind:<22} n={stats['count']:>6} p50={stats['p50']:>8}ms p99={stats['p99']:>8}ms")
+    if args.output:
+        Path(args.output).write_text(json.dumps(report, indent=2) + "\n")
+    if args.compare:
+        regressions = compare(report, json.loads(Path(args.compare).read_text()), args.tolerance)
+        if regressions:
+            print(f"\nRegresi: {', '.join(regressions)}")
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,12 +1,29 @@
+import asyncio
+import bisect
+import concurrent.futures
+import heapq
 import logging
+import os
+import queue
+import signal
 import sqlite3
+import string
+import sys
+import traceback
 import json
+import itertools
+import threading
+import time
+from collections import Counter, OrderedDict, deque
+from contextlib import contextmanager
 from functools import wraps
 from pathlib import Path
-from datetime import datetime
+from datetime import datetime, timedelta
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup, ReplyKeyboardRemove
+from telegram.error import BadRequest, Forbidden, NetworkError, RetryAfter
 from telegram.ext import (
     Application,
+    BaseUpdateProcessor,
     CommandHandler,
     MessageHandler,
     filters,
@@ -19,6 +36,85 @@ from telegram.ext import (
 BOT_TOKEN = "7872111732"  # Ganti dengan token bot Anda
 DB_FILE = Path("bot_database.db")
 OWNER_ID = 5361605327  # Ganti dengan ID Telegram Anda
+# Pragma untuk koneksi SQLite bersama. WAL membuat pembaca tidak memblokir penulis,
+# synchronous=NORMAL cukup aman di mode WAL dan jauh lebih murah daripada FULL.
+DB_PRAGMAS = (
+    "PRAGMA journal_mode=WAL",
+    "PRAGMA synchronous=NORMAL",
+    "PRAGMA temp_store=MEMORY",
+    "PRAGMA cache_size=-16000",
+    "PRAGMA busy_timeout=5000",
+)
+DB_STATEMENT_CACHE = 256  # Jumlah prepared statement yang disimpan oleh koneksi
+DB_GROUP_COMMIT_MAX = 256  # Maksimal job DB yang digabung dalam satu commit
+DB_BUSY_RETRIES = 3  # Percobaan BEGIN selama database dikunci proses lain (masing-masing menunggu busy_timeout)
+DB_BUSY_BACKOFF = 0.5  # Detik jeda tambahan antar percobaan, dikali nomor percobaan
+PROFILE_CACHE_SIZE = 50_000  # Jumlah profil maksimal di cache LRU
+INTRO_CACHE_SIZE = 50_000  # Jumlah teks perkenalan pasangan (per profil) yang disimpan
+DEFAULT_LANGUAGE = "id"  # Bahasa template untuk profil tanpa bahasa atau dengan bahasa yang belum tersedia
+KNOWN_USERS_CACHE_SIZE = 200_000  # Jumlah pengguna yang diingat oleh auto_update_profile
+USERNAME_FLUSH_INTERVAL = 5.0  # Detik antara penulisan batch perubahan username
+# Batas kirim Bot API: ~30 pesan/detik global dan ~1 pesan/detik per chat (dengan sedikit burst).
+# Laju global dibuat sedikit di bawah batas agar rate + burst tidak melewati 30 dalam satu detik.
+SEND_GLOBAL_RATE = 25.0
+SEND_GLOBAL_BURST = 5
+SEND_CHAT_RATE = 1.0
+SEND_CHAT_BURST = 3
+SEND_QUEUE_LIMIT = 20_000  # Maksimal pesan tertunda sebelum pesan baru ditolak (backpressure)
+SEND_CONTROL_RESERVE = 1_000  # Ruang tambahan di atas SEND_QUEUE_LIMIT untuk balasan perintah (PRIORITY_CONTROL)
+SEND_CHAT_BUCKETS = 50_000  # Token bucket per chat yang disimpan sebelum bucket lama yang sudah penuh dibuang
+SEND_MAX_RETRIES = 3  # Percobaan ulang untuk RetryAfter / gangguan jaringan
+UPDATE_CONCURRENCY = 64  # Jumlah update yang boleh diproses bersamaan
+MEDIA_GROUP_DELAY = 0.5  # Detik menunggu bagian album berikutnya sebelum album disalin sekaligus
+MEDIA_GROUP_MAX = 10  # Jumlah item maksimal satu album Telegram
+SHUTDOWN_GRACE = 10.0  # Detik maksimal menunggu putaran pencocokan yang sedang berjalan saat berhenti
+RECOVERY_NOTIFY_BATCH = 500  # Notifikasi pemulihan yang dijadwalkan sekaligus (di bawah SEND_QUEUE_LIMIT)
+# Pembersihan sesi menganggur (None = nonaktif)
+CHAT_IDLE_TIMEOUT = 1800.0  # Detik tanpa pesan dari kedua pihak sebelum sesi chat diakhiri
+QUEUE_IDLE_TIMEOUT = 900.0  # Detik tanpa aktivitas sebelum pengguna dikeluarkan dari antrian
+REAPER_INTERVAL = 30.0  # Detik antar pemeriksaan tenggat menganggur
+REAPER_BATCH = 500  # Maksimal sesi/antrian yang diakhiri dalam satu putaran (notifikasinya di bawah SEND_QUEUE_LIMIT)
+UPDATE_QUEUE_SIZE = 10_000  # Batas update yang belum selesai diproses; di mode webhook lewat dari itu dijawab 503
+# Mode webhook: isi WEBHOOK_URL untuk memakai webhook; kosongkan untuk long polling
+WEBHOOK_URL = ""  # contoh: "https://bot.example.com/telegram"
+WEBHOOK_LISTEN = "0.0.0.0"
+WEBHOOK_PORT = 8443
+WEBHOOK_PATH = "/telegram"
+WEBHOOK_SECRET_TOKEN = ""  # Dicocokkan dengan header X-Telegram-Bot-Api-Secret-Token
+WEBHOOK_MAX_BODY = 1_000_000  # Batas ukuran body request (byte)
+WEBHOOK_KEEPALIVE_TIMEOUT = 75.0  # Detik koneksi keep-alive boleh menganggur
+WEBHOOK_MAX_CONNECTIONS = 100  # Koneksi paralel yang boleh dibuka Telegram
+# Sharding: beberapa proses worker berbagi state sesi lewat database SQLite (WAL) yang sama.
+# Worker 0 menerima webhook dari Telegram lalu meneruskan tiap update ke worker pemilik
+# user_id (user_id % SHARD_COUNT) yang mendengarkan di WEBHOOK_PORT + indeksnya.
+# Sharding memerlukan mode webhook karena getUpdates hanya boleh dipanggil satu proses.
+SHARD_COUNT = int(os.environ.get("BOT_SHARD_COUNT", 1))
+SHARD_INDEX = int(os.environ.get("BOT_SHARD_INDEX", 0))
+SHARD_EVENT_RETENTION = 600.0  # Detik event sesi disimpan sebelum dipangkas
+SHARD_TRIM_INTERVAL = 60.0  # Detik antara pemangkasan log event sesi
+# Pencocokan berjalan per putaran (tick), bukan sekali per /search
+MATCH_TICK_INTERVAL = 0.25  # Detik maksimal antar putaran pencocokan
+MATCH_BATCH_SIZE = 200  # Maksimal pasangan yang dibentuk dalam satu putaran
+MATCH_TRIGGER_SIZE = 32  # Putaran langsung dijalankan jika sebanyak ini pengguna masuk antrian sejak putaran terakhir
+MATCH_PRO_BOOST = 30.0  # Pengguna Pro didahulukan seolah sudah menunggu sekian detik lebih lama
+MATCH_MAX_WAIT = 120.0  # Entri yang menunggu lebih lama dari ini (detik) didahulukan di atas semua prioritas lain
+QUEUE_WAIT_BUCKETS = (0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 300.0)  # Batas atas bucket histogram waktu tunggu (detik)
+# Metrik format Prometheus di http://METRICS_LISTEN:METRICS_PORT/metrics (None = nonaktif);
+# worker shard memakai METRICS_PORT + SHARD_INDEX, seperti WEBHOOK_PORT
+METRICS_LISTEN = "127.0.0.1"
+METRICS_PORT = 9464
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)  # Bucket histogram latensi (detik)
+SLOW_HANDLER_THRESHOLD = 2.0  # Handler yang berjalan lebih lama dari ini (detik) diambil snapshot stack-nya
+SLOW_HANDLER_SAMPLES = 20  # Jumlah snapshot handler lambat terakhir yang disimpan (lihat /debug/slow)
+STATS_CACHE_TTL = 5.0  # Detik hasil counter statistik dipakai ulang untuk /stats
+REPORT_STATS_WINDOW = timedelta(hours=24)  # Jendela waktu "paling banyak dilaporkan" di /adminstats
+REPORT_TIME_FORMAT = "%Y-%m-%d %H:%M:%S"  # Format kolom reports.timestamp (urutan teks = urutan waktu)
+REPORT_FLUSH_INTERVAL = 2.0  # Detik laporan ditampung di memori sebelum ditulis ke DB per batch
+REPORT_DIGEST_INTERVAL = 600.0  # Detik antar ringkasan laporan ke Owner (pengganti satu pesan per laporan)
+REPORT_BLOCK_THRESHOLD = 5  # Jumlah pelapor berbeda dalam REPORT_BLOCK_WINDOW yang memblokir pengguna dari pencarian
+REPORT_BLOCK_WINDOW = timedelta(hours=1)  # Jendela geser penghitungan laporan untuk blokir otomatis
+REPORT_BLOCK_DURATION = timedelta(hours=24)  # Lama blokir otomatis
+REPORT_PARTNER_WINDOW = timedelta(days=7)  # Laporan hanya diterima terhadap pasangan yang dipertemukan dalam jendela ini
 
 # --- LOGGING ---
 logging.basicConfig(
@@ -26,15 +122,581 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+# --- METRIK & INSTRUMENTASI ---
+class Histogram:
+    """Histogram sederhana dengan batas bucket tetap (gaya Prometheus)."""
+
+    def __init__(self, bounds=QUEUE_WAIT_BUCKETS):
+        self.bounds = tuple(bounds)
+        self.counts = [0] * (len(self.bounds) + 1)  # bucket terakhir = +Inf
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.bounds, value)] += 1
+        self.count += 1
+        self.sum += value
+
+    def quantile(self, q):
+        """Perkiraan kuantil: batas atas bucket tempat kuantil q jatuh (inf jika di atas bucket terakhir)."""
+        if not self.count:
+            return 0.0
+        target = q * self.count
+        seen = 0
+        for bound, count in zip(self.bounds + (float("inf"),), self.counts):
+            seen += count
+            if seen >= target:
+                return bound
+        return float("inf")
+
+    def summary(self):
+        if not self.count:
+            return "belum ada data"
+        return f"{self.count}x, rata-rata {self.sum / self.count:.2f}s, p50 ≤{self.quantile(0.5):g}s, p90 ≤{self.quantile(0.9):g}s, p99 ≤{self.quantile(0.99):g}s"
+
+class Metrics:
+    """Registry metrik in-process: counter dan histogram berlabel dalam format teks Prometheus.
+
+    Mencatat metrik hanya berupa penjumlahan di dict di bawah satu lock (thread DB juga mencatat),
+    jadi cukup murah untuk selalu aktif di produksi. Nilai yang sudah dihitung di tempat lain
+    (panjang antrian, statistik outbox, cache, dll.) dibaca oleh collector saat /metrics diminta.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters = {}  # (name, labels) -> nilai
+        self._histograms = {}  # (name, labels) -> Histogram
+        self._collectors = []  # fungsi tanpa argumen -> iterable (name, type, labels, value)
+
+    @staticmethod
+    def _key(name, labels):
+        return name, tuple(sorted(labels.items()))
+
+    def inc(self, name, value=1, **labels):
+        key = self._key(name, labels)
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def histogram(self, name, bounds=LATENCY_BUCKETS, **labels):
+        """Mengambil (atau membuat) histogram berlabel; berguna untuk menyimpan referensinya."""
+        key = self._key(name, labels)
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = Histogram(bounds)
+            return histogram
+
+    def observe(self, name, value, **labels):
+        key = self._key(name, labels)
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = Histogram(LATENCY_BUCKETS)
+            histogram.observe(value)
+
+    def add_collector(self, collector):
+        self._collectors.append(collector)
+
+    def total(self, name, **labels):
+        """Jumlah counter `name` untuk semua kombinasi label yang cocok dengan `labels`."""
+        wanted = set(labels.items())
+        with self._lock:
+            return sum(value for (key, key_labels), value in self._counters.items() if key == name and wanted <= set(key_labels))
+
+    def render(self):
+        """Semua metrik dalam format teks eksposisi Prometheus 0.0.4."""
+        families = {}  # name -> (type, [baris])
+
+        def line(name, labels, value):
+            label_text = ",".join(f'{key}="{value}"' for key, value in labels)
+            return f"{name}{{{label_text}}} {value}" if label_text else f"{name} {value}"
+
+        with self._lock:
+            for (name, labels), value in self._counters.items():
+                families.setdefault(name, ("counter", []))[1].append(line(name, labels, value))
+            for (name, labels), histogram in self._histograms.items():
+                rows = families.setdefault(name, ("histogram", []))[1]
+                cumulative = 0
+                for bound, count in zip(histogram.bounds + (float("inf"),), histogram.counts):
+                    cumulative += count
+                    rows.append(line(f"{name}_bucket", labels + (("le", "+Inf" if bound == float("inf") else f"{bound:g}"),), cumulative))
+                rows.append(line(f"{name}_sum", labels, f"{histogram.sum:.6f}"))
+                rows.append(line(f"{name}_count", labels, histogram.count))
+        for collector in self._collectors:
+            try:
+                for name, kind, labels, value in collector():
+                    families.setdefault(name, (kind, []))[1].append(line(name, tuple(sorted(labels.items())), value))
+            except Exception as e:
+                logger.error(f"Collector metrik gagal: {e}")
+        output = []
+        for name, (kind, rows) in sorted(families.items()):
+            output.append(f"# TYPE {name} {kind}")
+            output.extend(rows)
+        return "\n".join(output) + "\n"
+
+metrics = Metrics()
+
+def coroutine_stack(coroutine):
+    """Frame-frame rantai await sebuah coroutine, dari luar ke titik await terdalam."""
+    frames = []
+    while coroutine is not None:
+        frame = getattr(coroutine, "cr_frame", None) or getattr(coroutine, "gi_frame", None)
+        if frame is None:
+            break
+        frames.append((frame, frame.f_lineno))
+        coroutine = getattr(coroutine, "cr_await", None) or getattr(coroutine, "gi_yieldfrom", None)
+    return traceback.StackSummary.extract(frames)
+
+class SlowHandlerSampler:
+    """Mengambil snapshot stack dari handler yang berjalan lebih lama dari `threshold` detik.
+
+    Thread terpisah memeriksa handler yang sedang berjalan. Jika event loop masih berdetak,
+    stack diambil dari rantai await task handler (apa yang sedang ditunggu); jika loop macet,
+    stack diambil dari thread event loop (kode sinkron yang memblokir). Setiap handler
+    diambil paling banyak satu kali, jadi biayanya nol selama tidak ada yang lambat.
+    """
+
+    def __init__(self, threshold=SLOW_HANDLER_THRESHOLD, keep=SLOW_HANDLER_SAMPLES):
+        self.threshold = threshold
+        self.samples = deque(maxlen=keep)
+        self._running = {}  # token -> [nama handler, mulai, task, sudah diambil, total macet saat mulai]
+        self._tokens = itertools.count()
+        self._loop = None
+        self._loop_thread_id = None
+        self._heartbeat = time.monotonic()
+        self._stall_time = 0.0  # total waktu event loop macet; tidak dihitung sebagai lambatnya handler lain
+        self._stall_sampled = False
+        self._beat_handle = None
+        self._stopped = threading.Event()
+        self._thread = None
+
+    def start(self, loop):
+        self._loop = loop
+        self._loop_thread_id = threading.get_ident()
+        self._stopped.clear()
+        self._heartbeat = time.monotonic()
+        self._beat()
+        self._thread = threading.Thread(target=self._run, name="slow-handler-sampler", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stopped.set()
+        if self._beat_handle is not None:
+            self._beat_handle.cancel()
+            self._beat_handle = None
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def enter(self, name):
+        token = next(self._tokens)
+        self._running[token] = [name, time.monotonic(), asyncio.current_task(), False, self._stall_time]
+        return token
+
+    def exit(self, token):
+        self._running.pop(token, None)
+
+    def _beat(self):
+        now = time.monotonic()
+        late = now - self._heartbeat - self.threshold / 4
+        if late > self.threshold / 4:
+            self._stall_time += late
+        self._heartbeat = now
+        self._beat_handle = self._loop.call_later(self.threshold / 4, self._beat)
+
+    def _run(self):
+        while not self._stopped.wait(self.threshold / 2):
+            self.sample()
+
+    def sample(self):
+        now = time.monotonic()
+        if now - self._heartbeat > self.threshold:
+            # Loop macet: yang bertanggung jawab hanya task yang sedang berjalan, bukan semua
+            # handler yang ikut tertahan. Satu snapshot per kejadian macet.
+            if not self._stall_sampled:
+                self._stall_sampled = True
+                task = asyncio.current_task(self._loop)
+                record = next((record for record in list(self._running.values()) if record[2] is task), None)
+                frame = sys._current_frames().get(self._loop_thread_id)
+                stack = traceback.extract_stack(frame) if frame else []
+                if record is not None:
+                    record[3] = True
+                    self._record(record[0], now - record[1], True, stack)
+                else:
+                    self._record("(di luar handler)", now - self._heartbeat, True, stack)
+            return
+        self._stall_sampled = False
+        for record in list(self._running.values()):
+            name, started, task, sampled, stall_at_start = record
+            if sampled or now - started - (self._stall_time - stall_at_start) < self.threshold:
+                continue
+            record[3] = True
+            self._record(name, now - started, False, coroutine_stack(task.get_coro()) if task else [])
+
+    def _record(self, name, elapsed, loop_blocked, stack):
+        self.samples.append({
+            "handler": name,
+            "elapsed": elapsed,
+            "loop_blocked": loop_blocked,
+            "at": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+            "stack": "".join(traceback.format_list(stack)),
+        })
+        metrics.inc("slow_handler_samples_total", handler=name, loop_blocked=str(loop_blocked).lower())
+        logger.warning(f"Handler {name} lambat ({elapsed:.1f}s{', event loop macet' if loop_blocked else ''}); snapshot stack di /debug/slow")
+
+    def render(self):
+        if not self.samples:
+            return "Belum ada handler lambat.\n"
+        return "\n".join(
+            f"[{sample['at']}] {sample['handler']} {sample['elapsed']:.2f}s"
+            f"{' (event loop macet)' if sample['loop_blocked'] else ''}\n{sample['stack']}"
+            for sample in reversed(self.samples)
+        )
+
+slow_sampler = SlowHandlerSampler()
+
+def instrument_handler(callback, name):
+    """Membungkus callback handler dengan pengukuran durasi, hitungan status, dan pelacakan handler lambat."""
+    @wraps(callback)
+    async def instrumented(update, context, *args, **kwargs):
+        start = time.perf_counter()
+        token = slow_sampler.enter(name)
+        status = "ok"
+        try:
+            return await callback(update, context, *args, **kwargs)
+        except Exception:
+            status = "error"
+            raise
+        finally:
+            slow_sampler.exit(token)
+            metrics.observe("handler_duration_seconds", time.perf_counter() - start, handler=name)
+            metrics.inc("handler_calls_total", handler=name, status=status)
+    return instrumented
+
+def instrument_handlers(handlers):
+    """Memasang instrument_handler ke semua handler, termasuk yang ada di dalam ConversationHandler."""
+    for handler in handlers:
+        if isinstance(handler, ConversationHandler):
+            instrument_handlers(handler.entry_points)
+            for state_handlers in handler.states.values():
+                instrument_handlers(state_handlers)
+            instrument_handlers(handler.fallbacks)
+        else:
+            handler.callback = instrument_handler(handler.callback, handler.callback.__name__)
+
+class MetricsServer:
+    """Server HTTP kecil untuk GET /metrics (Prometheus) dan GET /debug/slow (snapshot handler lambat)."""
+
+    def __init__(self, listen=METRICS_LISTEN, port=METRICS_PORT):
+        self.listen = listen
+        self.port = port
+        self._server = None
+
+    async def start(self):
+        self._server = await asyncio.start_server(self._handle_connection, self.listen, self.port)
+        self.port = self._server.sockets[0].getsockname()[1]
+        logger.info(f"Metrik tersedia di http://{self.listen}:{self.port}/metrics")
+
+    async def stop(self):
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+            self._server = None
+
+    async def _handle_connection(self, reader, writer):
+        try:
+            request_line = await asyncio.wait_for(reader.readline(), 10)
+            while (await asyncio.wait_for(reader.readline(), 10)) not in (b"\r\n", b"\n", b""):
+                pass
+            method, target, _ = request_line.decode("latin-1").split()
+            path = target.split("?", 1)[0]
+            if method != "GET":
+                status, body = "405 Method Not Allowed", ""
+            elif path == "/metrics":
+                status, body = "200 OK", metrics.render()
+            elif path == "/debug/slow":
+                status, body = "200 OK", slow_sampler.render()
+            else:
+                status, body = "404 Not Found", ""
+            payload = body.encode()
+            writer.write(
+                f"HTTP/1.1 {status}\r\nContent-Type: text/plain; version=0.0.4; charset=utf-8\r\n"
+                f"Content-Length: {len(payload)}\r\nConnection: close\r\n\r\n".encode("latin-1") + payload
+            )
+            await writer.drain()
+        except (asyncio.TimeoutError, ConnectionError, ValueError):
+            pass
+        finally:
+            writer.close()
+
 # --- STATE UNTUK CONVERSATION HANDLER ---
 (GENDER, AGE, BIO, FIND_GENDER_PREF) = range(4)
 
+# --- MESIN PENCOCOKAN (MATCHMAKING) ---
+def is_compatible(gender_a, preference_a, gender_b, preference_b):
+    """Aturan pencocokan: preferensi masing-masing harus 'any' atau sama dengan gender pasangannya."""
+    a_likes_b = preference_a == "any" or preference_a == gender_b
+    b_likes_a = preference_b == "any" or preference_b == gender_a
+    return a_likes_b and b_likes_a
+
+class QueueEntry:
+    """Entri antrian ringkas (__slots__) sebagai pengganti dict per pengguna yang menunggu.
+
+    Tetap bisa dibaca seperti dict lama (entry["gender"], entry.get("enqueued_at")) sehingga
+    kode yang memakai entri antrian tidak berubah. Gender dan preferensi di-intern agar semua
+    entri berbagi objek string yang sama. `seq` diisi MatchQueue (None = sudah dikeluarkan).
+    """
+
+    __slots__ = ("user_id", "gender", "preference", "enqueued_at", "pro", "seq")
+
+    def __init__(self, user_id, gender, preference, enqueued_at=None, pro=False, seq=None):
+        self.user_id = user_id
+        self.gender = sys.intern(gender)
+        self.preference = sys.intern(preference)
+        self.enqueued_at = enqueued_at
+        self.pro = pro
+        self.seq = seq
+
+    def __getitem__(self, key):
+        if key not in ("user_id", "gender", "preference", "enqueued_at", "pro"):
+            raise KeyError(key)
+        return getattr(self, key)
+
+    def get(self, key, default=None):
+        try:
+            return self[key]
+        except KeyError:
+            return default
+
+    def __repr__(self):
+        return f"QueueEntry(user_id={self.user_id!r}, gender={self.gender!r}, preference={self.preference!r}, enqueued_at={self.enqueued_at!r}, pro={self.pro!r})"
+
+class MatchQueue:
+    """Antrian pencarian yang dikelompokkan ke bucket FIFO per (gender, preferensi, Pro).
+
+    Jumlah bucket dibatasi oleh kombinasi gender x preferensi x Pro (konstan), sehingga mencari
+    pasangan cukup membandingkan kepala tiap bucket, bukan memindai seluruh antrian. Urutan
+    pencocokan ditentukan oleh priority(): pengguna yang paling lama menunggu didahulukan,
+    pengguna Pro mendapat tambahan `pro_boost` detik, dan entri yang sudah melewati `max_wait`
+    dilayani bergiliran per bucket agar kombinasi preferensi langka tidak terus kalah.
+
+    Entri disimpan sebagai QueueEntry di satu dict indeks (urutan sisip = urutan FIFO) dan
+    deque per bucket. Entri yang keluar hanya ditandai (seq = None) lalu dibuang dari deque
+    saat sampai di kepala atau tepat di belakangnya (kandidat pasangan dari bucket yang sama),
+    atau saat bucket dipadatkan karena entri mati melebihi yang hidup.
+    """
+
+    def __init__(self, entries=(), pro_boost=MATCH_PRO_BOOST, max_wait=MATCH_MAX_WAIT):
+        self.pro_boost = pro_boost
+        self.max_wait = max_wait
+        self._seq = itertools.count()
+        self._matches = itertools.count(1)
+        self._entries = {}  # user_id -> QueueEntry, urutan FIFO global
+        self._buckets = {}  # (gender, preference, pro) -> deque[QueueEntry], kepala selalu hidup
+        self._live = {}  # (gender, preference, pro) -> jumlah entri hidup di bucket
+        self._served = {}  # (gender, preference, pro) -> nomor pencocokan terakhir yang melibatkan bucket ini
+        for entry in entries:
+            self.append(entry)
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __iter__(self):
+        return iter(self._entries.values())
+
+    def __contains__(self, user_id):
+        return user_id in self._entries
+
+    def get(self, user_id):
+        """Mengambil entri antrian milik user_id dalam O(1), atau None."""
+        return self._entries.get(user_id)
+
+    def append(self, entry):
+        """Menambahkan entri {"user_id", "gender", "preference", "enqueued_at", "pro"} ke ekor antrian.
+
+        Tanpa enqueued_at, waktu tunggu dihitung sejak entri ditambahkan.
+        """
+        enqueued_at = entry.get("enqueued_at")
+        record = QueueEntry(
+            entry["user_id"], entry["gender"], entry["preference"],
+            time.time() if enqueued_at is None else enqueued_at, bool(entry.get("pro")), next(self._seq),
+        )
+        self._entries[record.user_id] = record
+        key = (record.gender, record.preference, record.pro)
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            bucket = self._buckets[key] = deque()
+            self._live[key] = 0
+        bucket.append(record)
+        self._live[key] += 1
+        return record
+
+    def remove(self, entry):
+        """Menghapus entri dari antrian (kompatibel dengan list.remove)."""
+        user_id = entry["user_id"]
+        if user_id not in self._entries:
+            raise ValueError(f"User {user_id} tidak ada di antrian")
+        stored = self._entries.pop(user_id)
+        stored.seq = None
+        key = (stored.gender, stored.preference, stored.pro)
+        bucket = self._buckets[key]
+        live = self._live[key] = self._live[key] - 1
+        if not live:
+            del self._buckets[key], self._live[key]
+        elif len(bucket) > 2 * live:
+            self._buckets[key] = deque(item for item in bucket if item.seq is not None)
+        else:
+            while bucket[0].seq is None:
+                bucket.popleft()
+
+    def cancel(self, user_id):
+        """Mengeluarkan entri milik user_id dari antrian dalam O(1); None jika tidak ada."""
+        entry = self._entries.get(user_id)
+        if entry is not None:
+            self.remove(entry)
+        return entry
+
+    def pop_oldest(self):
+        """Mengeluarkan entri yang paling lama menunggu, atau None jika antrian kosong."""
+        if not self._entries:
+            return None
+        entry = next(iter(self._entries.values()))
+        self.remove(entry)
+        return entry
+
+    def check(self):
+        """Memeriksa bahwa indeks user_id dan bucket saling sesuai; mengembalikan daftar masalah."""
+        problems = []
+        in_buckets = 0
+        for key, bucket in self._buckets.items():
+            live = [item for item in bucket if item.seq is not None]
+            if not live or bucket[0].seq is None:
+                problems.append(f"Kepala bucket {key} sudah keluar dari antrian")
+            if len(live) != self._live.get(key):
+                problems.append(f"Bucket {key} berisi {len(live)} entri hidup, tercatat {self._live.get(key)}")
+            for item in live:
+                in_buckets += 1
+                if self._entries.get(item.user_id) is not item:
+                    problems.append(f"User {item.user_id} ada di bucket {key} tetapi tidak di indeks")
+                if (item.gender, item.preference, item.pro) != key:
+                    problems.append(f"User {item.user_id} berada di bucket yang salah {key}")
+            seqs = [item.seq for item in live]
+            if seqs != sorted(seqs):
+                problems.append(f"Urutan FIFO bucket {key} rusak")
+        if in_buckets != len(self._entries):
+            problems.append(f"Indeks berisi {len(self._entries)} entri, bucket berisi {in_buckets}")
+        return problems
+
+    def priority(self, entry, now):
+        """Kunci urutan pencocokan untuk entri (lebih kecil = didahulukan).
+
+        Semua entri menua dengan laju yang sama, jadi cukup membandingkan waktu masuk "virtual":
+        pengguna Pro dianggap masuk `pro_boost` detik lebih awal. Urutan ini tidak berubah seiring
+        waktu dan tetap FIFO di dalam satu bucket. Entri yang sudah menunggu `max_wait` detik
+        mendahului semuanya; di antara mereka, bucket yang paling lama tidak dilayani didahulukan,
+        sehingga antrean panjang satu kombinasi tidak menahan kombinasi langka yang berebut
+        pasangan yang sama.
+        """
+        if now - entry.enqueued_at >= self.max_wait:
+            return (0, self._served.get((entry.gender, entry.preference, entry.pro), 0), entry.enqueued_at, entry.seq)
+        return (1, 0, entry.enqueued_at - self.pro_boost if entry.pro else entry.enqueued_at, entry.seq)
+
+    @staticmethod
+    def _second(bucket):
+        """Entri hidup kedua di bucket; entri mati di belakang kepala dibuang sekalian.
+
+        Tanpa ini setiap pop_match memindai ulang entri batal yang sama, sehingga antrean
+        panjang dengan banyak pembatalan makin lambat. Pemanggil menjamin ada >= 2 entri hidup.
+        """
+        head = bucket.popleft()
+        while bucket[0].seq is None:
+            bucket.popleft()
+        bucket.appendleft(head)
+        return bucket[1]
+
+    def pop_match(self, now=None):
+        """Mengeluarkan pasangan cocok dengan prioritas tertinggi, atau None jika tidak ada.
+
+        Kepala bucket diambil dari heap berdasarkan priority(); yang pertama punya pasangan
+        cocok (user_a) dipasangkan dengan kandidat cocok berprioritas tertinggi (user_b). Tanpa
+        pengguna Pro dan sebelum `max_wait`, hasilnya sama dengan pemindaian i/j lama.
+        """
+        now = time.time() if now is None else now
+        ranks = {key: self.priority(bucket[0], now) for key, bucket in self._buckets.items()}
+        heads = [(rank, key) for key, rank in ranks.items()]
+        heapq.heapify(heads)
+        while heads:
+            _, key_a = heapq.heappop(heads)
+            best = best_rank = None
+            for key_b, bucket in self._buckets.items():
+                if not is_compatible(key_a[0], key_a[1], key_b[0], key_b[1]):
+                    continue
+                if key_b == key_a:
+                    if self._live[key_b] < 2:
+                        continue
+                    candidate = self._second(bucket)
+                    rank = self.priority(candidate, now)
+                else:
+                    candidate, rank = bucket[0], ranks[key_b]
+                if best is None or rank < best_rank:
+                    best, best_rank = candidate, rank
+            if best is not None:
+                user_a, user_b = self._buckets[key_a][0], best
+                served = next(self._matches)
+                self._served[key_a] = self._served[(user_b.gender, user_b.preference, user_b.pro)] = served
+                self.remove(user_a)
+                self.remove(user_b)
+                return user_a, user_b
+        return None
+
+class SessionStateView:
+    """State pengguna ('chatting' / 'waiting' / None jika idle) yang diturunkan dari chat_partners dan waiting_queue.
+
+    Pengganti dict user_states terpisah: tidak ada entri tambahan per pengguna dan state tidak
+    mungkin tidak sinkron dengan kedua struktur tersebut. Hanya untuk dibaca; ubah state
+    lewat chat_partners dan waiting_queue.
+    """
+
+    def get(self, user_id, default=None):
+        if user_id in chat_partners:
+            return "chatting"
+        if user_id in waiting_queue:
+            return "waiting"
+        return default
+
+    def __getitem__(self, user_id):
+        state = self.get(user_id)
+        if state is None:
+            raise KeyError(user_id)
+        return state
+
+    def __contains__(self, user_id):
+        return self.get(user_id) is not None
+
+    def __len__(self):
+        return len(chat_partners) + len(waiting_queue)
+
+    def __iter__(self):
+        yield from chat_partners
+        for entry in waiting_queue:
+            yield entry.user_id
+
+    def items(self):
+        return ((user_id, self[user_id]) for user_id in self)
+
+
 # --- VARIABEL GLOBAL UNTUK STATE APLIKASI ---
 # DIPERBAIKI: Variabel ini harus berada di global scope, bukan di dalam fungsi main().
 chat_partners = {}
-waiting_queue = []
-# user_states akan menyimpan status pengguna: 'chatting', 'waiting', atau 'idle' (atau tidak ada jika idle)
-user_states = {}
+waiting_queue = MatchQueue()
+# user_states memberi status pengguna: 'chatting', 'waiting', atau tidak ada jika idle
+user_states = SessionStateView()
+# Melindungi perubahan chat_partners dan waiting_queue saat update diproses bersamaan.
+# Bagian kritis tidak boleh berisi await selain acquire lock; tulis DB cukup di-submit di dalamnya
+# (urutan tulis = urutan perubahan state) lalu ditunggu setelah lock dilepas.
+session_lock = asyncio.Lock()
+# Mode sharding: replika state sesi yang disinkronkan dari database bersama (None = satu proses)
+shared_sessions = None
 
 
 # --- DECORATOR & FUNGSI DATABASE ---
@@ -43,88 +705,1168 @@ def owner_only(func):
     @wraps(func)
     async def wrapped(update: Update, context: ContextTypes.DEFAULT_TYPE, *args, **kwargs):
         if update.effective_user.id != OWNER_ID:
-            await update.message.reply_text("Maaf, perintah ini hanya untuk Owner.")
+            await send_reply(update, "Maaf, perintah ini hanya untuk Owner.")
             return
         return await func(update, context, *args, **kwargs)
     return wrapped
 
+_db_conn = None
+# Koneksi dipakai bersama oleh thread DB (DatabaseWorker) dan kode startup; lock menjaga aksesnya.
+_db_lock = threading.RLock()
+
+def get_db_connection():
+    """Mengembalikan koneksi SQLite bersama, dibuat sekali lalu dipakai ulang."""
+    global _db_conn
+    if _db_conn is None:
+        with _db_lock:
+            if _db_conn is None:
+                # isolation_level=None: autocommit, transaksi diatur eksplisit lewat db_transaction()
+                conn = sqlite3.connect(DB_FILE, isolation_level=None, check_same_thread=False, cached_statements=DB_STATEMENT_CACHE)
+                for pragma in DB_PRAGMAS:
+                    conn.execute(pragma)
+                _db_conn = conn
+    return _db_conn
+
+def close_db_connection():
+    """Menutup koneksi SQLite bersama (dipanggil saat bot berhenti)."""
+    global _db_conn
+    with _db_lock:
+        if _db_conn is not None:
+            _db_conn.close()
+            _db_conn = None
+
+@contextmanager
+def db_transaction():
+    """Menjalankan beberapa query dalam satu transaksi (satu commit).
+
+    Blok bersarang ikut transaksi terluar (termasuk transaksi group commit DatabaseWorker).
+    Dari handler async, jalankan lewat run_db() agar tidak memblokir event loop.
+    """
+    conn = get_db_connection()
+    with _db_lock:
+        if conn.in_transaction:
+            yield conn
+            return
+        # IMMEDIATE: kunci tulis diambil di awal, sehingga baca-lalu-tulis tetap atomik
+        # meski ada proses worker lain yang menulis ke database yang sama
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            yield conn
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        conn.execute("COMMIT")
+
 def db_query(query, params=()):
-    """Fungsi helper untuk menjalankan query ke database SQLite."""
-    with sqlite3.connect(DB_FILE) as conn:
-        cursor = conn.cursor()
-        cursor.execute(query, params)
-        conn.commit()
-        return cursor.fetchall()
+    """Fungsi helper untuk menjalankan query ke database SQLite.
+
+    Di luar db_transaction() setiap query langsung di-commit (autocommit).
+    """
+    start = time.perf_counter()
+    with _db_lock:
+        rows = get_db_connection().execute(query, params).fetchall()
+    metrics.observe("db_query_seconds", time.perf_counter() - start, statement=query.split(None, 1)[0].upper())
+    return rows
+
+class DatabaseWorker:
+    """Thread khusus yang menjalankan semua query SQLite di luar event loop.
+
+    Handler mengirim fungsi DB sinkron lewat submit() lalu meng-await hasilnya. Job yang
+    menumpuk selama commit sebelumnya berjalan digabung menjadi satu transaksi (group commit),
+    sehingga ribuan update bersamaan hanya membutuhkan sedikit fsync. Setiap job dibungkus
+    SAVEPOINT agar kegagalan satu job tidak membatalkan job lain dalam grup yang sama. Jika
+    transaksi grup sendiri gagal (mis. database dikunci proses lain), setiap job dalam grup
+    menerima errornya dan thread tetap melayani grup berikutnya.
+    """
+
+    def __init__(self):
+        self._jobs = queue.SimpleQueue()
+        self._thread = None
+
+    def start(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(target=self._run, name="db-worker", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        """Memproses semua job yang tersisa lalu menghentikan thread."""
+        if self._thread is not None and self._thread.is_alive():
+            self._jobs.put(None)
+            self._thread.join()
+        self._thread = None
+
+    def submit(self, func, *args):
+        """Menjadwalkan func(*args) di thread DB; mengembalikan future yang selesai setelah commit."""
+        self.start()
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._jobs.put((func, args, loop, future))
+        return future
+
+    def _run(self):
+        running = True
+        while running:
+            batch = [self._jobs.get()]
+            while len(batch) < DB_GROUP_COMMIT_MAX:
+                try:
+                    batch.append(self._jobs.get_nowait())
+                except queue.Empty:
+                    break
+            if None in batch:
+                running = False
+                batch = [job for job in batch if job is not None]
+            if batch:
+                try:
+                    self._execute(batch)
+                except Exception:
+                    # Thread DB harus tetap hidup, kalau tidak setiap run_db() berikutnya menggantung
+                    logger.exception(f"Thread DB gagal memproses {len(batch)} job")
+
+    @staticmethod
+    def _begin(conn):
+        """BEGIN IMMEDIATE, diulang jika database sedang dikunci proses lain (mis. worker shard lain)."""
+        for attempt in range(1, DB_BUSY_RETRIES + 1):
+            try:
+                conn.execute("BEGIN IMMEDIATE")
+                return
+            except sqlite3.OperationalError as e:
+                if e.sqlite_errorcode not in (sqlite3.SQLITE_BUSY, sqlite3.SQLITE_LOCKED) or attempt == DB_BUSY_RETRIES:
+                    raise
+                logger.warning(f"Database terkunci saat memulai transaksi (percobaan {attempt}/{DB_BUSY_RETRIES}): {e}")
+                time.sleep(DB_BUSY_BACKOFF * attempt)
+
+    def _execute(self, batch):
+        outcomes = []
+        start = time.perf_counter()
+        with _db_lock:
+            try:
+                conn = get_db_connection()
+                self._begin(conn)
+                for func, args, loop, future in batch:
+                    conn.execute("SAVEPOINT job")
+                    try:
+                        result, error = func(*args), None
+                    except Exception as e:
+                        conn.execute("ROLLBACK TO job")
+                        result, error = None, e
+                    conn.execute("RELEASE job")
+                    outcomes.append((loop, future, result, error))
+                conn.execute("COMMIT")
+            except Exception as e:
+                # BEGIN, SAVEPOINT, atau COMMIT gagal: seluruh grup dibatalkan dan setiap job menerima errornya
+                logger.error(f"Group commit gagal untuk {len(batch)} job: {e}")
+                try:
+                    if _db_conn is not None and _db_conn.in_transaction:
+                        _db_conn.execute("ROLLBACK")
+                except sqlite3.Error as rollback_error:
+                    logger.error(f"Rollback group commit gagal: {rollback_error}")
+                # Write-through ke cache mungkin sudah terjadi untuk job yang dibatalkan
+                profile_cache.clear()
+                outcomes = [(loop, future, None, e) for _, _, loop, future in batch]
+        metrics.observe("db_group_commit_seconds", time.perf_counter() - start)
+        metrics.inc("db_jobs_total", len(batch))
+        for loop, future, result, error in outcomes:
+            if not loop.is_closed():
+                loop.call_soon_threadsafe(_resolve_db_future, future, result, error)
+
+def _resolve_db_future(future, result, error):
+    if future.cancelled():
+        return
+    if error is not None:
+        future.set_exception(error)
+    else:
+        future.set_result(result)
+
+db_worker = DatabaseWorker()
+
+async def run_db(func, *args):
+    """Menjalankan fungsi DB sinkron di thread DB tanpa memblokir event loop."""
+    return await db_worker.submit(func, *args)
+
+async def adb_query(query, params=()):
+    """Versi async dari db_query untuk dipakai di dalam handler."""
+    return await run_db(db_query, query, params)
 
 def setup_database():
-    """Membuat tabel database jika belum ada."""
-    db_query("CREATE TABLE IF NOT EXISTS user_profiles (user_id INTEGER PRIMARY KEY, username TEXT, gender TEXT, age INTEGER, bio TEXT, language TEXT DEFAULT 'id', is_pro INTEGER DEFAULT 0)")
-    db_query("CREATE TABLE IF NOT EXISTS reports (report_id INTEGER PRIMARY KEY AUTOINCREMENT, reporter_id INTEGER NOT NULL, reported_id INTEGER NOT NULL, timestamp DATETIME NOT NULL)")
-    db_query("CREATE TABLE IF NOT EXISTS chat_data (key TEXT PRIMARY KEY, value TEXT NOT NULL)")
-    db_query("INSERT OR IGNORE INTO chat_data (key, value) VALUES ('chat_partners', '{}')")
-    db_query("INSERT OR IGNORE INTO chat_data (key, value) VALUES ('waiting_queue', '[]')")
+    """Membuat tabel database jika belum ada.
+
+    Jika skema sudah versi terbaru (PRAGMA user_version), DDL dan penghitungan ulang counter
+    dilewati: skema hanya berubah lewat SCHEMA_MIGRATIONS dan counter dijaga trigger, jadi
+    restart biasa cukup membaca satu pragma.
+    """
+    if db_query("PRAGMA user_version")[0][0] == SCHEMA_VERSION:
+        logger.info(f"Database '{DB_FILE}' siap digunakan (skema v{SCHEMA_VERSION}).")
+        return
+    with db_transaction():
+        db_query("CREATE TABLE IF NOT EXISTS user_profiles (user_id INTEGER PRIMARY KEY, username TEXT, gender TEXT, age INTEGER, bio TEXT, language TEXT DEFAULT 'id', is_pro INTEGER DEFAULT 0)")
+        db_query("CREATE TABLE IF NOT EXISTS reports (report_id INTEGER PRIMARY KEY AUTOINCREMENT, reporter_id INTEGER NOT NULL, reported_id INTEGER NOT NULL, timestamp DATETIME NOT NULL)")
+        # State sesi disimpan per baris: satu baris per pasangan dan satu per entri antrian
+        db_query("CREATE TABLE IF NOT EXISTS chat_sessions (user_a INTEGER PRIMARY KEY, user_b INTEGER NOT NULL UNIQUE)")
+        db_query("CREATE TABLE IF NOT EXISTS waiting_entries (user_id INTEGER PRIMARY KEY, gender TEXT NOT NULL, preference TEXT NOT NULL, enqueued_at REAL NOT NULL)")
+        # Log perubahan sesi untuk mode sharding; tiap worker memutarnya ke replika lokalnya
+        db_query("CREATE TABLE IF NOT EXISTS session_events (event_id INTEGER PRIMARY KEY AUTOINCREMENT, kind TEXT NOT NULL, user_a INTEGER NOT NULL, user_b INTEGER, gender TEXT, preference TEXT, enqueued_at REAL, created_at REAL NOT NULL)")
+        migrate_legacy_chat_data()
+        migrate_schema()
+        setup_stats_counters()
     logger.info(f"Database '{DB_FILE}' siap digunakan.")
 
-def get_user_profile(user_id):
-    """Mengambil profil pengguna dari database. Hanya mengembalikan jika profil sudah lengkap."""
+# Migrasi skema berversi: (versi, deskripsi, statement). Versi terakhir yang diterapkan
+# disimpan di PRAGMA user_version; migrasi baru selalu ditambahkan di akhir daftar. Perubahan
+# skema apa pun harus lewat daftar ini, karena setup_database() tidak menjalankan DDL lagi
+# untuk database yang sudah di versi terbaru.
+SCHEMA_MIGRATIONS = (
+    (1, "indeks username (tanpa beda huruf besar/kecil) dan indeks laporan", (
+        "CREATE INDEX IF NOT EXISTS idx_profiles_username ON user_profiles (username COLLATE NOCASE)",
+        # Hitungan laporan per pengguna dalam jendela waktu dijawab langsung dari indeks
+        "CREATE INDEX IF NOT EXISTS idx_reports_reported_time ON reports (reported_id, timestamp)",
+        # Agregasi per jendela waktu: range scan pada timestamp, reported_id ikut di indeks (covering)
+        "CREATE INDEX IF NOT EXISTS idx_reports_time_reported ON reports (timestamp, reported_id)",
+    )),
+    (2, "tabel bot_state untuk penanda shutdown bersih", (
+        "CREATE TABLE IF NOT EXISTS bot_state (key TEXT PRIMARY KEY, value REAL NOT NULL)",
+    )),
+    (3, "riwayat pasangan untuk memvalidasi laporan", (
+        "CREATE TABLE IF NOT EXISTS partner_history (user_a INTEGER NOT NULL, user_b INTEGER NOT NULL, matched_at REAL NOT NULL, PRIMARY KEY (user_a, user_b)) WITHOUT ROWID",
+        "CREATE INDEX IF NOT EXISTS idx_partner_history_time ON partner_history (matched_at)",
+        # Sesi yang sedang berjalan saat migrasi ikut dicatat agar tombol laporannya tetap berlaku
+        "INSERT OR IGNORE INTO partner_history (user_a, user_b, matched_at) SELECT user_a, user_b, (julianday('now') - 2440587.5) * 86400.0 FROM chat_sessions",
+    )),
+)
+SCHEMA_VERSION = SCHEMA_MIGRATIONS[-1][0]
+
+def migrate_schema():
+    """Menerapkan migrasi skema yang belum dijalankan, di dalam transaksi setup_database()."""
+    current = db_query("PRAGMA user_version")[0][0]
+    for version, description, statements in SCHEMA_MIGRATIONS:
+        if version <= current:
+            continue
+        for statement in statements:
+            db_query(statement)
+        db_query(f"PRAGMA user_version = {version}")
+        logger.info(f"Migrasi skema v{version}: {description}")
+
+# Counter agregat dijaga trigger di setiap perubahan baris, jadi /stats dan /adminstats
+# cukup membaca beberapa baris kecil alih-alih COUNT(*) atas seluruh tabel.
+STATS_TRIGGERS = (
+    """CREATE TRIGGER IF NOT EXISTS stats_profiles_insert AFTER INSERT ON user_profiles BEGIN
+        UPDATE stats_counters SET value = value + 1 WHERE name = 'total_users';
+        UPDATE stats_counters SET value = value + (NEW.is_pro IS 1) WHERE name = 'pro_users';
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS stats_profiles_delete AFTER DELETE ON user_profiles BEGIN
+        UPDATE stats_counters SET value = value - 1 WHERE name = 'total_users';
+        UPDATE stats_counters SET value = value - (OLD.is_pro IS 1) WHERE name = 'pro_users';
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS stats_profiles_pro AFTER UPDATE OF is_pro ON user_profiles
+    WHEN (NEW.is_pro IS 1) != (OLD.is_pro IS 1) BEGIN
+        UPDATE stats_counters SET value = value + (NEW.is_pro IS 1) - (OLD.is_pro IS 1) WHERE name = 'pro_users';
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS stats_reports_insert AFTER INSERT ON reports BEGIN
+        UPDATE stats_counters SET value = value + 1 WHERE name = 'total_reports';
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS stats_reports_delete AFTER DELETE ON reports BEGIN
+        UPDATE stats_counters SET value = value - 1 WHERE name = 'total_reports';
+    END""",
+)
+
+def setup_stats_counters():
+    """Membuat tabel counter dan trigger-nya, lalu mengisi ulang nilainya sekali saat start."""
+    db_query("CREATE TABLE IF NOT EXISTS stats_counters (name TEXT PRIMARY KEY, value INTEGER NOT NULL)")
+    for trigger in STATS_TRIGGERS:
+        db_query(trigger)
+    # Dihitung ulang di dalam transaksi setup, jadi selisih apa pun dari versi lama terkoreksi
+    db_query(
+        "INSERT OR REPLACE INTO stats_counters (name, value)"
+        " SELECT 'total_users', COUNT(*) FROM user_profiles"
+        " UNION ALL SELECT 'pro_users', COUNT(*) FROM user_profiles WHERE is_pro = 1"
+        " UNION ALL SELECT 'total_reports', COUNT(*) FROM reports"
+    )
+
+def read_stats_counters():
+    """Membaca semua counter agregat sebagai dict name -> value."""
+    return dict(db_query("SELECT name, value FROM stats_counters"))
+
+_stats_cache = (0.0, None)  # (kedaluwarsa, counter)
+
+async def aget_stats_counters(max_age=STATS_CACHE_TTL):
+    """Counter agregat, dipakai ulang selama `max_age` detik (0 = selalu baca terbaru)."""
+    global _stats_cache
+    expires, counters = _stats_cache
+    now = time.monotonic()
+    if counters is None or now >= expires or max_age <= 0:
+        counters = await run_db(read_stats_counters)
+        _stats_cache = (now + max_age, counters)
+    return counters
+
+class ProfileCache:
+    """Cache LRU write-through di depan tabel user_profiles.
+
+    Menyimpan baris profil apa adanya (lengkap maupun belum); None berarti baris belum ada.
+    Profil dari cache diperlakukan read-only: salin dulu sebelum diubah.
+    """
+
+    MISSING = object()
+
+    def __init__(self, maxsize=PROFILE_CACHE_SIZE):
+        self.maxsize = maxsize
+        self._data = OrderedDict()
+        # Diakses dari event loop (baca cepat) dan thread DB (isi/perbarui)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, user_id):
+        """Mengambil profil dan menghitung hit/miss; ProfileCache.MISSING jika tidak ada."""
+        with self._lock:
+            profile = self._data.get(user_id, self.MISSING)
+            if profile is self.MISSING:
+                self.misses += 1
+            else:
+                self._data.move_to_end(user_id)
+                self.hits += 1
+            return profile
+
+    def peek(self, user_id):
+        """Seperti get() tetapi tanpa mengubah urutan LRU maupun counter."""
+        with self._lock:
+            return self._data.get(user_id, self.MISSING)
+
+    def put(self, user_id, profile):
+        with self._lock:
+            self._data[user_id] = profile
+            self._data.move_to_end(user_id)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self, user_id):
+        with self._lock:
+            self._data.pop(user_id, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def stats(self):
+        with self._lock:
+            return {"size": len(self._data), "hits": self.hits, "misses": self.misses, "evictions": self.evictions}
+
+profile_cache = ProfileCache()
+
+def fetch_profile(user_id):
+    """Membaca baris profil dari database lalu menyimpannya ke cache. None jika belum ada."""
     result = db_query("SELECT user_id, username, gender, age, bio, language, is_pro FROM user_profiles WHERE user_id = ?", (user_id,))
+    profile = None
     if result:
         user = result[0]
-        # Hanya kembalikan profil jika data inti (gender, age, bio) sudah diisi.
-        if user[2] and user[3] and user[4]:
-            return {"user_id": user[0], "username": user[1], "gender": user[2], "age": user[3], "bio": user[4], "language": user[5], "is_pro": bool(user[6])}
+        profile = {"user_id": user[0], "username": user[1], "gender": user[2], "age": user[3], "bio": user[4], "language": user[5], "is_pro": bool(user[6])}
+    profile_cache.put(user_id, profile)
+    return profile
+
+def load_profile(user_id):
+    """Mengambil baris profil (lengkap atau belum) lewat cache."""
+    profile = profile_cache.get(user_id)
+    if profile is ProfileCache.MISSING:
+        profile = fetch_profile(user_id)
+    return profile
+
+def complete_profile(profile):
+    """Hanya kembalikan profil jika data inti (gender, age, bio) sudah diisi."""
+    if profile and profile["gender"] and profile["age"] and profile["bio"]:
+        return profile
     return None # Jika data tidak lengkap atau tidak ada, anggap sebagai profil kosong.
 
+def get_user_profile(user_id):
+    """Mengambil profil pengguna dari database. Hanya mengembalikan jika profil sudah lengkap."""
+    return complete_profile(load_profile(user_id))
+
+async def aload_profile(user_id):
+    """Versi async load_profile: cache hit dijawab langsung tanpa melewati thread DB."""
+    profile = profile_cache.get(user_id)
+    if profile is ProfileCache.MISSING:
+        profile = await run_db(fetch_profile, user_id)
+    return profile
+
+async def aget_user_profile(user_id):
+    """Versi async get_user_profile."""
+    return complete_profile(await aload_profile(user_id))
+
+# Query panas yang diandalkan indeks SCHEMA_MIGRATIONS v1; rencananya diperiksa oleh
+# tests/test_query_plans.py dan diukur oleh benchmarks/bench_indexes.py
+USERNAME_LOOKUP_QUERY = (
+    "SELECT user_id FROM user_profiles WHERE username = ? COLLATE NOCASE"
+    " ORDER BY username = ? DESC, user_id LIMIT 1"
+)
+REPORTS_AGAINST_QUERY = "SELECT COUNT(*) FROM reports WHERE reported_id = ? AND timestamp >= ?"
+# "+reported_id" mencegah planner memilih scan penuh indeks (reported_id, timestamp) demi
+# GROUP BY tanpa sort; range scan pada jendela waktu jauh lebih kecil
+TOP_REPORTED_QUERY = (
+    "SELECT reported_id, COUNT(*) AS total FROM reports WHERE timestamp >= ?"
+    " GROUP BY +reported_id ORDER BY total DESC, reported_id LIMIT ?"
+)
+
 def find_user_by_username(username):
-    """Mencari user_id berdasarkan username."""
+    """Mencari user_id berdasarkan username (username Telegram tidak membedakan huruf besar/kecil).
+
+    Baris lama bisa masih menyimpan username yang sama dengan huruf berbeda (pemiliknya sudah
+    berganti username); baris yang hurufnya persis sama didahulukan, lalu user_id terkecil.
+    """
     clean_username = username.lstrip('@')
-    result = db_query("SELECT user_id FROM user_profiles WHERE username = ?", (clean_username,))
+    result = db_query(USERNAME_LOOKUP_QUERY, (clean_username, clean_username))
     if result: return result[0][0]
     return None
 
+def count_reports_against(user_id, since):
+    """Jumlah laporan terhadap `user_id` sejak waktu `since`."""
+    return db_query(REPORTS_AGAINST_QUERY, (user_id, since.strftime(REPORT_TIME_FORMAT)))[0][0]
+
+def top_reported_users(since, limit=10):
+    """Pengguna yang paling banyak dilaporkan sejak `since`, sebagai list (user_id, jumlah)."""
+    return db_query(TOP_REPORTED_QUERY, (since.strftime(REPORT_TIME_FORMAT), limit))
+
 def update_user_profile(user_id, username, data={}):
     """Membuat atau memperbarui profil pengguna."""
-    profile = get_user_profile(user_id) or {"user_id": user_id, "gender": None, "age": None, "bio": None, "language": "id", "is_pro": False}
-    if username: profile['username'] = username
-    profile.update(data)
-    db_query(
-        "INSERT INTO user_profiles (user_id, username, gender, age, bio, language, is_pro) VALUES (?, ?, ?, ?, ?, ?, ?) ON CONFLICT(user_id) DO UPDATE SET username=excluded.username, gender=excluded.gender, age=excluded.age, bio=excluded.bio, language=excluded.language, is_pro=excluded.is_pro",
-        (profile["user_id"], profile["username"], profile["gender"], profile["age"], profile["bio"], profile["language"], int(profile["is_pro"]))
+    with db_transaction():
+        # Baris lengkap maupun belum dipakai sebagai dasar agar username/is_pro yang ada tidak tertimpa
+        existing = load_profile(user_id)
+        profile = dict(existing) if existing else {"user_id": user_id, "username": None, "gender": None, "age": None, "bio": None, "language": "id", "is_pro": False}
+        if username: profile['username'] = username
+        profile.update(data)
+        db_query(
+            "INSERT INTO user_profiles (user_id, username, gender, age, bio, language, is_pro) VALUES (?, ?, ?, ?, ?, ?, ?) ON CONFLICT(user_id) DO UPDATE SET username=excluded.username, gender=excluded.gender, age=excluded.age, bio=excluded.bio, language=excluded.language, is_pro=excluded.is_pro",
+            (profile["user_id"], profile["username"], profile["gender"], profile["age"], profile["bio"], profile["language"], int(profile["is_pro"]))
+        )
+        profile["is_pro"] = bool(profile["is_pro"])
+        profile_cache.put(user_id, profile)
+        if shared_sessions:
+            # Worker lain membuang salinan profil ini dari cache-nya saat memutar event
+            log_session_event("profile", user_id)
+
+def migrate_legacy_chat_data():
+    """Memindahkan blob JSON lama di tabel chat_data ke tabel chat_sessions/waiting_entries."""
+    if not db_query("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'chat_data'"):
+        return
+    data = {key: json.loads(value) for key, value in db_query("SELECT key, value FROM chat_data")}
+    partners = {int(k): v for k, v in data.get('chat_partners', {}).items()}
+    pairs = {(min(a, b), max(a, b)) for a, b in partners.items()}
+    conn = get_db_connection()
+    conn.executemany("INSERT OR IGNORE INTO chat_sessions (user_a, user_b) VALUES (?, ?)", pairs)
+    now = time.time()
+    conn.executemany(
+        "INSERT OR IGNORE INTO waiting_entries (user_id, gender, preference, enqueued_at) VALUES (?, ?, ?, ?)",
+        ((entry["user_id"], entry["gender"], entry["preference"], now + i * 1e-6) for i, entry in enumerate(data.get('waiting_queue', [])))
     )
+    db_query("DROP TABLE chat_data")
+    logger.info(f"Migrasi chat_data: {len(pairs)} pasangan dan {len(data.get('waiting_queue', []))} antrian dipindahkan.")
 
-def load_chat_data():
-    """Memuat state chat dari database saat bot restart."""
-    result = db_query("SELECT key, value FROM chat_data")
-    data = {key: json.loads(value) for key, value in result}
-    # Konversi key dari string (JSON) ke integer (Python dict)
-    partners = {int(k): v for k, v in data.get('chat_partners', {}).items()}
-    waiting_queue = data.get('waiting_queue', [])
+# Status Pro tidak disimpan di waiting_entries; diambil dari profil saat antrian dimuat
+WAITING_ENTRIES_QUERY = (
+    "SELECT w.user_id, w.gender, w.preference, w.enqueued_at, COALESCE(p.is_pro, 0) FROM waiting_entries w"
+    " LEFT JOIN user_profiles p ON p.user_id = w.user_id ORDER BY w.enqueued_at, w.user_id"
+)
+
+def load_chat_data(conn=None):
+    """Memuat state chat dari database saat bot restart.
+
+    `conn` dipakai oleh replika sharding yang membaca lewat koneksinya sendiri.
+    """
+    if conn is None:
+        with _db_lock:
+            return load_chat_data(get_db_connection())
+    partners = {}
+    for user_a, user_b in conn.execute("SELECT user_a, user_b FROM chat_sessions"):
+        partners[user_a] = user_b
+        partners[user_b] = user_a
+    waiting_queue = [
+        {"user_id": user_id, "gender": gender, "preference": preference, "enqueued_at": enqueued_at, "pro": bool(is_pro)}
+        for user_id, gender, preference, enqueued_at, is_pro in conn.execute(WAITING_ENTRIES_QUERY)
+    ]
     return partners, waiting_queue
 
-def save_chat_data():
-    """Menyimpan state chat saat ini ke database."""
-    global chat_partners, waiting_queue
-    # Pastikan key di-dump sebagai string untuk JSON
-    partners_to_save = {str(k): v for k, v in chat_partners.items()}
-    db_query("UPDATE chat_data SET value = ? WHERE key = 'chat_partners'", (json.dumps(partners_to_save),))
-    db_query("UPDATE chat_data SET value = ? WHERE key = 'waiting_queue'", (json.dumps(waiting_queue),))
+def recover_sessions():
+    """Memuat state sesi saat start, memvalidasi, dan memperbaiki baris yang saling bertentangan.
+
+    Sesi yang melibatkan user di lebih dari satu baris chat_sessions (atau berpasangan dengan
+    dirinya sendiri) diputus, dan entri antrian milik user yang sedang chat dibuang. Perbaikan
+    ditulis dalam satu transaksi. Mengembalikan (partners, antrian, user yang sesinya diputus).
+    """
+    with _db_lock:
+        conn = get_db_connection()
+        pairs = conn.execute("SELECT user_a, user_b FROM chat_sessions").fetchall()
+        entries = conn.execute(WAITING_ENTRIES_QUERY).fetchall()
+    sessions_per_user = Counter(user_id for pair in pairs for user_id in pair)
+    partners, broken = {}, []
+    for user_a, user_b in pairs:
+        if user_a == user_b or sessions_per_user[user_a] > 1 or sessions_per_user[user_b] > 1:
+            broken.append(user_a)
+        else:
+            partners[user_a] = user_b
+            partners[user_b] = user_a
+    waiting, stale = [], []
+    for user_id, gender, preference, enqueued_at, is_pro in entries:
+        if user_id in partners:
+            stale.append(user_id)
+        else:
+            waiting.append({"user_id": user_id, "gender": gender, "preference": preference, "enqueued_at": enqueued_at, "pro": bool(is_pro)})
+    if broken or stale:
+        with db_transaction():
+            conn.executemany("DELETE FROM chat_sessions WHERE user_a = ?", [(user_a,) for user_a in broken])
+            conn.executemany("DELETE FROM waiting_entries WHERE user_id = ?", [(user_id,) for user_id in stale])
+        logger.warning(f"Pemulihan: {len(broken)} sesi bertentangan diputus, {len(stale)} entri antrian ganda dibuang.")
+    broken_users = sorted({user_id for user_id, count in sessions_per_user.items() if user_id not in partners})
+    return partners, waiting, broken_users
+
+def take_shutdown_marker():
+    """Membaca lalu menghapus penanda shutdown bersih; waktu shutdown terakhir, atau None jika crash."""
+    with db_transaction():
+        rows = db_query("SELECT value FROM bot_state WHERE key = 'clean_shutdown'")
+        db_query("DELETE FROM bot_state WHERE key = 'clean_shutdown'")
+    return rows[0][0] if rows else None
+
+def write_shutdown_marker():
+    """Menandai bahwa bot berhenti dengan bersih (semua update dan perubahan sesi sudah ditulis)."""
+    db_query("INSERT OR REPLACE INTO bot_state (key, value) VALUES ('clean_shutdown', ?)", (time.time(),))
+
+# Perubahan state sesi ditulis sebagai delta per event, bukan menulis ulang seluruh state.
+def persist_enqueue(entry):
+    """Menyimpan satu entri antrian baru."""
+    db_query(
+        "INSERT OR REPLACE INTO waiting_entries (user_id, gender, preference, enqueued_at) VALUES (?, ?, ?, ?)",
+        (entry["user_id"], entry["gender"], entry["preference"], entry["enqueued_at"])
+    )
+
+def persist_cancel(user_id):
+    """Menghapus entri antrian milik user_id."""
+    db_query("DELETE FROM waiting_entries WHERE user_id = ?", (user_id,))
+
+def persist_match(user1_id, user2_id):
+    """Memindahkan dua pengguna dari antrian menjadi satu baris pasangan."""
+    persist_matches([(user1_id, user2_id)])
+
+def persist_matches(pairs):
+    """Memindahkan banyak pasangan sekaligus dari antrian ke chat_sessions (satu putaran pencocokan).
+
+    Setiap pasangan juga dicatat di partner_history, dasar validasi tombol laporan.
+    """
+    now = time.time()
+    with db_transaction() as conn:
+        conn.executemany("DELETE FROM waiting_entries WHERE user_id = ?", [(user_id,) for pair in pairs for user_id in pair])
+        conn.executemany("INSERT OR REPLACE INTO chat_sessions (user_a, user_b) VALUES (?, ?)", [(min(pair), max(pair)) for pair in pairs])
+        conn.executemany("INSERT OR REPLACE INTO partner_history (user_a, user_b, matched_at) VALUES (?, ?, ?)", [(min(pair), max(pair), now) for pair in pairs])
+
+def were_partners(user1_id, user2_id, since):
+    """True jika kedua pengguna pernah dipasangkan sejak `since` (timestamp)."""
+    return bool(db_query(
+        "SELECT 1 FROM partner_history WHERE user_a = ? AND user_b = ? AND matched_at >= ?",
+        (min(user1_id, user2_id), max(user1_id, user2_id), since),
+    ))
+
+def trim_partner_history(before):
+    """Membuang riwayat pasangan yang dipertemukan sebelum `before` (timestamp)."""
+    db_query("DELETE FROM partner_history WHERE matched_at < ?", (before,))
+
+def persist_reaped(pairs, user_ids):
+    """Menghapus pasangan dan entri antrian yang diakhiri IdleReaper dalam satu transaksi."""
+    with db_transaction() as conn:
+        conn.executemany("DELETE FROM chat_sessions WHERE user_a = ?", [(min(pair),) for pair in pairs])
+        conn.executemany("DELETE FROM waiting_entries WHERE user_id = ?", [(user_id,) for user_id in user_ids])
+
+def persist_end(user1_id, user2_id):
+    """Menghapus baris pasangan saat sesi chat berakhir."""
+    db_query("DELETE FROM chat_sessions WHERE user_a = ?", (min(user1_id, user2_id),))
+
+# Versi atomik untuk mode sharding: keputusan diambil dari tabel bersama (bukan replika lokal)
+# di dalam transaksi IMMEDIATE, lalu dicatat ke session_events dalam transaksi yang sama.
+def log_session_event(kind, user_a, user_b=None, entry=None):
+    """Menambahkan satu event ke log perubahan sesi."""
+    db_query(
+        "INSERT INTO session_events (kind, user_a, user_b, gender, preference, enqueued_at, created_at) VALUES (?, ?, ?, ?, ?, ?, ?)",
+        (kind, user_a, user_b, entry and entry["gender"], entry and entry["preference"], entry and entry["enqueued_at"], time.time())
+    )
+
+def shared_enqueue(entry):
+    """Memasukkan entri ke antrian bersama; False jika user sudah chat/antri di worker mana pun."""
+    user_id = entry["user_id"]
+    with db_transaction():
+        if db_query("SELECT 1 FROM chat_sessions WHERE user_a = ? OR user_b = ?", (user_id, user_id)):
+            return False
+        if db_query("SELECT 1 FROM waiting_entries WHERE user_id = ?", (user_id,)):
+            return False
+        persist_enqueue(entry)
+        log_session_event("enqueue", user_id, entry=entry)
+    return True
+
+def shared_cancel(user_id):
+    """Mengeluarkan user dari antrian bersama; mengembalikan enqueued_at, atau None jika tidak sedang antri."""
+    with db_transaction():
+        rows = db_query("SELECT enqueued_at FROM waiting_entries WHERE user_id = ?", (user_id,))
+        if not rows:
+            return None
+        persist_cancel(user_id)
+        log_session_event("cancel", user_id)
+    return rows[0][0]
+
+def shared_pop_matches(limit, blocked=()):
+    """Membentuk hingga `limit` pasangan dari antrian bersama; mengembalikan daftar (entri1, entri2).
+
+    Satu pasangan mengambil paling banyak dua entri dari satu bucket (gender, preferensi, Pro),
+    jadi 2 * limit entri terlama tiap bucket sudah cukup untuk memberi hasil yang sama dengan
+    MatchQueue.pop_match() berulang atas seluruh antrian. Giliran antar bucket untuk entri yang
+    melewati MATCH_MAX_WAIT hanya diingat selama satu panggilan. Pengguna di `blocked` tidak
+    dipasangkan (entrinya tetap di antrian bersama).
+    """
+    with db_transaction():
+        rows = db_query(
+            "SELECT user_id, gender, preference, enqueued_at, is_pro FROM ("
+            " SELECT w.*, COALESCE(p.is_pro, 0) AS is_pro, ROW_NUMBER() OVER ("
+            "  PARTITION BY w.gender, w.preference, COALESCE(p.is_pro, 0) ORDER BY w.enqueued_at, w.user_id) AS position"
+            " FROM waiting_entries w LEFT JOIN user_profiles p ON p.user_id = w.user_id)"
+            " WHERE position <= ? ORDER BY enqueued_at, user_id",
+            (2 * limit,)
+        )
+        candidates = MatchQueue(
+            {"user_id": user_id, "gender": gender, "preference": preference, "enqueued_at": enqueued_at, "pro": bool(is_pro)}
+            for user_id, gender, preference, enqueued_at, is_pro in rows
+        )
+        for user_id in blocked:
+            candidates.cancel(user_id)
+        matches = []
+        now = time.time()
+        while len(matches) < limit and (matched_users := candidates.pop_match(now)):
+            matches.append(matched_users)
+        if matches:
+            persist_matches([(user1["user_id"], user2["user_id"]) for user1, user2 in matches])
+            for user1, user2 in matches:
+                log_session_event("match", user1["user_id"], user2["user_id"])
+    return matches
+
+def shared_end(user_id):
+    """Mengakhiri sesi chat bersama milik user_id; mengembalikan ID partner atau None."""
+    with db_transaction():
+        rows = db_query("SELECT user_a, user_b FROM chat_sessions WHERE user_a = ? OR user_b = ?", (user_id, user_id))
+        if not rows:
+            return None
+        user_a, user_b = rows[0]
+        persist_end(user_a, user_b)
+        log_session_event("end", user_a, user_b)
+    return user_b if user_a == user_id else user_a
+
+def trim_session_events(before):
+    """Memangkas event sesi yang lebih tua dari `before` (timestamp)."""
+    db_query("DELETE FROM session_events WHERE created_at < ?", (before,))
+
+class SharedSessionState:
+    """Replika lokal state sesi untuk mode sharding.
+
+    Sumber kebenaran adalah tabel chat_sessions/waiting_entries di database bersama; setiap
+    perubahan juga dicatat di session_events dengan urutan commit. chat_partners dan
+    waiting_queue di worker ini hanya diubah dengan memutar ulang event tersebut, sehingga
+    semua worker melihat urutan perubahan yang sama. PRAGMA data_version membuat pemeriksaan
+    "ada commit baru?" nyaris gratis dan semua query replika berjalan di thread pembaca, jadi
+    refresh() aman di-await di awal setiap update.
+    """
+
+    def __init__(self):
+        self._conn = None
+        self._data_version = None
+        # Satu thread pembaca: query replika tidak memblokir event loop maupun thread DB
+        self._reader = concurrent.futures.ThreadPoolExecutor(max_workers=1, thread_name_prefix="shard-reader")
+        self._requested = 0  # Nomor panggilan refresh() terakhir
+        self._completed = 0  # Panggilan refresh() dengan nomor sampai sini sudah terlayani
+        self._running = None  # Task refresh yang sedang membaca DB
+        self.last_event_id = 0
+        self.applied = 0
+        self.reloads = 0
+
+    def _connection(self):
+        # Koneksi baca terpisah: tidak ikut transaksi thread DB dan tidak memegang kunci tulis
+        if self._conn is None:
+            self._conn = sqlite3.connect(DB_FILE, isolation_level=None, check_same_thread=False)
+            self._conn.execute("PRAGMA busy_timeout=5000")
+        return self._conn
+
+    def close(self):
+        self._reader.shutdown(wait=True)
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+
+    def _read_snapshot(self):
+        """Isi tabel snapshot beserta event terakhir yang sudah tercakup di dalamnya."""
+        conn = self._connection()
+        conn.execute("BEGIN")
+        try:
+            last_event_id = conn.execute("SELECT COALESCE(MAX(event_id), 0) FROM session_events").fetchone()[0]
+            partners, saved_queue = load_chat_data(conn)
+        finally:
+            conn.execute("COMMIT")
+        return last_event_id, partners, saved_queue
+
+    def _read_events(self, after):
+        """Event setelah `after`, atau None jika tidak ada commit baru sejak pembacaan sebelumnya."""
+        conn = self._connection()
+        version = conn.execute("PRAGMA data_version").fetchone()[0]
+        if version == self._data_version:
+            return None
+        self._data_version = version
+        return conn.execute(
+            "SELECT event_id, kind, user_a, user_b, gender, preference, enqueued_at FROM session_events WHERE event_id > ? ORDER BY event_id",
+            (after,)
+        ).fetchall()
+
+    def _install(self, snapshot):
+        global chat_partners, waiting_queue
+        last_event_id, partners, saved_queue = snapshot
+        chat_partners = partners
+        waiting_queue = MatchQueue(saved_queue)
+        self.last_event_id = last_event_id
+        self.reloads += 1
+        matchmaker.wake()
+
+    def reload(self):
+        """Membangun ulang replika dari tabel snapshot saat start (sebelum event loop berjalan)."""
+        self._install(self._read_snapshot())
+
+    async def refresh(self):
+        """Memutar event yang belum diterapkan; tidak melakukan apa pun jika tidak ada commit baru.
+
+        Query berjalan di thread pembaca. Panggilan bersamaan digabung: satu pembacaan melayani
+        semua panggilan yang datang sebelum pembacaan itu dimulai, jadi pemanggil yang baru saja
+        commit selalu melihat event miliknya sendiri setelah refresh() selesai.
+        """
+        self._requested += 1
+        ticket = self._requested
+        while self._completed < ticket:
+            if self._running is None:
+                self._running = asyncio.get_running_loop().create_task(self._refresh(self._requested))
+            await asyncio.shield(self._running)
+
+    async def _refresh(self, ticket):
+        loop = asyncio.get_running_loop()
+        try:
+            events = await loop.run_in_executor(self._reader, self._read_events, self.last_event_id)
+            if events and events[0][0] != self.last_event_id + 1:
+                # Sebagian event sudah dipangkas sebelum sempat diterapkan
+                self._install(await loop.run_in_executor(self._reader, self._read_snapshot))
+            else:
+                for event in events or ():
+                    self.apply(*event)
+            self._completed = ticket
+        finally:
+            self._running = None
+
+    def apply(self, event_id, kind, user_a, user_b, gender, preference, enqueued_at):
+        if kind == "enqueue":
+            waiting_queue.cancel(user_a)
+            waiting_queue.append({"user_id": user_a, "gender": gender, "preference": preference, "enqueued_at": enqueued_at})
+            # Entri dari worker lain bisa cocok dengan antrian lokal
+            matchmaker.wake()
+        elif kind == "cancel":
+            waiting_queue.cancel(user_a)
+        elif kind == "match":
+            waiting_queue.cancel(user_a)
+            waiting_queue.cancel(user_b)
+            chat_partners.update({user_a: user_b, user_b: user_a})
+        elif kind == "end":
+            for user_id in (user_a, user_b):
+                chat_partners.pop(user_id, None)
+        elif kind == "profile":
+            profile_cache.invalidate(user_a)
+        self.last_event_id = event_id
+        self.applied += 1
+
+async def session_event_trim_loop():
+    """Memangkas log event sesi secara berkala (mode sharding)."""
+    while True:
+        await asyncio.sleep(SHARD_TRIM_INTERVAL)
+        try:
+            await run_db(trim_session_events, time.time() - SHARD_EVENT_RETENTION)
+        except Exception as e:
+            logger.error(f"Gagal memangkas log event sesi: {e}")
+
+def touch_user_profile(user_id, username):
+    """Memastikan baris profil ada dan username-nya terbaru."""
+    with db_transaction():
+        # Hanya membuat entri baru jika belum ada sama sekali
+        db_query("INSERT OR IGNORE INTO user_profiles (user_id, username) VALUES (?, ?)", (user_id, username))
+        # Selalu update username jika berubah (dan jika user punya username)
+        if username:
+            db_query("UPDATE user_profiles SET username = ? WHERE user_id = ?", (username, user_id))
+        if shared_sessions:
+            log_session_event("profile", user_id)
+    cached = profile_cache.peek(user_id)
+    if cached is None:
+        # Baris baru saja dibuat; cache negatif tidak berlaku lagi
+        profile_cache.invalidate(user_id)
+    elif cached is not ProfileCache.MISSING and username and cached["username"] != username:
+        profile_cache.put(user_id, {**cached, "username": username})
+
+class UsernameTracker:
+    """Mengingat pengguna yang barisnya sudah ada beserta username terakhirnya.
+
+    Hanya pengguna yang belum dikenal yang perlu ditulis langsung ke DB; perubahan username
+    ditampung lalu ditulis per batch oleh username_flush_loop().
+    """
+
+    def __init__(self, maxsize=KNOWN_USERS_CACHE_SIZE):
+        self.maxsize = maxsize
+        self._known = OrderedDict()  # user_id -> username terakhir yang diketahui
+        self._pending = {}  # user_id -> username yang belum ditulis ke DB
+
+    def is_known(self, user_id):
+        return user_id in self._known
+
+    def remember(self, user_id, username):
+        self._known[user_id] = username
+        self._known.move_to_end(user_id)
+        while len(self._known) > self.maxsize:
+            self._known.popitem(last=False)
+
+    def observe(self, user_id, username):
+        """Mencatat username pengguna yang sudah dikenal; perubahan dijadwalkan untuk flush."""
+        self._known.move_to_end(user_id)
+        if username and self._known[user_id] != username:
+            self._known[user_id] = username
+            self._pending[user_id] = username
+            # Pembaca cache langsung melihat username baru sebelum flush ke DB
+            cached = profile_cache.peek(user_id)
+            if cached:
+                profile_cache.put(user_id, {**cached, "username": username})
+
+    @property
+    def pending(self):
+        return len(self._pending)
+
+    def take_pending(self):
+        pending, self._pending = self._pending, {}
+        return pending
+
+    def restore_pending(self, pending):
+        """Mengembalikan batch dari take_pending() yang gagal ditulis; perubahan yang lebih baru menang."""
+        for user_id, username in pending.items():
+            self._pending.setdefault(user_id, username)
+
+username_tracker = UsernameTracker()
+
+def write_usernames(changes):
+    """Menulis batch perubahan username [(username, user_id), ...] dalam satu transaksi."""
+    with db_transaction():
+        get_db_connection().executemany("UPDATE user_profiles SET username = ? WHERE user_id = ?", changes)
+        if shared_sessions:
+            for _, user_id in changes:
+                log_session_event("profile", user_id)
+
+async def flush_usernames():
+    """Menulis semua perubahan username yang masih tertunda."""
+    pending = username_tracker.take_pending()
+    if pending:
+        try:
+            await run_db(write_usernames, [(username, user_id) for user_id, username in pending.items()])
+        except Exception:
+            # _known sudah berisi username baru, jadi observe() tidak akan menjadwalkannya lagi
+            username_tracker.restore_pending(pending)
+            raise
+
+async def username_flush_loop():
+    """Tugas latar belakang: flush perubahan username setiap USERNAME_FLUSH_INTERVAL detik."""
+    while True:
+        await asyncio.sleep(USERNAME_FLUSH_INTERVAL)
+        try:
+            await flush_usernames()
+        except Exception as e:
+            logger.error(f"Gagal menyimpan batch username: {e}")
 
 def auto_update_profile(func):
-    """Decorator untuk memastikan profil dasar pengguna selalu ada dan username-nya terbaru."""
+    """Decorator untuk memastikan profil dasar pengguna selalu ada dan username-nya terbaru.
+
+    DB hanya disentuh untuk pengguna yang belum dikenal; perubahan username ditulis per batch,
+    sehingga jalur relay pesan tidak melakukan penulisan DB sama sekali.
+    """
     @wraps(func)
     async def wrapped(update: Update, context: ContextTypes.DEFAULT_TYPE, *args, **kwargs):
         if update.effective_user:
             user_id = update.effective_user.id
             username = update.effective_user.username
-            # Hanya membuat entri baru jika belum ada sama sekali
-            db_query("INSERT OR IGNORE INTO user_profiles (user_id, username) VALUES (?, ?)", (user_id, username))
-            # Selalu update username jika berubah (dan jika user punya username)
-            if username:
-                db_query("UPDATE user_profiles SET username = ? WHERE user_id = ?", (username, user_id))
+            if username_tracker.is_known(user_id):
+                username_tracker.observe(user_id, username)
+            else:
+                await run_db(touch_user_profile, user_id, username)
+                username_tracker.remember(user_id, username)
         return await func(update, context, *args, **kwargs)
     return wrapped
 
 
+# --- PENGIRIMAN PESAN KELUAR ---
+# Jalur prioritas: relay pesan chat, lalu balasan langsung untuk perintah pengguna, lalu notifikasi
+PRIORITY_RELAY = 0
+PRIORITY_CONTROL = 1
+PRIORITY_NOTIFY = 2
+
+class TokenBucket:
+    """Token bucket: `rate` token per detik dengan kapasitas `burst`."""
+
+    __slots__ = ("rate", "burst", "tokens", "updated")
+
+    def __init__(self, rate, burst, now):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = float(burst)
+        self.updated = now
+
+    def _refill(self, now):
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def delay(self, now):
+        """Detik sampai satu token tersedia (0 jika sudah tersedia)."""
+        self._refill(now)
+        return 0.0 if self.tokens >= 1 else (1 - self.tokens) / self.rate
+
+    def consume(self):
+        self.tokens -= 1
+
+    def is_full(self, now):
+        self._refill(now)
+        return self.tokens >= self.burst
+
+class OutboundQueueFull(Exception):
+    """Antrian kirim penuh; pesan baru ditolak sebagai backpressure."""
+
+class OutboundJob:
+    __slots__ = ("func", "chat_id", "kwargs", "priority", "seq", "future", "enqueued_at", "attempts")
+
+    def __init__(self, func, chat_id, kwargs, priority, seq, future, enqueued_at):
+        self.func = func
+        self.chat_id = chat_id
+        self.kwargs = kwargs
+        self.priority = priority
+        self.seq = seq
+        self.future = future
+        self.enqueued_at = enqueued_at
+        self.attempts = 0
+
+def retry_after_seconds(error):
+    """Mengambil lama jeda dari RetryAfter (int atau timedelta tergantung versi PTB)."""
+    value = error.retry_after
+    return value.total_seconds() if isinstance(value, timedelta) else float(value)
+
+class OutboundScheduler:
+    """Penjadwal pesan keluar yang sadar batas kirim Telegram.
+
+    - Token bucket global dan per chat; chat yang kehabisan token ditunda tanpa menahan chat lain.
+    - Pesan ke chat yang sama dikirim berurutan (satu per satu, FIFO).
+    - Antar chat, jalur PRIORITY_RELAY didahulukan daripada PRIORITY_CONTROL, lalu PRIORITY_NOTIFY.
+    - RetryAfter menjeda semua pengiriman selama waktu yang diminta lalu mencoba ulang pesannya.
+    - Jumlah pesan tertunda dibatasi SEND_QUEUE_LIMIT; lewat dari itu submit() melempar OutboundQueueFull.
+      PRIORITY_CONTROL masih boleh memakai `control_reserve` slot tambahan, agar jawaban seperti
+      "bot sedang sibuk" tetap terkirim saat antrian penuh oleh relay.
+    """
+
+    def __init__(self, global_rate=SEND_GLOBAL_RATE, global_burst=SEND_GLOBAL_BURST, chat_rate=SEND_CHAT_RATE,
+                 chat_burst=SEND_CHAT_BURST, limit=SEND_QUEUE_LIMIT, max_retries=SEND_MAX_RETRIES,
+                 chat_buckets=SEND_CHAT_BUCKETS, control_reserve=SEND_CONTROL_RESERVE):
+        self.global_rate = global_rate
+        self.global_burst = global_burst
+        self.chat_rate = chat_rate
+        self.chat_burst = chat_burst
+        self.limit = limit
+        self.max_retries = max_retries
+        self.chat_buckets = chat_buckets
+        self.control_reserve = control_reserve
+        self._ready = []  # heap (priority, seq, job): kepala antrian chat yang siap dikirim
+        self._delayed = []  # heap (ready_at, seq, job): menunggu token chat atau jeda retry
+        self._chats = {}  # chat_id -> deque[job]; hanya kepala deque yang dijadwalkan
+        self._chat_buckets = OrderedDict()  # chat_id -> TokenBucket, urutan LRU
+        self._global_bucket = None
+        self._paused_until = 0.0
+        self._seq = itertools.count()
+        self._wakeup = None
+        self._task = None
+        self._inflight = set()
+        self.pending = 0
+        self.peak_pending = 0
+        self.sent = 0
+        self.failed = 0
+        self.retried = 0
+        self.rate_limited = 0
+        self.rejected = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+
+    def submit(self, func, chat_id, priority=PRIORITY_NOTIFY, **kwargs):
+        """Menjadwalkan func(chat_id=chat_id, **kwargs); mengembalikan future hasil pengiriman."""
+        limit = self.limit + self.control_reserve if priority == PRIORITY_CONTROL else self.limit
+        if self.pending >= limit:
+            self.rejected += 1
+            raise OutboundQueueFull(f"Antrian kirim penuh ({self.pending} pesan tertunda)")
+        loop = asyncio.get_running_loop()
+        self._ensure_running(loop)
+        job = OutboundJob(func, chat_id, kwargs, priority, next(self._seq), loop.create_future(), loop.time())
+        self.pending += 1
+        self.peak_pending = max(self.peak_pending, self.pending)
+        chat_queue = self._chats.get(chat_id)
+        if chat_queue is None:
+            self._chats[chat_id] = deque([job])
+            self._schedule(job)
+        else:
+            chat_queue.append(job)
+        return job.future
+
+    async def send(self, func, chat_id, priority=PRIORITY_NOTIFY, **kwargs):
+        """Seperti submit(), tetapi menunggu sampai pesan terkirim (atau gagal)."""
+        return await self.submit(func, chat_id, priority, **kwargs)
+
+    def stats(self):
+        delivered = self.sent + self.failed
+        return {
+            "pending": self.pending,
+            "peak_pending": self.peak_pending,
+            "ready": len(self._ready),
+            "delayed": len(self._delayed),
+            "sent": self.sent,
+            "failed": self.failed,
+            "retried": self.retried,
+            "rate_limited": self.rate_limited,
+            "rejected": self.rejected,
+            "avg_wait": self.wait_total / delivered if delivered else 0.0,
+            "max_wait": self.wait_max,
+        }
+
+    async def drain(self, timeout=10.0):
+        """Menunggu semua pesan tertunda terkirim (maksimal `timeout` detik), lalu berhenti."""
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + timeout
+        while (self.pending or self._inflight) and loop.time() < deadline:
+            await asyncio.sleep(0.05)
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        if self.pending:
+            logger.warning(f"{self.pending} pesan keluar tidak sempat terkirim saat berhenti.")
+
+    def _ensure_running(self, loop):
+        if self._task is None or self._task.done():
+            self._wakeup = asyncio.Event()
+            self._global_bucket = TokenBucket(self.global_rate, self.global_burst, loop.time())
+            self._task = loop.create_task(self._run())
+
+    def _schedule(self, job, ready_at=0.0):
+        if ready_at > 0.0:
+            heapq.heappush(self._delayed, (ready_at, job.seq, job))
+        else:
+            heapq.heappush(self._ready, (job.priority, job.seq, job))
+        self._wakeup.set()
+
+    def _chat_bucket(self, chat_id, now):
+        bucket = self._chat_buckets.get(chat_id)
+        if bucket is not None:
+            self._chat_buckets.move_to_end(chat_id)
+            return bucket
+        # Bucket diurutkan dari yang paling lama tidak dipakai; buang dari depan selama bucket itu
+        # sudah penuh kembali dan chat-nya tidak punya pesan tertunda (bucket di belakangnya lebih baru)
+        while len(self._chat_buckets) >= self.chat_buckets:
+            oldest_id, oldest = next(iter(self._chat_buckets.items()))
+            if oldest_id in self._chats or not oldest.is_full(now):
+                break
+            self._chat_buckets.popitem(last=False)
+        bucket = self._chat_buckets[chat_id] = TokenBucket(self.chat_rate, self.chat_burst, now)
+        return bucket
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            now = loop.time()
+            while self._delayed and self._delayed[0][0] <= now:
+                _, _, job = heapq.heappop(self._delayed)
+                heapq.heappush(self._ready, (job.priority, job.seq, job))
+            timeout = None
+            if self._ready:
+                timeout = max(self._paused_until - now, self._global_bucket.delay(now))
+                if timeout <= 0:
+                    _, _, job = heapq.heappop(self._ready)
+                    bucket = self._chat_bucket(job.chat_id, now)
+                    chat_delay = bucket.delay(now)
+                    if chat_delay > 0:
+                        heapq.heappush(self._delayed, (now + chat_delay, job.seq, job))
+                        continue
+                    bucket.consume()
+                    self._global_bucket.consume()
+                    task = loop.create_task(self._deliver(job))
+                    self._inflight.add(task)
+                    task.add_done_callback(self._inflight.discard)
+                    continue
+            if self._delayed:
+                delayed = self._delayed[0][0] - now
+                timeout = delayed if timeout is None else min(timeout, delayed)
+            self._wakeup.clear()
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+
+    async def _deliver(self, job):
+        loop = asyncio.get_running_loop()
+        try:
+            result = await job.func(chat_id=job.chat_id, **job.kwargs)
+        except RetryAfter as e:
+            self.rate_limited += 1
+            self._paused_until = max(self._paused_until, loop.time() + retry_after_seconds(e))
+            logger.warning(f"Kena flood limit Telegram, jeda {retry_after_seconds(e)} detik.")
+            if job.attempts < self.max_retries:
+                job.attempts += 1
+                self.retried += 1
+                self._schedule(job, ready_at=self._paused_until)
+                return
+            self._finish(job, error=e)
+        except BadRequest as e:
+            self._finish(job, error=e)
+        except NetworkError as e:
+            if job.attempts < self.max_retries:
+                job.attempts += 1
+                self.retried += 1
+                self._schedule(job, ready_at=loop.time() + 0.5 * 2 ** job.attempts)
+                return
+            self._finish(job, error=e)
+        except Exception as e:
+            self._finish(job, error=e)
+        else:
+            self._finish(job, result=result)
+
+    def _finish(self, job, result=None, error=None):
+        wait = asyncio.get_running_loop().time() - job.enqueued_at
+        self.wait_total += wait
+        self.wait_max = max(self.wait_max, wait)
+        self.pending -= 1
+        if error is not None:
+            self.failed += 1
+            if not job.future.done():
+                job.future.set_exception(error)
+        else:
+            self.sent += 1
+            if not job.future.done():
+                job.future.set_result(result)
+        chat_queue = self._chats[job.chat_id]
+        chat_queue.popleft()
+        if chat_queue:
+            self._schedule(chat_queue[0])
+        else:
+            del self._chats[job.chat_id]
+
+outbox = OutboundScheduler()
+
+def send_reply(update, text, **kwargs):
+    """Menjawab pengirim `update` lewat outbox (PRIORITY_CONTROL) alih-alih reply_text langsung."""
+    return outbox.send(update.get_bot().send_message, update.effective_chat.id, PRIORITY_CONTROL, text=text, **kwargs)
+
+def edit_reply(query, text, **kwargs):
+    """Mengganti teks pesan tempat tombol `query` ditekan, lewat outbox (PRIORITY_CONTROL)."""
+    return outbox.send(
+        query.get_bot().edit_message_text, query.message.chat.id, PRIORITY_CONTROL,
+        message_id=query.message.message_id, text=text, **kwargs,
+    )
+
+
 # --- PERINTAH OWNER & STATS ---
 @owner_only
 @auto_update_profile
@@ -137,62 +1879,233 @@ async def grant_pro_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
         else:
             arg = context.args[0]
             if arg.startswith('@'):
-                target_user_id = find_user_by_username(arg)
+                # Perubahan username yang masih tertunda ditulis dulu agar pencarian memakai data terbaru
+                await flush_usernames()
+                target_user_id = await run_db(find_user_by_username, arg)
                 if not target_user_id:
-                    await update.message.reply_text(f"User dengan username {arg} tidak ditemukan di database bot.")
+                    await send_reply(update, f"User dengan username {arg} tidak ditemukan di database bot.")
                     return
             else:
                 target_user_id = int(arg)
 
         if target_user_id:
-            profile = get_user_profile(target_user_id)
-            update_user_profile(target_user_id, profile.get('username') if profile else None, {"is_pro": True})
-            await update.message.reply_text(f"✅ Berhasil! User ID {target_user_id} sekarang adalah Pro.")
+            profile = await aget_user_profile(target_user_id)
+            await run_db(update_user_profile, target_user_id, profile.get('username') if profile else None, {"is_pro": True})
+            await send_reply(update, f"✅ Berhasil! User ID {target_user_id} sekarang adalah Pro.")
             try:
-                await context.bot.send_message(chat_id=target_user_id, text="✨ Selamat! Akun Anda telah di-upgrade ke versi Pro oleh Owner.")
+                await outbox.send(context.bot.send_message, target_user_id, text="✨ Selamat! Akun Anda telah di-upgrade ke versi Pro oleh Owner.")
             except Exception as e:
                 logger.warning(f"Gagal mengirim notifikasi Pro ke user {target_user_id}: {e}")
     except (IndexError, ValueError):
-        await update.message.reply_text("Penggunaan:\n• `/grant_pro @username`\n• `/grant_pro [USER_ID]`\n• Reply pesan user dengan `/grant_pro`")
+        await send_reply(update, "Penggunaan:\n• `/grant_pro @username`\n• `/grant_pro [USER_ID]`\n• Reply pesan user dengan `/grant_pro`")
 
 @auto_update_profile
 async def myid_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Menampilkan ID Telegram pengguna."""
     user_id = update.effective_user.id
-    await update.message.reply_text(f"ID Telegram Anda adalah:\n`{user_id}`\n\n(Klik untuk menyalin)", parse_mode='Markdown')
+    await send_reply(update, f"ID Telegram Anda adalah:\n`{user_id}`\n\n(Klik untuk menyalin)", parse_mode='Markdown')
 
 @owner_only
 @auto_update_profile
 async def admin_stats_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Menampilkan statistik detail untuk Owner."""
     global chat_partners, waiting_queue
-    total_users = db_query("SELECT COUNT(*) FROM user_profiles")[0][0]
-    pro_users = db_query("SELECT COUNT(*) FROM user_profiles WHERE is_pro = 1")[0][0]
-    total_reports = db_query("SELECT COUNT(*) FROM reports")[0][0]
+    counters = await aget_stats_counters(max_age=0)
+    total_users = counters["total_users"]
+    pro_users = counters["pro_users"]
+    total_reports = counters["total_reports"]
     users_in_chat = len(chat_partners)
     users_waiting = len(waiting_queue)
+    cache = profile_cache.stats()
+    sends = outbox.stats()
+    matching = matchmaker.stats()
+    reaping = idle_reaper.stats()
+    top_reported = await run_db(top_reported_users, datetime.now() - REPORT_STATS_WINDOW, 5)
+    top_reported_text = ", ".join(f"{user_id} ({total})" for user_id, total in top_reported) or "-"
     stats_message = (
         f"📊 **Statistik Admin**\n\n"
         f"👤 Total Pengguna: **{total_users}**\n"
         f"⭐ Pengguna Pro: **{pro_users}**\n"
         f"💬 Sedang Chat: **{users_in_chat}** pengguna\n"
         f"⏳ Dalam Antrian: **{users_waiting}** pengguna\n"
-        f"🚩 Total Laporan: **{total_reports}**"
+        f"🚩 Total Laporan: **{total_reports}**\n"
+        f"🚫 Diblokir Otomatis: **{sum(report_pipeline.is_blocked(user_id) for user_id in list(report_pipeline.blocked))}** pengguna\n"
+        f"🚩 Paling Banyak Dilaporkan ({REPORT_STATS_WINDOW.total_seconds() / 3600:.0f} jam): {top_reported_text}\n"
+        f"🗃️ Cache Profil: **{cache['size']}** entri, {cache['hits']} hit / {cache['misses']} miss / {cache['evictions']} eviction\n"
+        f"📤 Antrian Kirim: **{sends['pending']}** tertunda (puncak {sends['peak_pending']}), "
+        f"{sends['sent']} terkirim / {sends['failed']} gagal / {sends['retried']} retry / {sends['rate_limited']} flood / {sends['rejected']} ditolak, "
+        f"tunggu rata-rata {sends['avg_wait']:.2f}s (maks {sends['max_wait']:.2f}s)\n"
+        f"🎯 Pencocokan: {matching['pairs']} pasangan dalam {matching['ticks']} putaran (terbanyak {matching['largest_batch']})\n"
+        f"⏱️ Tunggu sampai dapat pasangan: {match_wait_histogram.summary()}\n"
+        f"⏱️ Tunggu sampai batal: {cancel_wait_histogram.summary()}\n"
+        f"⌛ Dibersihkan karena menganggur: {reaping['chat']} pasangan, {reaping['queue']} antrian "
+        f"({reaping['tracked']} pengguna dipantau, {reaping['heap']} tenggat di heap)"
     )
-    await update.message.reply_text(stats_message, parse_mode='Markdown')
+    await send_reply(update, stats_message, parse_mode='Markdown')
 
 @auto_update_profile
 async def stats_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Menampilkan statistik publik."""
     global chat_partners, waiting_queue
-    total_users = db_query("SELECT COUNT(*) FROM user_profiles")[0][0]
+    total_users = (await aget_stats_counters())["total_users"]
     active_users = len(chat_partners) + len(waiting_queue)
     stats_message = (
         f"📈 **Statistik Saat Ini**\n\n"
         f"👥 Total Pengguna Terdaftar: **{total_users}**\n"
         f"🟢 Pengguna Aktif Saat Ini: **{active_users}**"
     )
-    await update.message.reply_text(stats_message, parse_mode='Markdown')
+    await send_reply(update, stats_message, parse_mode='Markdown')
+
+
+# --- TEMPLATE PESAN & KEYBOARD ---
+# Teks per bahasa (kolom user_profiles.language). Setiap bahasa harus memiliki kunci dan
+# placeholder yang sama dengan DEFAULT_LANGUAGE; diperiksa sekali saat template dibangun.
+MESSAGE_TEMPLATES = {
+    "id": {
+        "welcome_new": "👋 Selamat datang! Agar pengalaman chat lebih baik, kamu bisa melengkapi profil singkat. "
+                       "Atau, kamu bisa langsung mencari pasangan secara acak.",
+        "welcome_back": "Selamat datang kembali! Gunakan /search untuk mencari pasangan acak.\n\n"
+                        "Untuk mencari berdasarkan gender, upgrade akunmu ke Pro lalu gunakan /find_by_gender.",
+        "profile_intro": "Mari kita atur profilmu! Profil ini akan ditampilkan ke pasangan chatmu.",
+        "choose_gender": "Pilih gendermu:",
+        "choose_partner_gender": "Pilih gender pasangan yang ingin kamu cari:",
+        "match_found": "✅ Pasangan ditemukan!\n\nProfil pasanganmu:\nGender: {gender}\nUmur: {age}\nBio: {bio}\n\n"
+                       "Ketik /stop untuk mengakhiri, /next untuk cari lagi.",
+        "partner_stopped": "❌ Pasanganmu telah menghentikan percakapan.",
+        "partner_next": "🚶 Pasanganmu telah beralih ke chat lain.",
+        "gender_Pria": "Pria",
+        "gender_Wanita": "Wanita",
+        "gender_Rahasia": "Rahasia",
+        "gender_Misteri": "Misteri",
+        "unknown_age": "??",
+        "unknown_bio": "-",
+        "button_setup_profile": "Lengkapi Profil 📝",
+        "button_random_search": "Lanjutkan & Cari Acak ➡️",
+        "button_any": "Apapun",
+        "button_new_search": "Cari Partner Baru 🔎",
+        "button_stop": "Stop ⏹️",
+        "button_report": "🚩 Laporkan Partner Terakhir",
+    },
+    "en": {
+        "welcome_new": "👋 Welcome! For a better chat experience you can fill in a short profile. "
+                       "Or you can start looking for a random partner right away.",
+        "welcome_back": "Welcome back! Use /search to find a random partner.\n\n"
+                        "To search by gender, upgrade your account to Pro and then use /find_by_gender.",
+        "profile_intro": "Let's set up your profile! It will be shown to your chat partners.",
+        "choose_gender": "Choose your gender:",
+        "choose_partner_gender": "Choose the gender of the partner you are looking for:",
+        "match_found": "✅ Partner found!\n\nYour partner's profile:\nGender: {gender}\nAge: {age}\nBio: {bio}\n\n"
+                       "Type /stop to end the chat, /next to find someone else.",
+        "partner_stopped": "❌ Your partner has ended the chat.",
+        "partner_next": "🚶 Your partner has moved on to another chat.",
+        "gender_Pria": "Male",
+        "gender_Wanita": "Female",
+        "gender_Rahasia": "Secret",
+        "gender_Misteri": "Mystery",
+        "unknown_age": "??",
+        "unknown_bio": "-",
+        "button_setup_profile": "Complete Profile 📝",
+        "button_random_search": "Continue & Random Search ➡️",
+        "button_any": "Any",
+        "button_new_search": "Find New Partner 🔎",
+        "button_stop": "Stop ⏹️",
+        "button_report": "🚩 Report Last Partner",
+    },
+}
+
+class MessageTemplates:
+    """Teks dan keyboard per bahasa yang disiapkan sekali saat start.
+
+    Template divalidasi saat dibangun; teks tanpa placeholder dan keyboard statis dibuat
+    sekali lalu dipakai bersama (InlineKeyboardMarkup tidak bisa diubah setelah dibuat).
+    Teks "pasangan ditemukan" di-cache per profil pasangan dan bahasa penerima. Profil di
+    ProfileCache selalu diganti dengan objek baru saat berubah, jadi objek profil itu sendiri
+    menjadi penanda versinya.
+    """
+
+    def __init__(self, catalog=MESSAGE_TEMPLATES, default_language=DEFAULT_LANGUAGE, intro_cache_size=INTRO_CACHE_SIZE):
+        fields = {key: self._fields(template) for key, template in catalog[default_language].items()}
+        for language, texts in catalog.items():
+            if texts.keys() != fields.keys():
+                raise ValueError(f"Template bahasa '{language}' tidak sesuai dengan '{default_language}': {sorted(texts.keys() ^ fields.keys())}")
+            for key, template in texts.items():
+                if self._fields(template) != fields[key]:
+                    raise ValueError(f"Placeholder template '{key}' bahasa '{language}' berbeda dari bahasa '{default_language}'")
+        self.default_language = default_language
+        self.intro_cache_size = intro_cache_size
+        self._texts = {language: dict(texts) for language, texts in catalog.items()}
+        self._keyboards = {language: self._build_keyboards(texts) for language, texts in catalog.items()}
+        self._post_chat_rows = {
+            language: (
+                InlineKeyboardButton(texts["button_new_search"], callback_data="post_chat_new_search"),
+                InlineKeyboardButton(texts["button_stop"], callback_data="post_chat_stop"),
+            )
+            for language, texts in catalog.items()
+        }
+        self._intros = OrderedDict()  # user_id -> (objek profil, {bahasa: teks})
+        self.intro_hits = 0
+        self.intro_misses = 0
+
+    @staticmethod
+    def _fields(template):
+        return {field for _, field, _, _ in string.Formatter().parse(template) if field is not None}
+
+    @staticmethod
+    def _build_keyboards(texts):
+        male = InlineKeyboardButton(texts["gender_Pria"], callback_data="Pria")
+        female = InlineKeyboardButton(texts["gender_Wanita"], callback_data="Wanita")
+        return {
+            "start": InlineKeyboardMarkup((
+                (InlineKeyboardButton(texts["button_setup_profile"], callback_data="start_setup_profile"),),
+                (InlineKeyboardButton(texts["button_random_search"], callback_data="start_random_search"),),
+            )),
+            "gender": InlineKeyboardMarkup(((male, female), (InlineKeyboardButton(texts["gender_Rahasia"], callback_data="Rahasia"),))),
+            "partner_gender": InlineKeyboardMarkup(((male, female), (InlineKeyboardButton(texts["button_any"], callback_data="any"),))),
+        }
+
+    def language(self, profile):
+        """Bahasa profil (lengkap atau belum) jika templatenya ada, selain itu bahasa default."""
+        language = profile.get("language") if profile else None
+        return language if language in self._texts else self.default_language
+
+    def text(self, key, language, **fields):
+        template = self._texts[language][key]
+        return template.format(**fields) if fields else template
+
+    def keyboard(self, name, language):
+        return self._keyboards[language][name]
+
+    def post_chat_keyboard(self, reported_id, language):
+        """Keyboard setelah chat berakhir; hanya tombol laporan yang dibuat per panggilan."""
+        report = InlineKeyboardButton(self._texts[language]["button_report"], callback_data=f"report_{reported_id}")
+        return InlineKeyboardMarkup((self._post_chat_rows[language], (report,)))
+
+    def match_found(self, partner_id, partner_profile, language):
+        """Teks "pasangan ditemukan" berisi profil pasangan (None = profil belum lengkap)."""
+        cached = self._intros.get(partner_id)
+        if cached is None or cached[0] is not partner_profile:
+            cached = self._intros[partner_id] = (partner_profile, {})
+            if len(self._intros) > self.intro_cache_size:
+                self._intros.popitem(last=False)
+        else:
+            self._intros.move_to_end(partner_id)
+        text = cached[1].get(language)
+        if text is not None:
+            self.intro_hits += 1
+            return text
+        self.intro_misses += 1
+        texts = self._texts[language]
+        if partner_profile:
+            gender, age, bio = partner_profile["gender"], partner_profile["age"], partner_profile["bio"]
+        else:
+            gender, age, bio = "Misteri", texts["unknown_age"], texts["unknown_bio"]
+        text = cached[1][language] = texts["match_found"].format(gender=texts.get(f"gender_{gender}", gender), age=age, bio=bio)
+        return text
+
+    def stats(self):
+        return {"intros": len(self._intros), "hits": self.intro_hits, "misses": self.intro_misses}
+
+templates = MessageTemplates()
 
 
 # --- ALUR PROFIL & START ---
@@ -200,22 +2113,12 @@ async def stats_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
 async def start_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Memulai bot dan memeriksa profil."""
     user_id = update.message.from_user.id
-    profile = get_user_profile(user_id)
-    if not profile:
-        keyboard = [
-            [InlineKeyboardButton("Lengkapi Profil 📝", callback_data="start_setup_profile")],
-            [InlineKeyboardButton("Lanjutkan & Cari Acak ➡️", callback_data="start_random_search")]
-        ]
-        await update.message.reply_text(
-            "👋 Selamat datang! Agar pengalaman chat lebih baik, kamu bisa melengkapi profil singkat. "
-            "Atau, kamu bisa langsung mencari pasangan secara acak.",
-            reply_markup=InlineKeyboardMarkup(keyboard)
-        )
+    row = await aload_profile(user_id)
+    language = templates.language(row)
+    if not complete_profile(row):
+        await send_reply(update, templates.text("welcome_new", language), reply_markup=templates.keyboard("start", language))
     else:
-        await update.message.reply_text(
-            "Selamat datang kembali! Gunakan /search untuk mencari pasangan acak.\n\n"
-            "Untuk mencari berdasarkan gender, upgrade akunmu ke Pro lalu gunakan /find_by_gender."
-        )
+        await send_reply(update, templates.text("welcome_back", language))
 
 async def start_choice_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Menangani pilihan pengguna dari pesan /start."""
@@ -226,20 +2129,16 @@ async def start_choice_callback(update: Update, context: ContextTypes.DEFAULT_TY
         # Memanggil fungsi awal dari ConversationHandler
         await profile_command(update, context)
     elif query.data == 'start_random_search':
-        await query.edit_message_text("Baik, mari kita cari pasangan secara acak untukmu!")
+        await edit_reply(query, "Baik, mari kita cari pasangan secara acak untukmu!")
         await add_to_queue(update, context, preference="any")
 
 @auto_update_profile
 async def profile_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
     """Memulai alur pengaturan profil."""
     # update bisa berupa message atau callback_query
-    chat_id = update.effective_chat.id
-    await context.bot.send_message(chat_id=chat_id, text="Mari kita atur profilmu! Profil ini akan ditampilkan ke pasangan chatmu.")
-    keyboard = [
-        [InlineKeyboardButton("Pria", callback_data="Pria"), InlineKeyboardButton("Wanita", callback_data="Wanita")],
-        [InlineKeyboardButton("Rahasia", callback_data="Rahasia")]
-    ]
-    await context.bot.send_message(chat_id=chat_id, text="Pilih gendermu:", reply_markup=InlineKeyboardMarkup(keyboard))
+    language = templates.language(await aload_profile(update.effective_user.id))
+    await send_reply(update, templates.text("profile_intro", language))
+    await send_reply(update, templates.text("choose_gender", language), reply_markup=templates.keyboard("gender", language))
     return GENDER
 
 async def gender_received(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
@@ -247,8 +2146,8 @@ async def gender_received(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
     query = update.callback_query
     await query.answer()
     context.user_data['gender'] = query.data
-    await query.edit_message_text(text=f"Gender dipilih: {query.data}")
-    await context.bot.send_message(chat_id=query.from_user.id, text="Sekarang, berapa usiamu? (Kirim angka saja)")
+    await edit_reply(query, f"Gender dipilih: {query.data}")
+    await send_reply(update, "Sekarang, berapa usiamu? (Kirim angka saja)")
     return AGE
 
 async def age_received(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
@@ -256,23 +2155,24 @@ async def age_received(update: Update, context: ContextTypes.DEFAULT_TYPE) -> in
     try:
         age = int(update.message.text)
         if not 13 <= age <= 100:
-            await update.message.reply_text("Umur tidak valid. Masukkan umur antara 13 dan 100.")
+            await send_reply(update, "Umur tidak valid. Masukkan umur antara 13 dan 100.")
             return AGE
         context.user_data['age'] = age
-        await update.message.reply_text("Terakhir, tulis bio singkat tentang dirimu (maksimal 150 karakter).")
+        await send_reply(update, "Terakhir, tulis bio singkat tentang dirimu (maksimal 150 karakter).")
         return BIO
     except ValueError:
-        await update.message.reply_text("Harap masukkan angka yang valid untuk umur.")
+        await send_reply(update, "Harap masukkan angka yang valid untuk umur.")
         return AGE
 
 async def bio_received(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
     """Menerima input bio, menyimpan profil, dan mengakhiri percakapan."""
     bio = update.message.text
     if len(bio) > 150:
-        await update.message.reply_text("Bio terlalu panjang (maksimal 150 karakter). Coba lagi.")
+        await send_reply(update, "Bio terlalu panjang (maksimal 150 karakter). Coba lagi.")
         return BIO
     context.user_data['bio'] = bio
-    update_user_profile(
+    await run_db(
+        update_user_profile,
         update.effective_user.id,
         update.effective_user.username,
         {
@@ -281,13 +2181,13 @@ async def bio_received(update: Update, context: ContextTypes.DEFAULT_TYPE) -> in
             "bio": context.user_data.get('bio')
         }
     )
-    await update.message.reply_text("Profilmu berhasil disimpan! Sekarang kamu bisa mencari pasangan dengan /search.")
+    await send_reply(update, "Profilmu berhasil disimpan! Sekarang kamu bisa mencari pasangan dengan /search.")
     context.user_data.clear()
     return ConversationHandler.END
 
 async def cancel_profile(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
     """Membatalkan proses pembuatan profil."""
-    await update.message.reply_text("Pengaturan profil dibatalkan.", reply_markup=ReplyKeyboardRemove())
+    await send_reply(update, "Pengaturan profil dibatalkan.", reply_markup=ReplyKeyboardRemove())
     context.user_data.clear()
     return ConversationHandler.END
 
@@ -297,27 +2197,471 @@ def is_user_busy(user_id):
     """Memeriksa apakah pengguna sedang dalam antrian atau chat."""
     global chat_partners, waiting_queue
     if user_id in chat_partners: return True
-    if any(user['user_id'] == user_id for user in waiting_queue): return True
+    if user_id in waiting_queue: return True
     return False
 
+def check_state_consistency():
+    """Memeriksa bahwa chat_partners dan waiting_queue saling sesuai.
+
+    Mengembalikan daftar masalah yang ditemukan (kosong jika konsisten).
+    """
+    problems = list(waiting_queue.check())
+    for user_id, partner_id in chat_partners.items():
+        if user_id == partner_id:
+            problems.append(f"User {user_id} berpasangan dengan dirinya sendiri")
+        elif chat_partners.get(partner_id) != user_id:
+            problems.append(f"Pasangan tidak simetris: {user_id} -> {partner_id}")
+        if user_id in waiting_queue:
+            problems.append(f"User {user_id} sedang chat sekaligus di antrian")
+    return problems
+
+# Waktu tunggu di antrian sampai mendapat pasangan, dan sampai pengguna membatalkan (/stop)
+match_wait_histogram = metrics.histogram("queue_wait_seconds", QUEUE_WAIT_BUCKETS, outcome="matched")
+cancel_wait_histogram = metrics.histogram("queue_wait_seconds", QUEUE_WAIT_BUCKETS, outcome="cancelled")
+expired_wait_histogram = metrics.histogram("queue_wait_seconds", QUEUE_WAIT_BUCKETS, outcome="expired")
+
+class Matchmaker:
+    """Menjalankan pencocokan per putaran (tick) alih-alih sekali per /search.
+
+    Satu putaran membentuk sebanyak mungkin pasangan cocok (maksimal `batch_size`) dalam satu
+    bagian kritis dan satu tulis DB, lalu menjadwalkan notifikasi "pasangan ditemukan" di latar
+    belakang, sehingga putaran berikutnya tidak menunggu batas kirim per chat. Putaran berjalan
+    paling lambat `interval` detik setelah antrian berubah (wake()), atau segera setelah
+    `trigger_size` pengguna baru masuk antrian. Tanpa perubahan antrian tidak ada putaran:
+    kecocokan tidak bergantung waktu, jadi antrian yang tadi tidak menghasilkan pasangan
+    juga tidak akan menghasilkannya sampai ada entri baru.
+    """
+
+    def __init__(self, interval=MATCH_TICK_INTERVAL, batch_size=MATCH_BATCH_SIZE, trigger_size=MATCH_TRIGGER_SIZE):
+        self.interval = interval
+        self.batch_size = batch_size
+        self.trigger_size = trigger_size
+        self._bot = None
+        self._task = None
+        self._wakeup = None
+        self._arrivals = 0  # pengguna yang masuk antrian sejak putaran terakhir
+        self._pending = False  # antrian berubah sejak putaran terakhir
+        self._idle = False  # loop sedang menunggu perubahan tanpa batas waktu
+        self._announcing = set()  # task notifikasi "pasangan ditemukan" yang belum selesai
+        self._stopping = False
+        self.ticks = 0
+        self.pairs = 0
+        self.largest_batch = 0
+
+    def notify(self, bot):
+        """Dipanggil setiap ada pengguna masuk antrian."""
+        self._bot = bot
+        if self._task is None or self._task.done():
+            self._wakeup = asyncio.Event()
+            self._task = asyncio.get_running_loop().create_task(self._run())
+        self.wake(arrivals=1)
+
+    def wake(self, arrivals=0):
+        """Menandai antrian berubah sehingga putaran berikutnya mungkin membentuk pasangan."""
+        self._pending = True
+        self._arrivals += arrivals
+        if self._wakeup is not None and (self._idle or self._arrivals >= self.trigger_size):
+            self._wakeup.set()
+
+    async def stop(self, timeout=SHUTDOWN_GRACE):
+        """Menghentikan putaran; putaran yang sedang berjalan dan notifikasinya diselesaikan dulu."""
+        if self._task is not None:
+            self._stopping = True
+            self._wakeup.set()
+            try:
+                await asyncio.wait_for(self._task, timeout)
+            except asyncio.TimeoutError:
+                logger.warning("Putaran pencocokan tidak selesai saat berhenti; dibatalkan.")
+            self._task = None
+            self._stopping = False
+        if self._announcing:
+            _, pending = await asyncio.wait(self._announcing, timeout=timeout)
+            if pending:
+                logger.warning(f"{len(pending)} notifikasi 'pasangan ditemukan' tidak selesai saat berhenti.")
+
+    def stats(self):
+        return {"ticks": self.ticks, "pairs": self.pairs, "largest_batch": self.largest_batch}
+
+    async def _announce(self, matches):
+        results = await asyncio.gather(
+            *(announce_match(self._bot, user1["user_id"], user2["user_id"]) for user1, user2 in matches), return_exceptions=True
+        )
+        for (user1, user2), result in zip(matches, results):
+            if isinstance(result, Exception):
+                logger.error(f"Gagal menyiapkan notifikasi pasangan {user1['user_id']}-{user2['user_id']}: {result}")
+
+    async def _drop_blocked(self):
+        """Mengeluarkan pengguna yang diblokir otomatis dari antrian sebelum pencocokan."""
+        async with session_lock:
+            dropped = [user_id for user_id in report_pipeline.blocked_users() if waiting_queue.cancel(user_id)]
+            cancelled = [db_worker.submit(persist_cancel, user_id) for user_id in dropped]
+        for user_id, result in zip(dropped, await asyncio.gather(*cancelled, return_exceptions=True)):
+            if isinstance(result, Exception):
+                logger.error(f"Gagal menghapus entri antrian {user_id} yang diblokir: {result}")
+
+    async def _unmatch(self, matches):
+        """Mengembalikan pasangan yang gagal disimpan ke antrian, sesuai isi DB yang tidak berubah."""
+        stale = []
+        async with session_lock:
+            for user1, user2 in matches:
+                user1_id, user2_id = user1["user_id"], user2["user_id"]
+                if chat_partners.get(user1_id) == user2_id and chat_partners.get(user2_id) == user1_id:
+                    del chat_partners[user1_id], chat_partners[user2_id]
+                    waiting_queue.append(user1)
+                    waiting_queue.append(user2)
+                else:
+                    # Sesi sudah diakhiri selama menunggu DB: baris antrian lamanya tidak berlaku lagi
+                    stale += [user_id for user_id in (user1_id, user2_id) if not is_user_busy(user_id)]
+            cancelled = [db_worker.submit(persist_cancel, user_id) for user_id in stale]
+        self.wake()
+        for user_id, result in zip(stale, await asyncio.gather(*cancelled, return_exceptions=True)):
+            if isinstance(result, Exception):
+                logger.error(f"Gagal menghapus entri antrian lama {user_id}: {result}")
+
+    async def _run(self):
+        while True:
+            if not self._pending:
+                self._idle = True
+                await self._wakeup.wait()
+                self._idle = False
+                self._wakeup.clear()
+            # Jendela pengumpulan: pengguna lain yang masuk dalam `interval` ikut putaran yang sama
+            if not self._stopping and self._arrivals < self.trigger_size:
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), self.interval)
+                except asyncio.TimeoutError:
+                    pass
+            if self._stopping:
+                return
+            self._wakeup.clear()
+            self._arrivals = 0
+            self._pending = False
+            try:
+                # Batch penuh berarti mungkin masih ada pasangan cocok: putaran berikutnya tetap dijalankan
+                if await self.tick() >= self.batch_size:
+                    self._pending = True
+            except Exception as e:
+                logger.error(f"Putaran pencocokan gagal: {e}")
+
+    async def tick(self):
+        """Satu putaran pencocokan; mengembalikan jumlah pasangan yang dibentuk."""
+        start = time.perf_counter()
+        if shared_sessions:
+            await shared_sessions.refresh()
+        if len(waiting_queue) < 2: return 0
+
+        if shared_sessions:
+            # Transaksi IMMEDIATE menjamin tidak ada user yang dipasangkan dua kali oleh worker berbeda
+            matches = await run_db(shared_pop_matches, self.batch_size, report_pipeline.blocked_users())
+            await shared_sessions.refresh()
+        else:
+            await self._drop_blocked()
+            async with session_lock:
+                # Pencocokan lewat bucket (gender, preferensi, Pro): tiap pasangan waktu konstan
+                matches = []
+                now = time.time()
+                while len(matches) < self.batch_size and (matched_users := waiting_queue.pop_match(now)):
+                    matches.append(matched_users)
+                if not matches: return 0
+                for user1_data, user2_data in matches:
+                    user1_id, user2_id = user1_data["user_id"], user2_data["user_id"]
+                    chat_partners.update({user1_id: user2_id, user2_id: user1_id})
+                persisted = db_worker.submit(persist_matches, [(user1["user_id"], user2["user_id"]) for user1, user2 in matches])
+            try:
+                await persisted
+            except Exception:
+                await self._unmatch(matches)
+                raise
+        metrics.observe("match_tick_seconds", time.perf_counter() - start)
+        if not matches: return 0
+
+        now = time.time()
+        for pair in matches:
+            for entry in pair:
+                match_wait_histogram.observe(now - entry["enqueued_at"])
+                # Tenggat menganggur sesi chat dihitung sejak dipasangkan, bukan sejak masuk antrian
+                idle_reaper.touch(entry["user_id"], now)
+        self.ticks += 1
+        self.pairs += len(matches)
+        self.largest_batch = max(self.largest_batch, len(matches))
+        # Pengiriman dibatasi per chat; putaran tidak menunggunya agar pasangan baru tetap terbentuk
+        task = asyncio.get_running_loop().create_task(self._announce(matches))
+        self._announcing.add(task)
+        task.add_done_callback(self._announcing.discard)
+        return len(matches)
+
+matchmaker = Matchmaker()
+
+class IdleReaper:
+    """Mengakhiri sesi chat yang menganggur dan mengeluarkan entri antrian yang basi.
+
+    Aktivitas terakhir tiap pengguna dicatat oleh touch() (handle_message, add_to_queue, dan
+    saat dipasangkan). Tenggat disimpan di heap (tenggat, user_id) sehingga setiap putaran
+    hanya melihat entri yang sudah lewat, bukan memindai seluruh state. Tenggat di heap tidak
+    pernah lebih lambat dari tenggat sebenarnya; saat diambil, tenggat dihitung ulang dari
+    state terkini dan entri dijadwalkan ulang jika masih ada aktivitas baru. Sesi chat
+    dianggap menganggur jika kedua pihak diam selama `chat_timeout`.
+
+    Pada mode sharding hanya antrian yang dibersihkan: aktivitas pasangan tercatat di worker
+    lain, jadi worker ini tidak bisa menilai apakah sebuah sesi benar-benar menganggur.
+    """
+
+    def __init__(self, chat_timeout=CHAT_IDLE_TIMEOUT, queue_timeout=QUEUE_IDLE_TIMEOUT, interval=REAPER_INTERVAL, batch_size=REAPER_BATCH):
+        self.chat_timeout = chat_timeout
+        self.queue_timeout = queue_timeout
+        self.interval = interval
+        self.batch_size = batch_size
+        self.last_active = {}
+        self._scheduled = {}  # user_id -> tenggat entrinya yang berlaku di heap
+        self._heap = []
+        self._min_timeout = min((timeout for timeout in (chat_timeout, queue_timeout) if timeout is not None), default=None)
+        self._task = None
+        self._wakeup = None
+        self._stopping = False
+        self.rounds = 0
+        self.rescheduled = 0
+
+    def touch(self, user_id, now=None):
+        """Mencatat aktivitas pengguna; O(1) kecuali tenggatnya perlu dimajukan."""
+        if self._min_timeout is None: return
+        now = time.time() if now is None else now
+        self.last_active[user_id] = now
+        self._schedule(user_id, now + self._min_timeout)
+
+    def _schedule(self, user_id, deadline):
+        scheduled = self._scheduled.get(user_id)
+        if scheduled is None or deadline < scheduled:
+            # Entri lama (jika ada) menjadi basi dan dilewati saat diambil dari heap
+            self._scheduled[user_id] = deadline
+            heapq.heappush(self._heap, (deadline, user_id))
+
+    def _due(self, user_id):
+        """(jenis, tenggat sebenarnya) menurut state terkini; tenggat None jika tidak perlu dipantau."""
+        last = self.last_active.get(user_id, 0.0)
+        partner_id = chat_partners.get(user_id)
+        if partner_id is not None:
+            if self.chat_timeout is None or shared_sessions: return "chat", None
+            return "chat", max(last, self.last_active.get(partner_id, 0.0)) + self.chat_timeout
+        if user_id in waiting_queue and self.queue_timeout is not None:
+            return "queue", last + self.queue_timeout
+        return None, None
+
+    def expired(self, now=None):
+        """Mengambil maksimal batch_size pengguna yang tenggatnya lewat: daftar (jenis, user_id)."""
+        now = time.time() if now is None else now
+        heap = self._heap
+        result = []
+        while heap and heap[0][0] <= now and len(result) < self.batch_size:
+            deadline, user_id = heapq.heappop(heap)
+            if self._scheduled.get(user_id) != deadline:
+                continue  # entri basi
+            kind, due = self._due(user_id)
+            if due is not None and due > now:
+                self.rescheduled += 1
+                self._scheduled[user_id] = due
+                heapq.heappush(heap, (due, user_id))
+                continue
+            del self._scheduled[user_id]
+            self.last_active.pop(user_id, None)
+            if due is not None:
+                result.append((kind, user_id))
+        return result
+
+    def start(self, bot):
+        if self._min_timeout is not None and (self._task is None or self._task.done()):
+            self._wakeup = asyncio.Event()
+            self._task = asyncio.get_running_loop().create_task(self._run(bot))
+
+    async def stop(self, timeout=SHUTDOWN_GRACE):
+        """Menghentikan pembersihan; putaran yang sedang berjalan diselesaikan dulu (notifikasinya sudah di outbox)."""
+        if self._task is not None:
+            self._stopping = True
+            self._wakeup.set()
+            try:
+                await asyncio.wait_for(self._task, timeout)
+            except asyncio.TimeoutError:
+                logger.warning("Pembersihan sesi menganggur tidak selesai saat berhenti; dibatalkan.")
+            self._task = None
+            self._stopping = False
+
+    def stats(self):
+        return {
+            "tracked": len(self.last_active), "heap": len(self._heap), "rounds": self.rounds, "rescheduled": self.rescheduled,
+            "chat": metrics.total("reaper_reclaimed_total", kind="chat"), "queue": metrics.total("reaper_reclaimed_total", kind="queue"),
+        }
+
+    async def _run(self, bot):
+        while True:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), self.interval)
+            except asyncio.TimeoutError:
+                pass
+            if self._stopping:
+                return
+            try:
+                # Batch penuh berarti mungkin masih ada yang lewat tenggat: lanjutkan tanpa menunggu,
+                # selama outbox masih punya ruang untuk notifikasi batch berikutnya
+                while (await self.tick(bot) >= self.batch_size and not self._stopping
+                       and outbox.pending + 2 * self.batch_size <= outbox.limit):
+                    pass
+            except Exception as e:
+                logger.error(f"Pembersihan sesi menganggur gagal: {e}")
+
+    async def tick(self, bot, now=None):
+        """Satu putaran pembersihan; mengembalikan jumlah entri heap yang lewat tenggat."""
+        start = time.perf_counter()
+        ended, cancelled, entries = [], [], []
+        if shared_sessions:
+            await shared_sessions.refresh()
+            expired = self.expired(now)
+            for _, user_id in expired:
+                enqueued_at = await run_db(shared_cancel, user_id)
+                if enqueued_at is not None:
+                    cancelled.append((user_id, enqueued_at))
+            await shared_sessions.refresh()
+        else:
+            # Tenggat dihitung ulang di dalam lock: pesan yang datang bersamaan tidak bisa terlewat
+            async with session_lock:
+                expired = self.expired(now)
+                if not expired: return 0
+                for kind, user_id in expired:
+                    if kind == "chat":
+                        partner_id = chat_partners.pop(user_id, None)
+                        if partner_id is None: continue  # sudah diakhiri bersama pasangannya di batch ini
+                        chat_partners.pop(partner_id, None)
+                        ended.append((user_id, partner_id))
+                    elif (entry := waiting_queue.cancel(user_id)):
+                        cancelled.append((user_id, entry["enqueued_at"]))
+                        entries.append(entry)
+                persisted = db_worker.submit(persist_reaped, ended, [user_id for user_id, _ in cancelled])
+            try:
+                await persisted
+            except Exception:
+                await self._restore(ended, entries)
+                raise
+        if not expired: return 0
+
+        self.rounds += 1
+        metrics.inc("reaper_reclaimed_total", len(ended), kind="chat")
+        metrics.inc("reaper_reclaimed_total", len(cancelled), kind="queue")
+        metrics.observe("reaper_tick_seconds", time.perf_counter() - start)
+        wall_now = time.time()
+        for _, enqueued_at in cancelled:
+            expired_wait_histogram.observe(wall_now - enqueued_at)
+        if ended or cancelled:
+            logger.info(f"Sesi menganggur dibersihkan: {len(ended)} pasangan, {len(cancelled)} antrian.")
+
+        notices = []
+        if ended:
+            text = f"⌛ Percakapan diakhiri karena tidak ada pesan selama {self.chat_timeout / 60:.0f} menit. Ketik /search untuk mencari lagi."
+            notices += [(user_id, text) for pair in ended for user_id in pair]
+        if cancelled:
+            text = f"⌛ Pencarian dihentikan karena tidak ada aktivitas selama {self.queue_timeout / 60:.0f} menit. Ketik /search untuk mencari lagi."
+            notices += [(user_id, text) for user_id, _ in cancelled]
+        # Notifikasi cukup dijadwalkan di outbox; putaran tidak menunggu batas kirim per chat
+        for user_id, text in notices:
+            try:
+                future = outbox.submit(bot.send_message, user_id, text=text)
+            except OutboundQueueFull as e:
+                logger.warning(f"Gagal mengabari {user_id} bahwa sesinya diakhiri karena menganggur: {e}")
+                continue
+            future.add_done_callback(lambda future, user_id=user_id: self._notice_sent(user_id, future))
+        return len(expired)
+
+    async def _restore(self, ended, entries):
+        """Memulihkan sesi dan antrian yang gagal dihapus dari DB; dicoba lagi di putaran berikutnya."""
+        retry_at = time.time()
+        async with session_lock:
+            for user_id, partner_id in ended:
+                if not is_user_busy(user_id) and not is_user_busy(partner_id):
+                    chat_partners.update({user_id: partner_id, partner_id: user_id})
+                    self._schedule(user_id, retry_at)
+            for entry in entries:
+                if not is_user_busy(entry["user_id"]):
+                    waiting_queue.append(entry)
+                    self._schedule(entry["user_id"], retry_at)
+
+    @staticmethod
+    def _notice_sent(user_id, future):
+        if future.cancelled():
+            return
+        error = future.exception()
+        # Forbidden berarti pengguna sudah pergi; sesinya memang sudah diakhiri
+        if error is not None and not isinstance(error, Forbidden):
+            logger.warning(f"Gagal mengabari {user_id} bahwa sesinya diakhiri karena menganggur: {error}")
+
+idle_reaper = IdleReaper()
+
+async def announce_match(bot, user1_id, user2_id):
+    """Mengirim profil masing-masing ke kedua pengguna yang baru dipasangkan."""
+    row1 = await aload_profile(user1_id)
+    row2 = await aload_profile(user2_id)
+    # Teks perkenalan diambil dari cache template selama profil pasangan tidak berubah
+    text1 = templates.match_found(user2_id, complete_profile(row2), templates.language(row1))
+    text2 = templates.match_found(user1_id, complete_profile(row1), templates.language(row2))
+
+    try:
+        await asyncio.gather(
+            outbox.send(bot.send_message, user1_id, text=text1),
+            outbox.send(bot.send_message, user2_id, text=text2),
+        )
+    except Exception as e:
+        logger.error(f"Gagal mengirim pesan 'pasangan ditemukan' ke {user1_id} atau {user2_id}: {e}")
+
 async def add_to_queue(update: Update, context: ContextTypes.DEFAULT_TYPE, preference: str):
     """Menambahkan pengguna ke antrian pencarian."""
-    global waiting_queue, user_states
     user_id = update.effective_user.id
-
-    if is_user_busy(user_id):
-        await context.bot.send_message(chat_id=user_id, text="Kamu sudah dalam percakapan atau sedang mencari. Gunakan /stop untuk berhenti.")
+    if report_pipeline.is_blocked(user_id):
+        await send_reply(update, "🚫 Untuk sementara kamu tidak bisa mencari pasangan karena menerima terlalu banyak laporan.")
         return
-
-    profile = get_user_profile(user_id)
+    idle_reaper.touch(user_id)
+    # Profil diambil sebelum bagian kritis agar lock tidak ditahan selama menunggu DB
+    profile = await aget_user_profile(user_id)
     # Jika profil tidak lengkap, gunakan nilai default agar tidak error
     user_gender = profile['gender'] if profile else 'Misteri'
-
-    waiting_queue.append({"user_id": user_id, "gender": user_gender, "preference": preference})
-    user_states[user_id] = "waiting"
-    save_chat_data()
-    await context.bot.send_message(chat_id=user_id, text="🔎 Mencari pasangan... Mohon tunggu.")
-    await try_to_match_users(context)
+    is_pro = bool(profile and profile.get("is_pro"))
+
+    # Blokir bisa jatuh selama profil diambil; cancel_search saat itu belum menemukan entri ini
+    if shared_sessions:
+        entry = {"user_id": user_id, "gender": user_gender, "preference": preference, "enqueued_at": time.time(), "pro": is_pro}
+        blocked = report_pipeline.is_blocked(user_id)
+        busy = blocked or not await run_db(shared_enqueue, entry)
+        await shared_sessions.refresh()
+    else:
+        async with session_lock:
+            blocked = report_pipeline.is_blocked(user_id)
+            busy = blocked or is_user_busy(user_id)
+            if not busy:
+                entry = {"user_id": user_id, "gender": user_gender, "preference": preference, "enqueued_at": time.time(), "pro": is_pro}
+                record = waiting_queue.append(entry)
+                persisted = db_worker.submit(persist_enqueue, entry)
+        if not busy:
+            try:
+                await persisted
+            except Exception as e:
+                logger.error(f"Gagal menyimpan entri antrian {user_id}: {e}")
+                async with session_lock:
+                    # Entri yang sudah dipasangkan atau dibatalkan selama menunggu DB dibiarkan
+                    queued = waiting_queue.get(user_id) is record
+                    if queued:
+                        waiting_queue.remove(record)
+                if queued:
+                    await send_reply(update, "⚠️ Gagal memulai pencarian. Coba /search lagi sebentar lagi.")
+                return
+
+    if blocked:
+        await send_reply(update, "🚫 Untuk sementara kamu tidak bisa mencari pasangan karena menerima terlalu banyak laporan.")
+        return
+    if busy:
+        await send_reply(update, "Kamu sudah dalam percakapan atau sedang mencari. Gunakan /stop untuk berhenti.")
+        return
+    # Pencocokan dilakukan oleh putaran Matchmaker berikutnya; dibangunkan sebelum pemberitahuan
+    # dikirim, agar pengiriman yang tertahan batas kirim atau gagal tidak menunda pencarian
+    matchmaker.notify(context.bot)
+    try:
+        await send_reply(update, "🔎 Mencari pasangan... Mohon tunggu.")
+    except Exception as e:
+        logger.warning(f"Gagal mengirim pemberitahuan pencarian ke {user_id}: {e}")
 
 @auto_update_profile
 async def search_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -328,10 +2672,10 @@ async def search_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
 async def find_by_gender_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
     """Memulai pencarian berdasarkan gender (fitur Pro)."""
     user_id = update.message.from_user.id
-    profile = get_user_profile(user_id)
+    profile = await aget_user_profile(user_id)
 
     if not profile:
-        await update.message.reply_text("Untuk menggunakan fitur ini, kamu harus melengkapi profilmu terlebih dahulu. Silakan gunakan /profile.")
+        await send_reply(update, "Untuk menggunakan fitur ini, kamu harus melengkapi profilmu terlebih dahulu. Silakan gunakan /profile.")
         return ConversationHandler.END
 
     if not profile.get("is_pro"):
@@ -340,14 +2684,11 @@ async def find_by_gender_command(update: Update, context: ContextTypes.DEFAULT_T
             owner_username = f"@{owner.username}" if owner.username else "Owner"
         except Exception:
             owner_username = "Owner"
-        await update.message.reply_text(f"Fitur ini hanya untuk pengguna Pro.\n\nUntuk upgrade, silakan hubungi {owner_username} untuk info pembayaran.")
+        await send_reply(update, f"Fitur ini hanya untuk pengguna Pro.\n\nUntuk upgrade, silakan hubungi {owner_username} untuk info pembayaran.")
         return ConversationHandler.END
 
-    keyboard = [
-        [InlineKeyboardButton("Pria", callback_data="Pria"), InlineKeyboardButton("Wanita", callback_data="Wanita")],
-        [InlineKeyboardButton("Apapun", callback_data="any")]
-    ]
-    await update.message.reply_text("Pilih gender pasangan yang ingin kamu cari:", reply_markup=InlineKeyboardMarkup(keyboard))
+    language = templates.language(profile)
+    await send_reply(update, templates.text("choose_partner_gender", language), reply_markup=templates.keyboard("partner_gender", language))
     return FIND_GENDER_PREF
 
 async def find_gender_received(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
@@ -355,69 +2696,31 @@ async def find_gender_received(update: Update, context: ContextTypes.DEFAULT_TYP
     query = update.callback_query
     await query.answer()
     preference = query.data
-    await query.edit_message_text(f"Baik, mencari pasangan dengan gender: {preference}...")
-    await add_to_queue(query, context, preference=preference)
+    await edit_reply(query, f"Baik, mencari pasangan dengan gender: {preference}...")
+    await add_to_queue(update, context, preference=preference)
     return ConversationHandler.END
 
-async def try_to_match_users(context: ContextTypes.DEFAULT_TYPE):
-    """Mencoba mencocokkan pengguna di dalam antrian."""
-    global waiting_queue, chat_partners, user_states
-    if len(waiting_queue) < 2: return
-
-    matched_users = []
-    # Salin antrian agar aman saat melakukan iterasi dan penghapusan
-    temp_queue = list(waiting_queue)
-
-    for i in range(len(temp_queue)):
-        for j in range(i + 1, len(temp_queue)):
-            user_a, user_b = temp_queue[i], temp_queue[j]
-
-            # Kondisi pencocokan: preferensi A cocok dengan gender B, DAN preferensi B cocok dengan gender A
-            a_likes_b = user_a["preference"] == "any" or user_a["preference"] == user_b["gender"]
-            b_likes_a = user_b["preference"] == "any" or user_b["preference"] == user_a["gender"]
-
-            if a_likes_b and b_likes_a:
-                matched_users.extend([user_a, user_b])
-                break
-        if matched_users: break
-
-    if not matched_users: return
-
-    user1_data, user2_data = matched_users[0], matched_users[1]
-
-    # Hapus dari antrian utama
-    waiting_queue.remove(user1_data)
-    waiting_queue.remove(user2_data)
-
-    user1_id, user2_id = user1_data["user_id"], user2_data["user_id"]
-    chat_partners.update({user1_id: user2_id, user2_id: user1_id})
-    user_states.update({user1_id: "chatting", user2_id: "chatting"})
-    save_chat_data()
-
-    profile1 = get_user_profile(user1_id) or {"gender": "Misteri", "age": "??", "bio": "-"}
-    profile2 = get_user_profile(user2_id) or {"gender": "Misteri", "age": "??", "bio": "-"}
-
-    profile1_msg = f"Gender: {profile1['gender']}\nUmur: {profile1['age']}\nBio: {profile1['bio']}"
-    profile2_msg = f"Gender: {profile2['gender']}\nUmur: {profile2['age']}\nBio: {profile2['bio']}"
-
-    try:
-        await context.bot.send_message(user1_id, f"✅ Pasangan ditemukan!\n\nProfil pasanganmu:\n{profile2_msg}\n\nKetik /stop untuk mengakhiri, /next untuk cari lagi.")
-        await context.bot.send_message(user2_id, f"✅ Pasangan ditemukan!\n\nProfil pasanganmu:\n{profile1_msg}\n\nKetik /stop untuk mengakhiri, /next untuk cari lagi.")
-    except Exception as e:
-        logger.error(f"Gagal mengirim pesan 'pasangan ditemukan' ke {user1_id} atau {user2_id}: {e}")
-
 async def end_chat_session(initiator_id: int) -> int | None:
     """Mengakhiri sesi chat, membersihkan state, dan mengembalikan ID partner."""
-    global chat_partners, user_states
-    if initiator_id not in chat_partners: return None
+    if shared_sessions:
+        partner_id = await run_db(shared_end, initiator_id)
+        await shared_sessions.refresh()
+        return partner_id
+    async with session_lock:
+        if initiator_id not in chat_partners: return None
 
-    partner_id = chat_partners.pop(initiator_id)
-    chat_partners.pop(partner_id, None) # Hapus juga entri partner
+        partner_id = chat_partners.pop(initiator_id)
+        chat_partners.pop(partner_id, None) # Hapus juga entri partner
 
-    user_states.pop(initiator_id, None)
-    user_states.pop(partner_id, None)
-
-    save_chat_data()
+        persisted = db_worker.submit(persist_end, initiator_id, partner_id)
+    try:
+        await persisted
+    except Exception:
+        # Baris pasangan masih ada di DB: pasangan dipulihkan di memori agar keduanya tetap sesuai
+        async with session_lock:
+            if not is_user_busy(initiator_id) and not is_user_busy(partner_id):
+                chat_partners.update({initiator_id: partner_id, partner_id: initiator_id})
+        raise
     return partner_id
 
 async def post_chat_action_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -425,10 +2728,173 @@ async def post_chat_action_callback(update: Update, context: ContextTypes.DEFAUL
     query = update.callback_query
     await query.answer()
     if query.data == 'post_chat_new_search':
-        await query.edit_message_text("Baik, mencari pasangan baru untukmu...")
-        await add_to_queue(query, context, preference="any")
+        await edit_reply(query, "Baik, mencari pasangan baru untukmu...")
+        await add_to_queue(update, context, preference="any")
     elif query.data == 'post_chat_stop':
-        await query.edit_message_text("Sesi dihentikan. Ketik /search untuk memulai lagi kapan pun.")
+        await edit_reply(query, "Sesi dihentikan. Ketik /search untuk memulai lagi kapan pun.")
+
+class ReportPipeline:
+    """Menampung laporan di memori dan memblokir otomatis pengguna yang sering dilaporkan.
+
+    Laporan ditulis ke DB per batch oleh report_flush_loop(). Untuk setiap pengguna yang
+    dilaporkan dicatat pelapor dalam jendela geser `window`; begitu jumlah pelapor berbeda
+    mencapai `threshold`, pengguna masuk blocklist selama `block_duration` dan ditolak oleh
+    add_to_queue. Laporan berulang dari pelapor yang sama tidak menambah hitungan.
+    """
+
+    def __init__(self, threshold=REPORT_BLOCK_THRESHOLD, window=REPORT_BLOCK_WINDOW, block_duration=REPORT_BLOCK_DURATION):
+        self.threshold = threshold
+        self.window = window.total_seconds()
+        self.block_duration = block_duration.total_seconds()
+        self._pending = []  # (reporter_id, reported_id, timestamp) yang belum ditulis ke DB
+        self._recent = {}  # reported_id -> {reporter_id: waktu laporan terakhir} dalam jendela
+        self._digest = {}  # reported_id -> jumlah laporan sejak ringkasan terakhir
+        self._newly_blocked = []  # user_id yang diblokir sejak ringkasan terakhir
+        self.blocked = {}  # user_id -> time.time() saat blokir berakhir
+        self.received = 0
+
+    def is_blocked(self, user_id):
+        until = self.blocked.get(user_id)
+        if until is None:
+            return False
+        if until > time.time():
+            return True
+        del self.blocked[user_id]
+        return False
+
+    def blocked_users(self):
+        """Pengguna yang saat ini diblokir (blokir yang sudah berakhir dibuang sekalian)."""
+        return [user_id for user_id in list(self.blocked) if self.is_blocked(user_id)]
+
+    def submit(self, reporter_id, reported_id, now=None):
+        """Mencatat satu laporan; True jika pengguna yang dilaporkan baru saja diblokir."""
+        now = time.time() if now is None else now
+        self._pending.append((reporter_id, reported_id, datetime.fromtimestamp(now).strftime(REPORT_TIME_FORMAT)))
+        self._digest[reported_id] = self._digest.get(reported_id, 0) + 1
+        self.received += 1
+        metrics.inc("reports_total")
+        return self._count(reporter_id, reported_id, now)
+
+    def _count(self, reporter_id, reported_id, now):
+        if self.is_blocked(reported_id):
+            return False
+        reporters = self._recent.setdefault(reported_id, {})
+        reporters[reporter_id] = now
+        cutoff = now - self.window
+        for reporter, reported_at in list(reporters.items()):
+            if reported_at < cutoff:
+                del reporters[reporter]
+        if len(reporters) < self.threshold:
+            return False
+        del self._recent[reported_id]
+        self.blocked[reported_id] = now + self.block_duration
+        self._newly_blocked.append(reported_id)
+        metrics.inc("report_blocks_total")
+        return True
+
+    def load(self, rows):
+        """Membangun ulang jendela dan blocklist dari laporan terbaru di DB saat start."""
+        for reporter_id, reported_id, timestamp in rows:
+            self._count(reporter_id, reported_id, datetime.strptime(timestamp, REPORT_TIME_FORMAT).timestamp())
+        self._newly_blocked.clear()
+
+    @property
+    def pending(self):
+        return len(self._pending)
+
+    def restore_pending(self, rows):
+        """Mengembalikan batch dari take_pending() yang gagal ditulis, di depan laporan yang lebih baru."""
+        self._pending[:0] = rows
+
+    def take_pending(self):
+        """Mengambil dan mengosongkan laporan yang belum ditulis, sekaligus membuang jendela kedaluwarsa."""
+        pending, self._pending = self._pending, []
+        cutoff = time.time() - self.window
+        for reported_id in [user_id for user_id, reporters in self._recent.items() if max(reporters.values()) < cutoff]:
+            del self._recent[reported_id]
+        return pending
+
+    def take_digest(self):
+        """Mengambil dan mengosongkan (jumlah laporan per pengguna, pengguna baru diblokir)."""
+        digest, blocked = self._digest, self._newly_blocked
+        self._digest, self._newly_blocked = {}, []
+        return digest, blocked
+
+report_pipeline = ReportPipeline()
+
+def recent_reports(since):
+    """Laporan sejak `since` berurutan waktu, untuk ReportPipeline.load()."""
+    return db_query(
+        "SELECT reporter_id, reported_id, timestamp FROM reports WHERE timestamp >= ? ORDER BY timestamp",
+        (since.strftime(REPORT_TIME_FORMAT),),
+    )
+
+def write_reports(rows):
+    """Menulis satu batch laporan dalam satu transaksi."""
+    with db_transaction():
+        get_db_connection().executemany("INSERT INTO reports (reporter_id, reported_id, timestamp) VALUES (?, ?, ?)", rows)
+
+async def flush_reports():
+    """Menulis semua laporan yang masih tertunda."""
+    rows = report_pipeline.take_pending()
+    if rows:
+        try:
+            await run_db(write_reports, rows)
+        except Exception:
+            # Batch dicoba lagi di flush berikutnya alih-alih hilang
+            report_pipeline.restore_pending(rows)
+            raise
+
+async def flush_with_retry(flush, what):
+    """Flush terakhir saat berhenti: diulang seperti BEGIN yang dikunci proses lain, lalu menyerah dengan log."""
+    for attempt in range(1, DB_BUSY_RETRIES + 1):
+        try:
+            await flush()
+            return
+        except Exception as e:
+            logger.error(f"Gagal menyimpan {what} saat berhenti (percobaan {attempt}/{DB_BUSY_RETRIES}): {e}")
+            if attempt < DB_BUSY_RETRIES:
+                await asyncio.sleep(DB_BUSY_BACKOFF * attempt)
+
+async def send_report_digest(bot, top=10):
+    """Mengirim ringkasan laporan sejak ringkasan terakhir ke Owner (tidak dikirim jika kosong)."""
+    digest, blocked = report_pipeline.take_digest()
+    if not digest:
+        return
+
+    async def describe(user_id):
+        profile = await aget_user_profile(user_id)
+        return f"@{profile['username']} ({user_id})" if profile and profile.get('username') else str(user_id)
+
+    ranked = sorted(digest.items(), key=lambda item: (-item[1], item[0]))[:top]
+    # Total dalam REPORT_STATS_WINDOW memperlihatkan apakah lonjakan ini bagian dari pola yang lebih panjang
+    since = datetime.now() - REPORT_STATS_WINDOW
+    window_hours = REPORT_STATS_WINDOW.total_seconds() / 3600
+    lines = [
+        f"• {await describe(user_id)}: {count} laporan"
+        f" ({await run_db(count_reports_against, user_id, since)} dalam {window_hours:.0f} jam)"
+        for user_id, count in ranked
+    ]
+    if len(digest) > top:
+        lines.append(f"• ... dan {len(digest) - top} pengguna lain")
+    text = f"⚠️ Ringkasan Laporan: {sum(digest.values())} laporan untuk {len(digest)} pengguna\n\n" + "\n".join(lines)
+    if blocked:
+        text += "\n\n🚫 Diblokir otomatis dari pencarian: " + ", ".join([await describe(user_id) for user_id in blocked])
+    await outbox.send(bot.send_message, OWNER_ID, text=text)
+
+async def report_flush_loop(bot):
+    """Tugas latar belakang: tulis laporan setiap REPORT_FLUSH_INTERVAL detik, ringkasan tiap REPORT_DIGEST_INTERVAL."""
+    next_digest = time.monotonic() + REPORT_DIGEST_INTERVAL
+    while True:
+        await asyncio.sleep(REPORT_FLUSH_INTERVAL)
+        try:
+            await flush_reports()
+            if time.monotonic() >= next_digest:
+                next_digest = time.monotonic() + REPORT_DIGEST_INTERVAL
+                await send_report_digest(bot)
+                await run_db(trim_partner_history, time.time() - REPORT_PARTNER_WINDOW.total_seconds())
+        except Exception as e:
+            logger.error(f"Gagal memproses batch laporan: {e}")
 
 async def handle_report_button(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Menangani tombol laporan."""
@@ -438,53 +2904,92 @@ async def handle_report_button(update: Update, context: ContextTypes.DEFAULT_TYP
     try:
         reported_id = int(query.data.split('_')[1])
     except (IndexError, ValueError):
-        await query.edit_message_text("Gagal memproses laporan. ID tidak valid.")
+        await edit_reply(query, "Gagal memproses laporan. ID tidak valid.")
+        return
+    # callback_data berasal dari klien: hanya pengguna yang benar-benar pernah dipasangkan
+    # dengan pelapor yang bisa dilaporkan, agar ID sembarang tidak bisa diblokir otomatis
+    since = time.time() - REPORT_PARTNER_WINDOW.total_seconds()
+    if reported_id == reporter_id or not await run_db(were_partners, reporter_id, reported_id, since):
+        logger.warning(f"Laporan dari {reporter_id} terhadap {reported_id} ditolak: bukan pasangan chat-nya.")
+        await edit_reply(query, "Laporan ditolak: kamu hanya bisa melaporkan pasangan chat-mu.")
         return
 
-    timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-    db_query("INSERT INTO reports (reporter_id, reported_id, timestamp) VALUES (?, ?, ?)", (reporter_id, reported_id, timestamp))
-    await query.edit_message_text("Laporan telah dikirim. Terima kasih.")
-
-    # Notifikasi ke Owner
-    reporter_profile = get_user_profile(reporter_id)
-    reported_profile = get_user_profile(reported_id)
-    reporter_info = f"@{reporter_profile['username']} (ID: {reporter_id})" if reporter_profile and reporter_profile.get('username') else f"ID: {reporter_id}"
-    reported_info = f"@{reported_profile['username']} (ID: {reported_id})" if reported_profile and reported_profile.get('username') else f"ID: {reported_id}"
-
-    await context.bot.send_message(
-        chat_id=OWNER_ID,
-        text=f"⚠️ **Laporan Baru Diterima** ⚠️\n\n**Pelapor:** {reporter_info}\n**Melaporkan:** {reported_info}",
-        parse_mode='Markdown'
-    )
+    # Laporan ditulis per batch dan Owner menerima ringkasan berkala (lihat report_flush_loop)
+    if report_pipeline.submit(reporter_id, reported_id):
+        logger.warning(f"User {reported_id} diblokir otomatis dari pencarian: {report_pipeline.threshold} pelapor dalam {REPORT_BLOCK_WINDOW}.")
+        await cancel_search(reported_id)
+    await edit_reply(query, "Laporan telah dikirim. Terima kasih.")
+
+async def cancel_search(user_id: int) -> float | None:
+    """Mengeluarkan pengguna dari antrian; mengembalikan waktu masuk antriannya, atau None."""
+    # Cek jika user ada di antrian (O(1) lewat indeks user_id)
+    if shared_sessions:
+        enqueued_at = await run_db(shared_cancel, user_id)
+        await shared_sessions.refresh()
+        return enqueued_at
+    async with session_lock:
+        queued_entry = waiting_queue.cancel(user_id)
+        if not queued_entry: return None
+        persisted = db_worker.submit(persist_cancel, user_id)
+    await persisted
+    return queued_entry["enqueued_at"]
+
+async def handle_departed_user(bot, user_id: int):
+    """Pengguna yang memblokir bot dianggap pergi: sesinya diakhiri dan pasangannya dikabari."""
+    partner_id = await end_chat_session(user_id)
+    if partner_id is None:
+        await cancel_search(user_id)
+        return
+    try:
+        await outbox.send(bot.send_message, partner_id, text="❌ Pasanganmu telah meninggalkan bot. Ketik /search untuk mencari lagi.")
+    except Exception as e:
+        logger.warning(f"Gagal mengabari {partner_id} bahwa pasangannya pergi: {e}")
+
+async def notify_recovered_users(bot, broken_users, crashed):
+    """Mengabari pengguna setelah pemulihan, per batch agar antrian kirim tidak penuh.
+
+    Pengguna yang sesinya diputus saat validasi selalu dikabari; jika bot sebelumnya crash,
+    pengguna yang sesi atau antriannya dipulihkan juga dikabari. Notifikasi yang ditolak
+    dengan Forbidden berarti pengguna pergi selama bot mati (lihat handle_departed_user).
+    """
+    notices = [(user_id, "⚠️ Percakapanmu terputus saat bot dimulai ulang. Ketik /search untuk mencari lagi.") for user_id in broken_users]
+    if crashed:
+        notices += [(user_id, "♻️ Bot sempat terhenti. Kamu masih terhubung dengan pasanganmu; ketik /stop untuk mengakhiri.") for user_id in list(chat_partners)]
+        notices += [(entry["user_id"], "♻️ Bot sempat terhenti. Kamu masih dalam antrian pencarian.") for entry in list(waiting_queue)]
+    departed = 0
+    for index in range(0, len(notices), RECOVERY_NOTIFY_BATCH):
+        batch = notices[index:index + RECOVERY_NOTIFY_BATCH]
+        results = await asyncio.gather(*(outbox.send(bot.send_message, user_id, text=text) for user_id, text in batch), return_exceptions=True)
+        for (user_id, _), result in zip(batch, results):
+            if isinstance(result, Forbidden):
+                departed += 1
+                await handle_departed_user(bot, user_id)
+    if notices:
+        logger.info(f"Pemulihan: {len(notices)} pengguna dikabari, {departed} ternyata sudah pergi.")
 
 @auto_update_profile
 async def stop_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Menghentikan pencarian atau mengakhiri percakapan."""
-    global waiting_queue
     user_id = update.message.from_user.id
-
-    # Cek jika user ada di antrian
-    user_in_queue = next((user for user in waiting_queue if user['user_id'] == user_id), None)
-    if user_in_queue:
-        waiting_queue.remove(user_in_queue)
-        save_chat_data()
-        await update.message.reply_text("Pencarian dibatalkan.")
-    elif user_id in chat_partners:
-        partner_id = await end_chat_session(user_id)
-        if partner_id:
-            await update.message.reply_text("❌ Percakapan telah berakhir.")
-            
-            # DIPERBAIKI: callback_data harus berisi ID partner, bukan ID sendiri.
-            keyboard = [
-                [InlineKeyboardButton("Cari Partner Baru 🔎", callback_data="post_chat_new_search"), InlineKeyboardButton("Stop ⏹️", callback_data="post_chat_stop")],
-                [InlineKeyboardButton("🚩 Laporkan Partner Terakhir", callback_data=f"report_{partner_id}")]
-            ]
-            try:
-                await context.bot.send_message(chat_id=partner_id, text="❌ Pasanganmu telah menghentikan percakapan.", reply_markup=InlineKeyboardMarkup(keyboard))
-            except Exception as e:
-                logger.warning(f"Gagal mengirim pesan 'stop' ke partner {partner_id}: {e}")
+    enqueued_at = await cancel_search(user_id)
+    if enqueued_at is not None:
+        cancel_wait_histogram.observe(time.time() - enqueued_at)
+        await send_reply(update, "Pencarian dibatalkan.")
+    # Sesi bisa sudah diakhiri partner (mis. di worker shard lain); saat itu jawab seperti tidak sedang chat
+    elif user_id in chat_partners and (partner_id := await end_chat_session(user_id)):
+        await send_reply(update, "❌ Percakapan telah berakhir.")
+
+        # Tombol laporan di pesan untuk partner menunjuk ke user yang mengakhiri chat
+        language = templates.language(await aload_profile(partner_id))
+        try:
+            await outbox.send(
+                context.bot.send_message, partner_id,
+                text=templates.text("partner_stopped", language), reply_markup=templates.post_chat_keyboard(user_id, language),
+            )
+        except Exception as e:
+            logger.warning(f"Gagal mengirim pesan 'stop' ke partner {partner_id}: {e}")
     else:
-        await update.message.reply_text("Kamu sedang tidak dalam percakapan atau antrian.")
+        await send_reply(update, "Kamu sedang tidak dalam percakapan atau antrian.")
 
 @auto_update_profile
 async def next_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -493,13 +2998,13 @@ async def next_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     if user_id in chat_partners:
         partner_id = await end_chat_session(user_id)
         if partner_id:
-            # DIPERBAIKI: callback_data harus berisi ID partner, bukan ID sendiri.
-            keyboard = [
-                [InlineKeyboardButton("Cari Partner Baru 🔎", callback_data="post_chat_new_search"), InlineKeyboardButton("Stop ⏹️", callback_data="post_chat_stop")],
-                [InlineKeyboardButton("🚩 Laporkan Partner Terakhir", callback_data=f"report_{partner_id}")]
-            ]
+            # Tombol laporan di pesan untuk partner menunjuk ke user yang beralih
+            language = templates.language(await aload_profile(partner_id))
             try:
-                await context.bot.send_message(chat_id=partner_id, text="🚶 Pasanganmu telah beralih ke chat lain.", reply_markup=InlineKeyboardMarkup(keyboard))
+                await outbox.send(
+                    context.bot.send_message, partner_id,
+                    text=templates.text("partner_next", language), reply_markup=templates.post_chat_keyboard(user_id, language),
+                )
             except Exception as e:
                 logger.warning(f"Gagal mengirim pesan 'next' ke partner {partner_id}: {e}")
 
@@ -509,55 +3014,524 @@ async def next_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
         # Jika tidak sedang chat, /next berfungsi seperti /search
         await add_to_queue(update, context, preference="any")
 
+class AlbumRelay:
+    """Mengumpulkan bagian album (media_group_id) lalu menyalinnya dengan satu copy_messages.
+
+    Telegram mengirim setiap item album sebagai update terpisah. Album dikirim setelah
+    MEDIA_GROUP_DELAY detik tanpa item baru, saat sudah berisi MEDIA_GROUP_MAX item, atau
+    sebelum pesan berikutnya dari pengirim yang sama diteruskan, sehingga urutan tetap terjaga.
+    """
+
+    def __init__(self, delay=MEDIA_GROUP_DELAY):
+        self.delay = delay
+        self._pending = {}  # user_id -> [media_group_id, partner_id, [message_id], task penunda]
+        self.albums = 0
+
+    async def add(self, bot, user_id, partner_id, message):
+        album = self._pending.get(user_id)
+        if album and (album[0] != message.media_group_id or album[1] != partner_id):
+            await self.flush(bot, user_id)
+            album = None
+        if album is None:
+            album = self._pending[user_id] = [message.media_group_id, partner_id, [], None]
+        album[2].append(message.message_id)
+        if album[3] is not None:
+            album[3].cancel()
+        if len(album[2]) >= MEDIA_GROUP_MAX:
+            await self.flush(bot, user_id)
+        else:
+            album[3] = asyncio.get_running_loop().create_task(self._flush_later(bot, user_id))
+
+    async def _flush_later(self, bot, user_id):
+        await asyncio.sleep(self.delay)
+        self._pending[user_id][3] = None  # jangan membatalkan task ini dari dalam flush()
+        try:
+            await self.flush(bot, user_id)
+        except Exception as e:
+            metrics.inc("relay_failures_total")
+            logger.error(f"Gagal meneruskan album dari {user_id}: {e}")
+
+    async def flush(self, bot, user_id):
+        """Mengirim album tertunda milik `user_id` (jika ada)."""
+        album = self._pending.pop(user_id, None)
+        if album is None:
+            return
+        _, partner_id, message_ids, timer = album
+        if timer is not None:
+            timer.cancel()
+        self.albums += 1
+        await outbox.send(bot.copy_messages, partner_id, PRIORITY_RELAY, from_chat_id=user_id, message_ids=sorted(message_ids))
+
+    async def flush_all(self, bot):
+        """Mengirim semua album tertunda (dipanggil saat bot berhenti)."""
+        for user_id in list(self._pending):
+            try:
+                await self.flush(bot, user_id)
+            except Exception as e:
+                logger.error(f"Gagal meneruskan album dari {user_id}: {e}")
+
+album_relay = AlbumRelay()
+
+busy_notices = set()  # user_id yang pemberitahuan "bot sibuk"-nya masih menunggu di outbox
+
+def notify_busy(update):
+    """Menjadwalkan pemberitahuan "bot sibuk" tanpa menunggu, paling banyak satu per pengguna.
+
+    Saat antrian kirim penuh, pengguna yang terus mengirim pesan tidak menambah balasan
+    baru selama balasan sebelumnya belum terkirim.
+    """
+    user_id = update.effective_user.id
+    if user_id in busy_notices:
+        return
+    try:
+        future = outbox.submit(
+            update.get_bot().send_message, update.effective_chat.id, PRIORITY_CONTROL,
+            text="⏳ Bot sedang sibuk, pesanmu belum terkirim. Coba kirim lagi sebentar lagi.",
+        )
+    except OutboundQueueFull as e:
+        logger.warning(f"Gagal memberi tahu {user_id} bahwa bot sedang sibuk: {e}")
+        return
+    busy_notices.add(user_id)
+    future.add_done_callback(lambda future: _busy_notice_sent(user_id, future))
+
+def _busy_notice_sent(user_id, future):
+    busy_notices.discard(user_id)
+    if not future.cancelled() and future.exception() is not None:
+        logger.warning(f"Gagal memberi tahu {user_id} bahwa bot sedang sibuk: {future.exception()}")
+
 @auto_update_profile
 async def handle_message(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Meneruskan pesan antar partner chat."""
     user_id = update.message.from_user.id
+    idle_reaper.touch(user_id)
     if user_states.get(user_id) != "chatting":
-        await update.message.reply_text("Ketik /search atau /next untuk mulai mencari pasangan.")
+        await send_reply(update, "Ketik /search atau /next untuk mulai mencari pasangan.")
         return
 
-    partner_id = chat_partners.get(user_id)
-    if not partner_id:
-        # Membersihkan state jika ada ketidaksinkronan
-        user_states.pop(user_id, None)
-        await update.message.reply_text("Sepertinya pasanganmu sudah tidak terhubung. Ketik /search untuk mencari lagi.")
-        return
-    
+    # user_states diturunkan dari chat_partners, jadi pasangan pasti ada
+    partner_id = chat_partners[user_id]
+    message = update.message
+    start = time.perf_counter()
     try:
-        # Meneruskan berbagai jenis pesan
-        if update.message.text:
-            await context.bot.send_message(chat_id=partner_id, text=update.message.text)
-        elif update.message.photo:
-            await context.bot.send_photo(chat_id=partner_id, photo=update.message.photo[-1].file_id, caption=update.message.caption)
-        elif update.message.sticker:
-            await context.bot.send_sticker(chat_id=partner_id, sticker=update.message.sticker.file_id)
-        elif update.message.voice:
-            await context.bot.send_voice(chat_id=partner_id, voice=update.message.voice.file_id, caption=update.message.caption)
-        elif update.message.video:
-            await context.bot.send_video(chat_id=partner_id, video=update.message.video.file_id, caption=update.message.caption)
-        # Tambahkan jenis pesan lain jika diperlukan (document, audio, etc.)
+        # Semua jenis pesan (teks beserta format, foto, dokumen, audio, GIF, video note, polling,
+        # lokasi, dll.) disalin dengan satu copy_message lewat jalur prioritas tertinggi penjadwal
+        if message.media_group_id:
+            await album_relay.add(context.bot, user_id, partner_id, message)
+            return
+        await album_relay.flush(context.bot, user_id)
+        await outbox.send(context.bot.copy_message, partner_id, PRIORITY_RELAY, from_chat_id=user_id, message_id=message.message_id)
+        metrics.observe("relay_send_seconds", time.perf_counter() - start)
+    except Forbidden:
+        # Pasangan memblokir bot: sesi diakhiri alih-alih gagal terus di setiap pesan
+        metrics.inc("relay_failures_total")
+        await end_chat_session(user_id)
+        await send_reply(update, "❌ Pasanganmu telah meninggalkan bot. Ketik /search untuk mencari lagi.")
+    except OutboundQueueFull:
+        # Penjadwal kirim menolak pesan karena antrian penuh; sesi tetap berjalan
+        metrics.inc("relay_failures_total")
+        logger.warning(f"Antrian kirim penuh, pesan dari {user_id} ke {partner_id} tidak diteruskan")
+        notify_busy(update)
     except Exception as e:
+        metrics.inc("relay_failures_total")
         logger.error(f"Gagal meneruskan pesan dari {user_id} ke {partner_id}: {e}")
-        await update.message.reply_text("Gagal mengirim pesan. Mungkin pasanganmu telah memblokir bot.")
-
+        await send_reply(update, "Gagal mengirim pesan. Mungkin pasanganmu telah memblokir bot.")
+
+
+# --- PEMROSESAN UPDATE BERSAMAAN ---
+class PairOrderedUpdateProcessor(BaseUpdateProcessor):
+    """Memproses update secara bersamaan dengan jaminan urutan per pengguna dan per pasangan chat.
+
+    Setiap update mengunci kunci pengirimnya dan, jika sedang chat, kunci pasangannya (diurutkan
+    agar tidak deadlock). Update dari pengguna atau pasangan lain tetap berjalan paralel, sehingga
+    satu pengiriman yang lambat tidak menahan pasangan lain. Dalam mode sharding urutan dijamin
+    per worker (per pengirim); perubahan sesi antar worker diserialkan oleh database bersama.
+    """
+
+    def __init__(self, max_concurrent_updates=UPDATE_CONCURRENCY):
+        super().__init__(max_concurrent_updates)
+        self._locks = {}  # key -> [asyncio.Lock, jumlah update yang memakai]
+        self.in_flight = 0  # Update yang sudah diambil dari update_queue tetapi belum selesai diproses
+
+    @staticmethod
+    def ordering_keys(update):
+        """Kunci urutan untuk update: pengirim, ditambah pasangannya jika sedang chat."""
+        user = getattr(update, "effective_user", None)
+        if user is None:
+            chat = getattr(update, "effective_chat", None)
+            return (chat.id,) if chat else ()
+        partner_id = chat_partners.get(user.id)
+        if partner_id is None:
+            return (user.id,)
+        return tuple(sorted((user.id, partner_id)))
+
+    async def process_update(self, update, coroutine):
+        """Menunggu giliran urutan lebih dulu, baru mengambil slot konkurensi PTB.
+
+        Update yang antri di belakang pesan lain dari pengguna atau pasangan yang sama tidak
+        memegang slot, jadi satu pengguna yang mengirim banyak pesan (masing-masing menunggu
+        batas kirim 1 pesan/detik per chat) tidak menghabiskan UPDATE_CONCURRENCY slot dan
+        menahan pasangan lain.
+        """
+        self.in_flight += 1
+        try:
+            if session_restore.pending:
+                # Update yang datang selama restore di latar belakang menunggu state sesi terpasang
+                await session_restore.wait()
+            if shared_sessions:
+                # Terapkan perubahan dari worker lain sebelum kunci urutan dihitung
+                await shared_sessions.refresh()
+            entries = []
+            for key in self.ordering_keys(update):
+                entry = self._locks.get(key)
+                if entry is None:
+                    entry = self._locks[key] = [asyncio.Lock(), 0]
+                entry[1] += 1
+                entries.append((key, entry))
+            acquired = []
+            try:
+                for _, entry in entries:
+                    await entry[0].acquire()
+                    acquired.append(entry[0])
+                await super().process_update(update, coroutine)
+            finally:
+                for lock in acquired:
+                    lock.release()
+                for key, entry in entries:
+                    entry[1] -= 1
+                    if entry[1] == 0:
+                        del self._locks[key]
+        finally:
+            # Jika restore, refresh, atau penantian kunci/slot gagal atau dibatalkan, handler belum
+            # pernah dijalankan; close() mencegah peringatan "never awaited" (tanpa efek jika sudah selesai)
+            coroutine.close()
+            self.in_flight -= 1
+
+    async def do_process_update(self, update, coroutine):
+        await coroutine
+
+    async def initialize(self):
+        pass
+
+    async def shutdown(self):
+        pass
+
+
+# --- MODE WEBHOOK ---
+def update_user_id(payload):
+    """user_id penentu shard dari update JSON mentah (message, callback_query, dll.), atau None.
+
+    Biasanya pengirim update. Tombol laporan diarahkan ke shard pengguna yang dilaporkan,
+    karena jendela laporan dan blocklist-nya harus berada di worker yang menangani /search-nya.
+    """
+    data = (payload.get("callback_query") or {}).get("data") or ""
+    if data.startswith("report_") and data[len("report_"):].isdigit():
+        return int(data[len("report_"):])
+    for value in payload.values():
+        if isinstance(value, dict):
+            sender = value.get("from") or value.get("user")
+            if isinstance(sender, dict):
+                return sender.get("id")
+    return None
 
-def main():
-    """Fungsi utama untuk menjalankan bot."""
-    global chat_partners, waiting_queue, user_states
-    
-    setup_database()
-    
-    # Muat state terakhir dari DB saat bot dimulai
-    chat_partners, waiting_queue = load_chat_data()
-    # Inisialisasi user_states berdasarkan data yang dimuat
-    user_states = {uid: "chatting" for uid in chat_partners.keys()}
-    user_states.update({data["user_id"]: "waiting" for data in waiting_queue})
-    
-    logger.info(f"Bot dimulai. {len(chat_partners)} pengguna dalam chat, {len(waiting_queue)} dalam antrian.")
+class ShardForwarder:
+    """Meneruskan body update webhook apa adanya ke worker pemilik shard lewat HTTP keep-alive.
+
+    Status dari worker tujuan dikembalikan ke Telegram, jadi 503 dari worker yang penuh (atau
+    worker yang tidak bisa dihubungi) membuat Telegram mengirim ulang update tersebut.
+    """
+
+    def __init__(self, host="127.0.0.1", base_port=WEBHOOK_PORT, path=WEBHOOK_PATH, secret_token=WEBHOOK_SECRET_TOKEN):
+        self.host = host
+        self.base_port = base_port
+        self.path = path
+        self.secret_token = secret_token
+        self._idle = {}  # shard -> list[(reader, writer)] koneksi keep-alive yang menganggur
+        self.forwarded = 0
+        self.failed = 0
+
+    async def forward(self, shard, body):
+        idle = self._idle.setdefault(shard, [])
+        head = (
+            f"POST {self.path} HTTP/1.1\r\nHost: {self.host}\r\nContent-Type: application/json\r\n"
+            f"Content-Length: {len(body)}\r\nX-Telegram-Bot-Api-Secret-Token: {self.secret_token}\r\n\r\n"
+        ).encode("latin-1")
+        # Koneksi menganggur bisa sudah ditutup worker tujuan; coba sekali lagi dengan koneksi baru
+        for reused in (bool(idle), False):
+            try:
+                reader, writer = idle.pop() if reused else await asyncio.open_connection(self.host, self.base_port + shard)
+            except OSError as e:
+                logger.warning(f"Gagal terhubung ke worker shard {shard}: {e}")
+                break
+            try:
+                writer.write(head + body)
+                await writer.drain()
+                status = int((await reader.readline()).split()[1])
+                keep_alive = True
+                while (line := await reader.readline()) not in (b"\r\n", b""):
+                    if line.lower().startswith(b"connection:") and b"close" in line.lower():
+                        keep_alive = False
+            except (OSError, IndexError, ValueError):
+                writer.close()
+                continue
+            if keep_alive:
+                idle.append((reader, writer))
+            else:
+                writer.close()
+            self.forwarded += 1
+            return status
+        self.failed += 1
+        return 503
+
+    async def close(self):
+        for idle in self._idle.values():
+            for _, writer in idle:
+                writer.close()
+        self._idle.clear()
+
+class WebhookServer:
+    """Server HTTP/1.1 minimal berbasis asyncio untuk menerima update webhook Telegram.
+
+    Mendukung keep-alive, membatasi ukuran body (413), memeriksa secret token (403), dan
+    memasukkan update ke update_queue aplikasi. Jika sudah ada `max_pending` update yang belum
+    selesai diproses (masih di antrian, menunggu giliran, atau sedang berjalan), server menjawab
+    503 sehingga Telegram mengirim ulang update tersebut nanti. Dengan `forwarder`, update milik
+    shard lain diteruskan ke worker pemiliknya.
+    """
+
+    REASONS = {200: "OK", 400: "Bad Request", 403: "Forbidden", 404: "Not Found", 405: "Method Not Allowed",
+               411: "Length Required", 413: "Payload Too Large", 503: "Service Unavailable"}
+
+    def __init__(self, application, listen=WEBHOOK_LISTEN, port=WEBHOOK_PORT, path=WEBHOOK_PATH,
+                 secret_token=WEBHOOK_SECRET_TOKEN, max_body=WEBHOOK_MAX_BODY, keepalive_timeout=WEBHOOK_KEEPALIVE_TIMEOUT,
+                 forwarder=None, max_pending=UPDATE_QUEUE_SIZE):
+        self.application = application
+        self.forwarder = forwarder
+        self.listen = listen
+        self.port = port
+        self.path = path
+        self.secret_token = secret_token
+        self.max_body = max_body
+        self.keepalive_timeout = keepalive_timeout
+        self.max_pending = max_pending
+        self._server = None
+        self.accepted = 0
+        self.rejected = 0
+
+    async def start(self):
+        self._server = await asyncio.start_server(self._handle_connection, self.listen, self.port)
+        # Port 0 berarti dipilih otomatis; simpan port yang benar-benar dipakai
+        self.port = self._server.sockets[0].getsockname()[1]
+        logger.info(f"Webhook mendengarkan di {self.listen}:{self.port}{self.path}")
+
+    async def stop(self):
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+            self._server = None
+        if self.forwarder is not None:
+            await self.forwarder.close()
+
+    async def _handle_connection(self, reader, writer):
+        try:
+            while True:
+                request_line = await asyncio.wait_for(reader.readline(), self.keepalive_timeout)
+                if not request_line:
+                    break
+                method, target, version = request_line.decode("latin-1").split()
+                headers = {}
+                while True:
+                    line = await asyncio.wait_for(reader.readline(), self.keepalive_timeout)
+                    if line in (b"\r\n", b"\n", b""):
+                        break
+                    name, _, value = line.decode("latin-1").partition(":")
+                    headers[name.strip().lower()] = value.strip()
+                keep_alive = version == "HTTP/1.1" and headers.get("connection", "").lower() != "close"
+
+                if "transfer-encoding" in headers or (method == "POST" and "content-length" not in headers):
+                    status, keep_alive = 411, False
+                elif int(headers.get("content-length", 0)) > self.max_body:
+                    # Body tidak dibaca; koneksi ditutup agar sisa data tidak ikut diproses
+                    status, keep_alive = 413, False
+                else:
+                    length = int(headers.get("content-length", 0))
+                    body = await reader.readexactly(length) if length else b""
+                    status = await self._dispatch(method, target, headers, body)
+
+                writer.write(
+                    f"HTTP/1.1 {status} {self.REASONS[status]}\r\nContent-Length: 0\r\n"
+                    f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n".encode("latin-1")
+                )
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (asyncio.TimeoutError, asyncio.IncompleteReadError, ConnectionError, ValueError):
+            pass
+        finally:
+            writer.close()
+
+    async def _dispatch(self, method, target, headers, body):
+        if target.split("?", 1)[0] != self.path:
+            return 404
+        if method != "POST":
+            return 405
+        if self.secret_token and headers.get("x-telegram-bot-api-secret-token") != self.secret_token:
+            return 403
+        try:
+            payload = json.loads(body)
+            if self.forwarder is not None:
+                user_id = update_user_id(payload)
+                if user_id is not None and user_id % SHARD_COUNT != SHARD_INDEX:
+                    return await self.forwarder.forward(user_id % SHARD_COUNT, body)
+            update = Update.de_json(payload, self.application.bot)
+        except Exception as e:
+            logger.warning(f"Webhook menerima update tidak valid: {e}")
+            return 400
+        # PTB langsung mengubah setiap update di antrian menjadi task tersendiri, jadi panjang
+        # update_queue saja tidak pernah mencapai batas; hitung juga update yang masih diproses
+        pending = self.application.update_queue.qsize() + getattr(self.application.update_processor, "in_flight", 0)
+        if pending >= self.max_pending:
+            self.rejected += 1
+            return 503
+        try:
+            self.application.update_queue.put_nowait(update)
+        except asyncio.QueueFull:
+            self.rejected += 1
+            return 503
+        self.accepted += 1
+        return 200
+
+async def run_webhook(application: Application):
+    """Menjalankan bot dalam mode webhook sampai menerima SIGINT/SIGTERM."""
+    stop_event = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, stop_event.set)
+
+    # Worker 0 menerima webhook dari Telegram; worker lain hanya menerima update yang diteruskan
+    ingress = SHARD_INDEX == 0
+    forwarder = ShardForwarder() if ingress and SHARD_COUNT > 1 else None
+    server = WebhookServer(application, port=WEBHOOK_PORT + SHARD_INDEX, forwarder=forwarder)
+    await application.initialize()
+    if application.post_init:
+        await application.post_init(application)
+    try:
+        await application.start()
+        await server.start()
+        if ingress:
+            await application.bot.set_webhook(
+                url=WEBHOOK_URL,
+                secret_token=WEBHOOK_SECRET_TOKEN or None,
+                max_connections=WEBHOOK_MAX_CONNECTIONS,
+                allowed_updates=Update.ALL_TYPES,
+            )
+        await stop_event.wait()
+    finally:
+        await server.stop()
+        if application.running:
+            await application.stop()
+        if application.post_stop:
+            await application.post_stop(application)
+        await application.shutdown()
+        if application.post_shutdown:
+            await application.post_shutdown(application)
+
+
+# --- SIKLUS HIDUP APLIKASI ---
+background_tasks = []
+metrics_server = None
+recovery = None  # (user yang sesinya diputus, bot sebelumnya crash) dari restore, untuk resume_sessions()
+
+def collect_runtime_metrics():
+    """Gauge dan counter yang dibaca dari state yang sudah ada saat /metrics diminta."""
+    sends = outbox.stats()
+    cache = profile_cache.stats()
+    matching = matchmaker.stats()
+    reaping = idle_reaper.stats()
+    intros = templates.stats()
+    return [
+        ("chat_active_pairs", "gauge", {}, len(chat_partners) // 2),
+        ("chat_waiting_users", "gauge", {}, len(waiting_queue)),
+        ("outbox_pending", "gauge", {}, sends["pending"]),
+        ("outbox_messages_total", "counter", {"result": "sent"}, sends["sent"]),
+        ("outbox_messages_total", "counter", {"result": "failed"}, sends["failed"]),
+        ("outbox_messages_total", "counter", {"result": "rejected"}, sends["rejected"]),
+        ("outbox_retries_total", "counter", {}, sends["retried"]),
+        ("outbox_rate_limited_total", "counter", {}, sends["rate_limited"]),
+        ("profile_cache_size", "gauge", {}, cache["size"]),
+        ("profile_cache_requests_total", "counter", {"result": "hit"}, cache["hits"]),
+        ("profile_cache_requests_total", "counter", {"result": "miss"}, cache["misses"]),
+        ("match_ticks_total", "counter", {}, matching["ticks"]),
+        ("matched_pairs_total", "counter", {}, matching["pairs"]),
+        ("reaper_tracked_users", "gauge", {}, reaping["tracked"]),
+        ("reaper_heap_entries", "gauge", {}, reaping["heap"]),
+        ("reaper_rescheduled_total", "counter", {}, reaping["rescheduled"]),
+        ("intro_cache_requests_total", "counter", {"result": "hit"}, intros["hits"]),
+        ("intro_cache_requests_total", "counter", {"result": "miss"}, intros["misses"]),
+    ]
 
-    application = Application.builder().token(BOT_TOKEN).build()
-    
+metrics.add_collector(collect_runtime_metrics)
+
+async def post_init(application: Application):
+    """Menjalankan tugas latar belakang setelah aplikasi diinisialisasi."""
+    global metrics_server
+    background_tasks.append(asyncio.create_task(username_flush_loop()))
+    background_tasks.append(asyncio.create_task(report_flush_loop(application.bot)))
+    if shared_sessions:
+        background_tasks.append(asyncio.create_task(session_event_trim_loop()))
+    slow_sampler.start(asyncio.get_running_loop())
+    metrics.add_collector(lambda: [("update_queue_depth", "gauge", {}, application.update_queue.qsize())])
+    if METRICS_PORT is not None:
+        metrics_server = MetricsServer(port=METRICS_PORT + SHARD_INDEX)
+        try:
+            await metrics_server.start()
+        except OSError as e:
+            # Port dipakai proses lain: bot tetap berjalan, hanya tanpa endpoint metrik
+            logger.error(f"Endpoint metrik tidak bisa dibuka di port {metrics_server.port}: {e}")
+            metrics_server = None
+    if session_restore.pending:
+        background_tasks.append(asyncio.create_task(session_restore.finish(application.bot)))
+    else:
+        resume_sessions(application.bot)
+
+def resume_sessions(bot):
+    """Menjalankan ulang pencocokan, notifikasi pemulihan, dan reaper untuk state yang dipulihkan."""
+    if len(waiting_queue) >= 2:
+        # Antrian yang dipulihkan langsung dicocokkan tanpa menunggu /search berikutnya
+        matchmaker.notify(bot)
+    if recovery:
+        background_tasks.append(asyncio.create_task(notify_recovered_users(bot, *recovery)))
+    idle_reaper.start(bot)
+
+async def post_stop(application: Application):
+    """Menghentikan putaran pencocokan lalu mengirim sisa pesan keluar selagi koneksi bot masih terbuka."""
+    await matchmaker.stop()
+    await idle_reaper.stop()
+    await album_relay.flush_all(application.bot)
+    await flush_with_retry(flush_reports, "laporan")
+    if report_pipeline.pending:
+        logger.error(f"{report_pipeline.pending} laporan tidak tersimpan.")
+    await send_report_digest(application.bot)
+    await outbox.drain()
+
+async def post_shutdown(application: Application):
+    """Menghentikan tugas latar belakang dan menulis data yang masih tertunda."""
+    for task in background_tasks:
+        task.cancel()
+    await asyncio.gather(*background_tasks, return_exceptions=True)
+    background_tasks.clear()
+    if metrics_server is not None:
+        await metrics_server.stop()
+    slow_sampler.stop()
+    await flush_with_retry(flush_usernames, "username")
+    if username_tracker.pending:
+        logger.error(f"{username_tracker.pending} perubahan username tidak tersimpan.")
+    # Restore yang gagal atau belum selesai: start berikutnya diperlakukan sebagai crash
+    if not shared_sessions and not session_restore.pending:
+        await run_db(write_shutdown_marker)
+
+
+def register_handlers(application: Application):
+    """Mendaftarkan semua handler ke aplikasi."""
     # Handler untuk alur pembuatan profil
     profile_handler = ConversationHandler(
         entry_points=[
@@ -605,9 +3579,158 @@ def main():
     
     # Handler pesan umum (harus terakhir)
     application.add_handler(MessageHandler(filters.ChatType.PRIVATE & ~filters.COMMAND, handle_message))
+
+    # Durasi, status dan snapshot handler lambat untuk setiap handler
+    for handlers in application.handlers.values():
+        instrument_handlers(handlers)
+
+
+def build_application(webhook=False):
+    """Membuat Application dengan handler dan hook yang sama untuk mode polling maupun webhook."""
+    builder = (
+        Application.builder()
+        .token(BOT_TOKEN)
+        .concurrent_updates(PairOrderedUpdateProcessor())
+        .update_queue(asyncio.Queue(maxsize=UPDATE_QUEUE_SIZE))
+        .post_init(post_init)
+        .post_stop(post_stop)
+        .post_shutdown(post_shutdown)
+    )
+    if webhook:
+        # Update datang dari WebhookServer, bukan dari Updater (getUpdates)
+        builder = builder.updater(None)
+    application = builder.build()
+    register_handlers(application)
+    return application
+
+
+def load_sessions():
+    """Membaca, memvalidasi, dan memperbaiki state sesi di DB tanpa menyentuh state global.
+
+    Kembali (partners, MatchQueue, user yang sesinya diputus, waktu shutdown bersih terakhir).
+    """
+    last_shutdown = take_shutdown_marker()
+    partners, saved_queue, broken_users = recover_sessions()
+    return partners, MatchQueue(saved_queue), broken_users, last_shutdown
+
+def install_sessions(loaded, started):
+    """Memasang hasil load_sessions() sebagai state sesi global (mode satu proses)."""
+    global chat_partners, waiting_queue, recovery
+    chat_partners, waiting_queue, broken_users, last_shutdown = loaded
+    # Tenggat menganggur sesi yang dipulihkan dihitung sejak bot hidup kembali
+    now = time.time()
+    for user_id in user_states:
+        idle_reaper.touch(user_id, now)
+    recovery = (broken_users, last_shutdown is None)
+    for problem in check_state_consistency():
+        logger.warning(f"State tidak konsisten setelah restore: {problem}")
+    state = "crash" if last_shutdown is None else f"shutdown bersih {time.time() - last_shutdown:.0f}s lalu"
+    logger.info(
+        f"Pemulihan sesi selesai dalam {time.perf_counter() - started:.2f}s (sebelumnya: {state}). "
+        f"{len(chat_partners)} pengguna dalam chat, {len(waiting_queue)} dalam antrian."
+    )
+
+def restore_sessions():
+    """Memuat dan memvalidasi state sesi terakhir dari DB saat bot dimulai (mode satu proses)."""
+    started = time.perf_counter()
+    install_sessions(load_sessions(), started)
+
+class SessionRestore:
+    """Memulihkan state sesi di thread terpisah selagi bot menyambung ke Telegram.
+
+    main() memanggil start() sebelum Application dibangun, jadi pembacaan dan perbaikan DB
+    berjalan bersamaan dengan getMe, deleteWebhook, dan getUpdates pertama yang sebagian besar
+    hanya menunggu jaringan. finish() (tugas dari post_init) memasang hasilnya di event loop;
+    sampai saat itu PairOrderedUpdateProcessor menahan setiap update lewat wait(), sehingga
+    handler tidak pernah melihat state kosong atau setengah jadi.
+    """
+
+    def __init__(self):
+        self.pending = False  # True sejak start() sampai state terpasang
+        self._future = None
+        self._thread = None
+        self._ready = asyncio.Event()
+        self._error = None
+
+    def start(self):
+        self.pending = True
+        self._future = concurrent.futures.Future()
+        self._thread = threading.Thread(target=self._run, name="session-restore", daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        started = time.perf_counter()
+        try:
+            self._future.set_result((load_sessions(), started))
+        except BaseException as e:
+            self._future.set_exception(e)
+
+    async def finish(self, bot):
+        """Menunggu thread restore, memasang state, lalu melepas update yang tertahan."""
+        try:
+            loaded, started = await asyncio.wrap_future(self._future)
+            install_sessions(loaded, started)
+        except Exception as e:
+            # Tanpa state sesi yang benar bot tidak boleh memproses update. SIGTERM menghentikan
+            # run_polling() maupun run_webhook() dengan tertib, seperti restore sinkron yang gagal.
+            logger.critical(f"Pemulihan sesi gagal, bot dihentikan: {e}")
+            self._error = e
+            signal.raise_signal(signal.SIGTERM)
+        else:
+            self.pending = False
+            resume_sessions(bot)
+        finally:
+            self._ready.set()
+
+    async def wait(self):
+        await self._ready.wait()
+        if self._error is not None:
+            raise self._error
+
+    def join(self):
+        """Menunggu thread restore selesai (sebelum koneksi DB ditutup)."""
+        if self._thread is not None:
+            self._thread.join()
+
+session_restore = SessionRestore()
+
+def main():
+    """Fungsi utama untuk menjalankan bot."""
+    global shared_sessions, outbox
     
+    setup_database()
+    # Blokir otomatis yang masih berlaku dibangun ulang dari laporan terbaru
+    report_pipeline.load(recent_reports(datetime.now() - REPORT_BLOCK_WINDOW - REPORT_BLOCK_DURATION))
+    
+    if SHARD_COUNT > 1:
+        if not WEBHOOK_URL:
+            raise SystemExit("Sharding (BOT_SHARD_COUNT > 1) memerlukan mode webhook: isi WEBHOOK_URL.")
+        # State sesi dibaca dari database bersama; batas kirim Bot API dibagi rata antar worker
+        shared_sessions = SharedSessionState()
+        shared_sessions.reload()
+        outbox = OutboundScheduler(global_rate=SEND_GLOBAL_RATE / SHARD_COUNT, global_burst=max(1, SEND_GLOBAL_BURST // SHARD_COUNT))
+        logger.info(f"Worker shard {SHARD_INDEX + 1}/{SHARD_COUNT} memakai state bersama di '{DB_FILE}'.")
+        for problem in check_state_consistency():
+            logger.warning(f"State tidak konsisten setelah restore: {problem}")
+        logger.info(f"Bot dimulai. {len(chat_partners)} pengguna dalam chat, {len(waiting_queue)} dalam antrian.")
+    else:
+        # Sesi dipulihkan di thread selagi bot menyambung ke Telegram; update ditahan sampai selesai
+        session_restore.start()
+
+    application = build_application(webhook=bool(WEBHOOK_URL))
+
     print("Bot is running...")
-    application.run_polling()
+    try:
+        if WEBHOOK_URL:
+            asyncio.run(run_webhook(application))
+        else:
+            application.run_polling()
+    finally:
+        session_restore.join()
+        db_worker.stop()
+        if shared_sessions:
+            shared_sessions.close()
+        close_db_connection()
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,18 @@
+import sys
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import bot  # noqa: E402
+
+
+@pytest.fixture
+def database(tmp_path, monkeypatch):
+    """Database kosong yang sudah dimigrasi ke SCHEMA_VERSION, dibuang setelah test."""
+    monkeypatch.setattr(bot, "DB_FILE", tmp_path / "test.db")
+    bot.setup_database()
+    yield bot.get_db_connection()
+    bot.db_worker.stop()
+    bot.close_db_connection()
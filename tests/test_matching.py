@@ -0,0 +1,141 @@
+"""Pencocokan: kesetaraan dengan pemindaian i/j lama, kebijakan prioritas, dan pencocokan antar worker."""
+import multiprocessing
+import random
+import sqlite3
+import time
+from pathlib import Path
+
+import pytest
+
+import bot
+
+GENDERS = ["Pria", "Wanita", "Rahasia", "Misteri"]
+PREFERENCES = ["any", "Pria", "Wanita"]
+
+
+def legacy_match(queue):
+    """Algoritma lama try_to_match_users (O(n^2)) sebagai pembanding."""
+    for i in range(len(queue)):
+        for j in range(i + 1, len(queue)):
+            user_a, user_b = queue[i], queue[j]
+            if bot.is_compatible(user_a["gender"], user_a["preference"], user_b["gender"], user_b["preference"]):
+                queue.remove(user_a)
+                queue.remove(user_b)
+                return user_a, user_b
+    return None
+
+
+def user_ids(pair):
+    return pair and tuple(entry["user_id"] for entry in pair)
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_pop_match_equals_legacy_scan(seed):
+    rng = random.Random(seed)
+    legacy, engine = [], bot.MatchQueue()
+    for user_id in range(500):
+        entry = {"user_id": user_id, "gender": rng.choice(GENDERS), "preference": rng.choice(PREFERENCES), "enqueued_at": user_id * 0.1}
+        legacy.append(dict(entry))
+        engine.append(dict(entry))
+        if rng.random() < 0.1 and len(legacy) > 1:
+            victim = rng.choice(legacy)
+            legacy.remove(victim)
+            engine.remove(victim)
+        # Tanpa Pro dan sebelum MATCH_MAX_WAIT urutannya harus sama persis dengan pemindaian lama
+        assert user_ids(engine.pop_match(now=user_id * 0.1)) == user_ids(legacy_match(legacy))
+        assert [entry["user_id"] for entry in engine] == [entry["user_id"] for entry in legacy]
+    assert engine.check() == []
+
+
+def test_pro_boost_goes_first():
+    queue = bot.MatchQueue(pro_boost=30.0)
+    queue.append({"user_id": 1, "gender": "Pria", "preference": "any", "enqueued_at": 100.0})
+    queue.append({"user_id": 2, "gender": "Wanita", "preference": "any", "enqueued_at": 110.0})
+    queue.append({"user_id": 3, "gender": "Wanita", "preference": "any", "enqueued_at": 120.0, "pro": True})
+    assert user_ids(queue.pop_match(now=130.0)) == (3, 1)
+
+
+@pytest.mark.parametrize(("max_wait", "second"), [(120.0, (11, 21)), (float("inf"), (2, 21))])
+def test_overdue_buckets_take_turns(max_wait, second):
+    queue = bot.MatchQueue(max_wait=max_wait)
+    for user_id in range(1, 11):
+        queue.append({"user_id": user_id, "gender": "Pria", "preference": "Wanita", "enqueued_at": float(user_id)})
+    # Kombinasi langka yang berebut pasangan yang sama dengan antrean panjang di atas
+    queue.append({"user_id": 11, "gender": "Rahasia", "preference": "Wanita", "enqueued_at": 50.0})
+    queue.append({"user_id": 20, "gender": "Wanita", "preference": "any", "enqueued_at": 199.0})
+    assert user_ids(queue.pop_match(now=200.0)) == (1, 20)
+    queue.append({"user_id": 21, "gender": "Wanita", "preference": "any", "enqueued_at": 199.5})
+    assert user_ids(queue.pop_match(now=200.0)) == second
+
+
+def test_shared_pop_matches_equals_local_queue(database):
+    rng = random.Random(11)
+    now = time.time()
+    local = bot.MatchQueue()
+    for user_id in range(1, 301):
+        entry = {"user_id": user_id, "gender": rng.choice(GENDERS), "preference": rng.choice(PREFERENCES),
+                 "enqueued_at": now - 60 + user_id * 0.1, "pro": rng.random() < 0.2}
+        if entry["pro"]:
+            bot.update_user_profile(user_id, None, {"is_pro": True})
+        assert bot.shared_enqueue(entry)
+        local.append(entry)
+    expected = []
+    while len(expected) < 50 and (pair := local.pop_match(now)):
+        expected.append(user_ids(pair))
+
+    assert [user_ids(pair) for pair in bot.shared_pop_matches(50)] == expected
+
+
+def pairing_worker(db_file, index, count, users, rounds, barrier):
+    bot.DB_FILE = Path(db_file)
+    own = [user_id for user_id in range(1, users + 1) if user_id % count == index]
+    barrier.wait()
+    for _ in range(rounds):
+        for user_id in own:
+            gender = GENDERS[user_id % len(GENDERS)]
+            bot.shared_enqueue({"user_id": user_id, "gender": gender, "preference": PREFERENCES[user_id % 3], "enqueued_at": time.time()})
+            if user_id % 4 == 0:
+                bot.shared_pop_matches(4)
+        bot.shared_pop_matches(bot.MATCH_BATCH_SIZE)
+        for user_id in own:
+            if bot.shared_end(user_id) is None:
+                bot.shared_cancel(user_id)
+    bot.close_db_connection()
+
+
+def test_workers_never_double_match(database, tmp_path):
+    """Beberapa proses mengantri, mencocokkan, dan mengakhiri sesi bersamaan di DB yang sama.
+
+    Log session_events diputar ulang secara serial: setiap match harus memasangkan dua
+    pengguna yang sedang antri dan saling cocok (pairing yang linearizable).
+    """
+    count, users, rounds = 4, 80, 3
+    context = multiprocessing.get_context("spawn")
+    barrier = context.Barrier(count)
+    db_file = str(bot.DB_FILE)
+    processes = [context.Process(target=pairing_worker, args=(db_file, index, count, users, rounds, barrier)) for index in range(count)]
+    for process in processes:
+        process.start()
+    for process in processes:
+        process.join(60)
+        assert process.exitcode == 0
+
+    conn = sqlite3.connect(db_file)
+    events = conn.execute("SELECT event_id, kind, user_a, user_b, gender, preference FROM session_events ORDER BY event_id").fetchall()
+    conn.close()
+    waiting, partners, matches = {}, {}, 0
+    for event_id, kind, user_a, user_b, gender, preference in events:
+        if kind == "enqueue":
+            assert user_a not in waiting and user_a not in partners, event_id
+            waiting[user_a] = (gender, preference)
+        elif kind == "cancel":
+            assert waiting.pop(user_a, None) is not None, event_id
+        elif kind == "match":
+            assert user_a != user_b and user_a in waiting and user_b in waiting, event_id
+            assert bot.is_compatible(*waiting.pop(user_a), *waiting.pop(user_b)), event_id
+            partners.update({user_a: user_b, user_b: user_a})
+            matches += 1
+        elif kind == "end":
+            assert partners.pop(user_a) == user_b and partners.pop(user_b) == user_a, event_id
+    assert matches > 0
+    assert (partners, waiting) == ({}, {})
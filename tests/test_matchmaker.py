@@ -0,0 +1,131 @@
+"""Putaran Matchmaker hanya berjalan setelah antrian berubah."""
+import asyncio
+
+import pytest
+
+import bot
+
+
+@pytest.fixture
+def matchmaker(database, monkeypatch):
+    monkeypatch.setattr(bot, "chat_partners", {})
+    monkeypatch.setattr(bot, "waiting_queue", bot.MatchQueue())
+    monkeypatch.setattr(bot, "session_lock", asyncio.Lock())
+
+    async def announce(*args):
+        pass
+
+    monkeypatch.setattr(bot, "announce_match", announce)
+    matchmaker = bot.Matchmaker(interval=0.01)
+    calls = []
+    tick = matchmaker.tick
+
+    async def counted():
+        calls.append(len(bot.waiting_queue))
+        return await tick()
+
+    monkeypatch.setattr(matchmaker, "tick", counted)
+    return matchmaker, calls
+
+
+def enqueue(matchmaker, user_id):
+    bot.waiting_queue.append({"user_id": user_id, "gender": "Pria", "preference": "any", "enqueued_at": float(user_id)})
+    matchmaker.notify(None)
+
+
+def test_no_ticks_without_queue_changes(matchmaker):
+    matchmaker, calls = matchmaker
+
+    async def scenario():
+        enqueue(matchmaker, 1)
+        await asyncio.sleep(0.1)
+        assert calls == [1]  # satu putaran tanpa pasangan, lalu menunggu perubahan
+        enqueue(matchmaker, 2)
+        await asyncio.sleep(0.1)
+        await matchmaker.stop()
+
+    asyncio.run(scenario())
+    assert calls == [1, 2]
+    assert bot.chat_partners == {1: 2, 2: 1}
+
+
+def test_full_batch_ticks_again(matchmaker):
+    matchmaker, calls = matchmaker
+    matchmaker.batch_size = 1
+
+    async def scenario():
+        for user_id in range(1, 5):
+            enqueue(matchmaker, user_id)
+        await asyncio.sleep(0.1)
+        await matchmaker.stop()
+
+    asyncio.run(scenario())
+    assert calls == [4, 2, 0]
+
+
+def test_search_wakes_matchmaker_when_notice_fails(matchmaker, monkeypatch):
+    matchmaker, calls = matchmaker
+    monkeypatch.setattr(bot, "matchmaker", matchmaker)
+    monkeypatch.setattr(bot, "report_pipeline", bot.ReportPipeline())
+
+    async def failing_reply(update, text, **kwargs):
+        raise bot.Forbidden("bot diblokir")
+
+    monkeypatch.setattr(bot, "send_reply", failing_reply)
+
+    class Update:
+        def __init__(self, user_id):
+            self.effective_user = type("User", (), {"id": user_id})()
+
+    context = type("Context", (), {"bot": None})()
+
+    async def scenario():
+        for user_id in (1, 2):
+            await bot.add_to_queue(Update(user_id), context, "any")
+        await asyncio.sleep(0.1)
+        await matchmaker.stop()
+
+    asyncio.run(scenario())
+    assert bot.chat_partners == {1: 2, 2: 1}
+
+
+def test_block_during_profile_lookup_keeps_user_out_of_queue(matchmaker, monkeypatch):
+    matchmaker, calls = matchmaker
+    monkeypatch.setattr(bot, "matchmaker", matchmaker)
+    pipeline = bot.ReportPipeline(threshold=1)
+    monkeypatch.setattr(bot, "report_pipeline", pipeline)
+    aget_user_profile, sent = bot.aget_user_profile, []
+
+    async def profile_then_block(user_id):
+        profile = await aget_user_profile(user_id)
+        pipeline.submit(2, user_id)
+        await bot.cancel_search(user_id)
+        return profile
+
+    async def reply(update, text, **kwargs):
+        sent.append(text)
+
+    monkeypatch.setattr(bot, "aget_user_profile", profile_then_block)
+    monkeypatch.setattr(bot, "send_reply", reply)
+
+    class Update:
+        effective_user = type("User", (), {"id": 1})()
+
+    asyncio.run(bot.add_to_queue(Update(), type("Context", (), {"bot": None})(), "any"))
+    assert 1 not in bot.waiting_queue
+    assert sent and sent[0].startswith("🚫")
+
+
+def test_tick_skips_blocked_users(matchmaker, monkeypatch):
+    matchmaker, calls = matchmaker
+    pipeline = bot.ReportPipeline(threshold=1)
+    monkeypatch.setattr(bot, "report_pipeline", pipeline)
+    for user_id in (1, 2, 3):
+        bot.persist_enqueue({"user_id": user_id, "gender": "Pria", "preference": "any", "enqueued_at": float(user_id)})
+        bot.waiting_queue.append({"user_id": user_id, "gender": "Pria", "preference": "any", "enqueued_at": float(user_id)})
+    pipeline.submit(9, 1)
+
+    assert asyncio.run(matchmaker.tick()) == 1
+    assert bot.chat_partners == {2: 3, 3: 2}
+    assert 1 not in bot.waiting_queue
+    assert bot.db_query("SELECT user_id FROM waiting_entries") == []
@@ -0,0 +1,39 @@
+"""EXPLAIN QUERY PLAN untuk query panas: harus memakai indeks SCHEMA_MIGRATIONS, tanpa full scan."""
+from datetime import datetime
+
+import pytest
+
+import bot
+
+SINCE = datetime(2024, 6, 1).strftime(bot.REPORT_TIME_FORMAT)
+
+
+def query_plan(query, params):
+    return [row[3] for row in bot.db_query(f"EXPLAIN QUERY PLAN {query}", params)]
+
+
+@pytest.mark.parametrize(
+    ("query", "params", "index"),
+    [
+        (bot.USERNAME_LOOKUP_QUERY, ("someone", "someone"), "idx_profiles_username"),
+        (bot.REPORTS_AGAINST_QUERY, (777, SINCE), "idx_reports_reported_time"),
+        (bot.TOP_REPORTED_QUERY, (SINCE, 10), "idx_reports_time_reported"),
+    ],
+    ids=["username", "reports_against", "top_reported"],
+)
+def test_query_uses_index(database, query, params, index):
+    plan = query_plan(query, params)
+    assert any(index in step for step in plan), plan
+    assert not any(step.startswith("SCAN") and "INDEX" not in step for step in plan), plan
+
+
+def test_schema_is_current(database):
+    assert bot.db_query("PRAGMA user_version")[0][0] == bot.SCHEMA_VERSION
+
+
+def test_report_helpers(database):
+    bot.write_reports([(1, 2, SINCE), (3, 2, SINCE), (1, 4, "2024-01-01 00:00:00")])
+    since = datetime(2024, 5, 1)
+    assert bot.count_reports_against(2, since) == 2
+    assert bot.count_reports_against(4, since) == 0
+    assert bot.top_reported_users(since) == [(2, 2)]
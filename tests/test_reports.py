@@ -0,0 +1,35 @@
+"""Laporan dan blokir otomatis."""
+import asyncio
+import sqlite3
+
+import bot
+
+
+def test_failed_flush_keeps_reports(database, monkeypatch):
+    pipeline = bot.ReportPipeline()
+    monkeypatch.setattr(bot, "report_pipeline", pipeline)
+    pipeline.submit(1, 2)
+    pipeline.submit(3, 2)
+
+    write_reports, locked = bot.write_reports, [True]
+
+    def flaky(rows):
+        if locked.pop():
+            raise sqlite3.OperationalError("database is locked")
+        write_reports(rows)
+
+    monkeypatch.setattr(bot, "write_reports", flaky)
+
+    async def scenario():
+        try:
+            await bot.flush_reports()
+        except sqlite3.OperationalError:
+            pass
+        assert pipeline.pending == 2
+        pipeline.submit(4, 2)
+        locked.append(False)
+        await bot.flush_reports()
+
+    asyncio.run(scenario())
+    assert pipeline.pending == 0
+    assert bot.db_query("SELECT reporter_id FROM reports ORDER BY report_id") == [(1,), (3,), (4,)]
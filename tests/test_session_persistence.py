@@ -0,0 +1,62 @@
+"""State sesi di memori harus tetap sesuai DB saat penulisan state gagal."""
+import asyncio
+import sqlite3
+
+import pytest
+
+import bot
+
+
+@pytest.fixture
+def sessions(database, monkeypatch):
+    monkeypatch.setattr(bot, "chat_partners", {})
+    monkeypatch.setattr(bot, "waiting_queue", bot.MatchQueue())
+    monkeypatch.setattr(bot, "session_lock", asyncio.Lock())
+
+
+def failing(*args):
+    raise sqlite3.OperationalError("disk I/O error")
+
+
+def entry(user_id):
+    return {"user_id": user_id, "gender": "Pria", "preference": "any", "enqueued_at": 1000.0 + user_id, "pro": False}
+
+
+def test_failed_match_persist_requeues(sessions, monkeypatch):
+    monkeypatch.setattr(bot, "persist_matches", failing)
+    for user_id in (1, 2):
+        bot.waiting_queue.append(entry(user_id))
+
+    with pytest.raises(sqlite3.OperationalError):
+        asyncio.run(bot.Matchmaker().tick())
+
+    assert bot.chat_partners == {}
+    assert sorted((item.user_id, item.enqueued_at) for item in bot.waiting_queue) == [(1, 1001.0), (2, 1002.0)]
+    assert bot.check_state_consistency() == []
+
+
+def test_failed_end_persist_keeps_pair(sessions, monkeypatch):
+    monkeypatch.setattr(bot, "persist_end", failing)
+    bot.chat_partners.update({1: 2, 2: 1})
+
+    with pytest.raises(sqlite3.OperationalError):
+        asyncio.run(bot.end_chat_session(1))
+
+    assert bot.chat_partners == {1: 2, 2: 1}
+
+
+def test_failed_reap_persist_restores_and_retries(sessions, monkeypatch):
+    monkeypatch.setattr(bot, "persist_reaped", failing)
+    reaper = bot.IdleReaper(chat_timeout=10.0, queue_timeout=10.0)
+    bot.chat_partners.update({1: 2, 2: 1})
+    bot.waiting_queue.append(entry(3))
+    for user_id in (1, 2, 3):
+        reaper.touch(user_id, now=0.0)
+
+    with pytest.raises(sqlite3.OperationalError):
+        asyncio.run(reaper.tick(None, now=100.0))
+
+    assert bot.chat_partners == {1: 2, 2: 1}
+    assert [item.user_id for item in bot.waiting_queue] == [3]
+    # Dijadwalkan ulang sehingga putaran berikutnya mencoba lagi
+    assert {kind for kind, _ in reaper.expired()} == {"chat", "queue"}
@@ -0,0 +1,58 @@
+"""PairOrderedUpdateProcessor membereskan coroutine handler yang tidak sempat dijalankan."""
+import asyncio
+
+import pytest
+
+import bot
+
+
+class FailingSessions:
+    async def refresh(self):
+        raise RuntimeError("refresh gagal")
+
+
+def test_early_failure_closes_coroutine(monkeypatch):
+    monkeypatch.setattr(bot, "shared_sessions", FailingSessions())
+    processor = bot.PairOrderedUpdateProcessor()
+    ran = []
+
+    async def handler():
+        ran.append(True)
+
+    coroutine = handler()
+
+    async def scenario():
+        with pytest.raises(RuntimeError):
+            await processor.process_update(object(), coroutine)
+
+    asyncio.run(scenario())
+    assert coroutine.cr_frame is None  # ditutup tanpa pernah dijalankan
+    assert ran == []
+    assert processor.in_flight == 0
+
+
+def test_cancelled_while_waiting_for_lock(monkeypatch):
+    monkeypatch.setattr(bot, "chat_partners", {})
+    processor = bot.PairOrderedUpdateProcessor()
+    update = type("FakeUpdate", (), {"effective_user": type("User", (), {"id": 1})()})()
+
+    async def scenario():
+        release = asyncio.Event()
+
+        async def slow():
+            await release.wait()
+
+        first = asyncio.create_task(processor.process_update(update, slow()))
+        await asyncio.sleep(0)
+        second_handler = slow()
+        second = asyncio.create_task(processor.process_update(update, second_handler))
+        await asyncio.sleep(0)
+        second.cancel()
+        await asyncio.gather(second, return_exceptions=True)
+        assert second_handler.cr_frame is None  # ditutup tanpa pernah dijalankan
+        release.set()
+        await first
+
+    asyncio.run(scenario())
+    assert processor.in_flight == 0
+    assert processor._locks == {}
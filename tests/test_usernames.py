@@ -0,0 +1,38 @@
+"""Batch perubahan username."""
+import asyncio
+import sqlite3
+
+import bot
+
+
+def test_failed_flush_keeps_username_changes(database, monkeypatch):
+    tracker = bot.UsernameTracker()
+    monkeypatch.setattr(bot, "username_tracker", tracker)
+    for user_id in (1, 2):
+        bot.db_query("INSERT INTO user_profiles (user_id, username) VALUES (?, ?)", (user_id, f"lama{user_id}"))
+        tracker.remember(user_id, f"lama{user_id}")
+    tracker.observe(1, "baru1")
+    tracker.observe(2, "baru2")
+
+    write_usernames, locked = bot.write_usernames, [True]
+
+    def flaky(changes):
+        if locked.pop():
+            raise sqlite3.OperationalError("database is locked")
+        write_usernames(changes)
+
+    monkeypatch.setattr(bot, "write_usernames", flaky)
+
+    async def scenario():
+        try:
+            await bot.flush_usernames()
+        except sqlite3.OperationalError:
+            pass
+        assert tracker.pending == 2
+        tracker.observe(2, "terbaru2")  # perubahan setelah batch gagal tidak boleh tertimpa
+        locked.append(False)
+        await bot.flush_usernames()
+
+    asyncio.run(scenario())
+    assert tracker.pending == 0
+    assert bot.db_query("SELECT user_id, username FROM user_profiles ORDER BY user_id") == [(1, "baru1"), (2, "terbaru2")]